@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+A stand-in for the parts of arcpy geopublisher uses, so the benchmarks can
+run without ArcGIS. Put the fake_arcpy folder at the front of sys.path to use
+it.
+
+Every feature class is stored as a shapefile. Feature classes inside a file
+geodatabase (a folder ending in .gdb) are shapefiles inside that folder, so
+'Data.gdb/Roads' is stored as 'Data.gdb/Roads.shp'. Copying a feature class
+copies its files, which is much cheaper than the real CopyFeatures, so the
+benchmarks measure geopublisher's own overhead and file handling.
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+
+
+_COPY_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+class ExecuteError(Exception):
+    pass
+
+
+class _Env(object):
+
+    def __init__(self):
+        self.workspace = None
+        self.scratchWorkspace = None
+        self.outputCoordinateSystem = None
+        self._scratchFolder = None
+
+    @property
+    def scratchFolder(self):
+        if self.scratchWorkspace:
+            return self.scratchWorkspace
+        if self._scratchFolder is None:
+            self._scratchFolder = tempfile.mkdtemp(prefix='fake_arcpy_')
+        return self._scratchFolder
+
+
+env = _Env()
+_messages = []
+
+
+def GetMessages(severity=0):
+    return '\n'.join(_messages)
+
+
+def AddMessage(message):
+    _messages.append(message)
+
+
+class _Result(object):
+
+    def __init__(self, *outputs):
+        self.outputs = outputs
+
+    def getOutput(self, index):
+        return self.outputs[index]
+
+
+class _Extent(object):
+
+    def __init__(self, xmin, ymin, xmax, ymax):
+        self.XMin, self.YMin, self.XMax, self.YMax = xmin, ymin, xmax, ymax
+
+
+class _Field(object):
+
+    def __init__(self, name, type, length):
+        self.name, self.type, self.length = name, type, length
+
+
+class _Describe(object):
+    pass
+
+
+def _shapefile(path):
+    """
+    Returns the path of the shapefile that stores a feature class
+    """
+
+    if path.lower().endswith('.shp'):
+        return path
+    return path + '.shp'
+
+
+def _files(path):
+    shapefile = _shapefile(path)
+    base = os.path.splitext(shapefile)[0]
+    folder = os.path.dirname(shapefile) or os.curdir
+    prefix = os.path.basename(base).lower() + '.'
+    return [os.path.join(os.path.dirname(shapefile), name)
+            for name in os.listdir(folder) if name.lower().startswith(prefix)]
+
+
+def Exists(path):
+    if path.lower().endswith('.gdb') or os.path.isdir(path):
+        return os.path.isdir(path)
+    return os.path.exists(_shapefile(path))
+
+
+def Delete_management(path):
+    if not Exists(path):
+        raise ExecuteError('ERROR 000732: Dataset %s does not exist' % path)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+        return _Result(path)
+    for file in _files(path):
+        os.remove(file)
+    return _Result(path)
+
+
+def CreateFileGDB_management(out_folder_path, out_name):
+    gdb = os.path.join(out_folder_path, out_name)
+    if not gdb.lower().endswith('.gdb'):
+        gdb += '.gdb'
+    os.mkdir(gdb)
+    return _Result(gdb)
+
+
+def ValidateTableName(name, workspace=None):
+    valid = ''.join(c if c.isalnum() or c == '_' else '_' for c in name)
+    return valid if valid[:1].isalpha() else 'T' + valid
+
+
+def CopyFeatures_management(in_features, out_feature_class):
+    source = _shapefile(in_features)
+    if not os.path.exists(source):
+        raise ExecuteError('ERROR 000732: Input Features: Dataset %s does '
+                           'not exist' % in_features)
+    if Exists(out_feature_class):
+        raise ExecuteError('ERROR 000725: Output Feature Class: Dataset %s '
+                           'already exists' % out_feature_class)
+    source_base = os.path.splitext(source)[0]
+    target_base = os.path.splitext(_shapefile(out_feature_class))[0]
+    for file in _files(in_features):
+        ext = file[len(source_base):]
+        if ext.lower() in _COPY_EXTENSIONS:
+            shutil.copyfile(file, target_base + ext)
+    return _Result(out_feature_class)
+
+
+def Rename_management(in_data, out_data):
+    source_base = os.path.splitext(_shapefile(in_data))[0]
+    target_base = os.path.splitext(_shapefile(out_data))[0]
+    for file in _files(in_data):
+        os.rename(file, target_base + file[len(source_base):])
+    return _Result(out_data)
+
+
+def GetCount_management(in_rows):
+    with open(os.path.splitext(_shapefile(in_rows))[0] + '.dbf', 'rb') as f:
+        count = struct.unpack('<I', f.read(8)[4:8])[0]
+    return _Result(str(count))
+
+
+def CreateUniqueName(base_name, workspace=None):
+    workspace = workspace or env.workspace or os.curdir
+    name, ext = os.path.splitext(base_name)
+    candidate = base_name
+    number = 0
+    while Exists(os.path.join(workspace, candidate)):
+        candidate = '%s%d%s' % (name, number, ext)
+        number += 1
+    return os.path.join(workspace, candidate)
+
+
+def Describe(value):
+    desc = _Describe()
+    desc.catalogPath = value
+    desc.file = os.path.basename(value)
+    desc.name = os.path.splitext(desc.file)[0]
+    desc.path = os.path.dirname(value)
+    if value.lower().endswith('.gdb'):
+        desc.dataType = 'Workspace'
+        return desc
+    if not Exists(value):
+        raise IOError('"%s" does not exist' % value)
+    if value.lower().endswith('.shp'):
+        desc.dataType = 'ShapeFile'
+    else:
+        desc.dataType = 'FeatureClass'
+    shapefile = _shapefile(value)
+    with open(shapefile, 'rb') as f:
+        header = f.read(100)
+    desc.extent = _Extent(*struct.unpack('<4d', header[36:68]))
+    desc.shapeType = {1: 'Point', 3: 'Polyline', 5: 'Polygon'}.get(
+        struct.unpack('<i', header[32:36])[0], 'Unknown')
+    desc.fields = [_Field('FID', 'OID', 4), _Field('Shape', 'Geometry', 0)]
+    with open(os.path.splitext(shapefile)[0] + '.dbf', 'rb') as f:
+        header_length = struct.unpack('<H', f.read(10)[8:10])[0]
+        f.seek(32)
+        for i in range((header_length - 33) // 32):
+            descriptor = f.read(32)
+            name = descriptor[:11].split(b'\0')[0].decode('ascii')
+            type = {b'C': 'String', b'N': 'Double', b'D': 'Date'}.get(
+                descriptor[11:12], 'String')
+            desc.fields.append(_Field(name, type, ord(descriptor[16:17])))
+    desc.editorTrackingEnabled = False
+    return desc
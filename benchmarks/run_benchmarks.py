@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for geopublisher that run without ArcGIS.
+
+Unless --real-arcpy is given, the fake arcpy in benchmarks/fake_arcpy is used
+and every dataset is a synthetic shapefile written by synthetic.py. Results
+are written as JSON, one entry per benchmark with the time of each run, so
+they can be compared between commits:
+
+    python benchmarks/run_benchmarks.py --output results.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+from contextlib import contextmanager
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.dirname(BENCHMARK_FOLDER)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--features', type=int, default=100000,
+                        help='points in the large shapefile (default 100000)')
+    parser.add_argument('--fields', type=int, default=6,
+                        help='attribute fields per shapefile (default 6)')
+    parser.add_argument('--members', type=int, default=3,
+                        help='files besides .shp, .shx and .dbf (0-5, '
+                        'default 3)')
+    parser.add_argument('--layers', type=int, default=200,
+                        help='shapefiles in the folder used to look up '
+                        'shapefile files (default 200)')
+    parser.add_argument('--messages', type=int, default=20000,
+                        help='messages logged by the Logger benchmarks '
+                        '(default 20000)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='threads for the parallel zip benchmarks '
+                        '(default 4)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each benchmark (default 5)')
+    parser.add_argument('--only', action='append', default=[],
+                        help='run only benchmarks whose name starts with '
+                        'this (can be repeated)')
+    parser.add_argument('--output', help='write the JSON to this file '
+                        'instead of stdout')
+    parser.add_argument('--real-arcpy', action='store_true',
+                        help='use the installed arcpy instead of the fake')
+    parser.add_argument('--keep', action='store_true',
+                        help="don't delete the working folder")
+    return parser.parse_args(argv)
+
+
+@contextmanager
+def quiet():
+    """
+    Hides what geopublisher prints so it doesn't mix with the JSON
+    """
+
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+class Suite:
+    """
+    args: parsed command line arguments
+    workFolder: folder for the synthetic data and outputs
+
+    Runs the benchmarks and collects their results. Progress goes to stderr
+    since stdout is hidden while the benchmarks run.
+    """
+
+    def __init__(self, args, workFolder):
+        self.args = args
+        self.workFolder = workFolder
+        self.results = []
+
+    def selected(self, name):
+        return not self.args.only or \
+            any(name.startswith(prefix) for prefix in self.args.only)
+
+    def measure(self, name, run, setup=None, params=None, size=None,
+                unit='bytes'):
+        """
+        name: name of the benchmark
+        run: function that is timed
+        setup: function called before each run, not timed (optional)
+        params: dictionary describing the benchmark (optional)
+        size: amount of work done by each run, used for the throughput
+        (optional)
+        unit: what size counts (ex. bytes, messages)
+
+        Times run args.repeat times and records the result
+        """
+
+        if not self.selected(name):
+            return
+        times = []
+        for i in range(self.args.repeat):
+            if setup:
+                setup()
+            start = timeit.default_timer()
+            run()
+            times.append(timeit.default_timer() - start)
+        ordered = sorted(times)
+        result = {
+            'name': name,
+            'params': params or {},
+            'times': times,
+            'min': ordered[0],
+            'median': ordered[len(ordered) // 2],
+            'mean': sum(times) / len(times),
+        }
+        if size:
+            result['size'] = size
+            result['unit'] = unit
+            result['per_second'] = size / ordered[0] if ordered[0] else None
+        self.results.append(result)
+        print('%-40s %10.4fs' % (name, ordered[0]), file=sys.stderr)
+
+
+def folder_size(files):
+    return sum(os.path.getsize(f) for f in files)
+
+
+def run(args):
+    work_folder = tempfile.mkdtemp(prefix='geopublisher_bench_')
+    if not args.real_arcpy:
+        sys.path.insert(0, os.path.join(BENCHMARK_FOLDER, 'fake_arcpy'))
+    sys.path.insert(0, REPO_FOLDER)
+    sys.path.insert(0, BENCHMARK_FOLDER)
+    # the Logger writes to a Logs folder in the current folder
+    cwd = os.getcwd()
+    os.chdir(work_folder)
+    os.environ.setdefault('TMP', tempfile.gettempdir())
+    try:
+        with quiet():
+            import arcpy
+            from geopublisher import geopublisher
+        arcpy.env.scratchWorkspace = os.path.join(work_folder, 'scratch')
+        os.mkdir(arcpy.env.scratchWorkspace)
+        suite = Suite(args, work_folder)
+        with quiet():
+            benchmarks(suite, geopublisher, arcpy)
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(work_folder, ignore_errors=True)
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': _cpu_count(),
+        'arcpy': 'real' if args.real_arcpy else 'fake',
+        'args': dict((k, v) for k, v in vars(args).items()
+                     if k not in ('output', 'keep')),
+        'results': suite.results,
+    }
+
+
+def benchmarks(suite, geopublisher, arcpy):
+    import synthetic
+    from geopublisher.dirindex import DirectoryIndex
+    from geopublisher.logging import Logger
+    from geopublisher.zipper import ParallelZipFile
+    import zipfile
+
+    args = suite.args
+    work = suite.workFolder
+    data = os.path.join(work, 'data')
+    layers = os.path.join(work, 'layers')
+    output = os.path.join(work, 'output')
+    gdb = os.path.join(work, 'Output.gdb')
+    archive = os.path.join(work, 'archive')
+    for folder in (data, layers, output, gdb, archive):
+        os.mkdir(folder)
+
+    print('Writing synthetic data in %s' % work, file=sys.stderr)
+    source = synthetic.make_shapefile(data, 'Parcels', args.features,
+                                      args.fields, args.members)
+    source_files = geopublisher.get_shapefile_files(source)
+    source_size = folder_size(source_files)
+    names = synthetic.make_folder(layers, args.layers, members=args.members)
+    # a folder modified within DirectoryIndex.mtimeResolution is listed on
+    # every lookup, so age it like a folder of published layers
+    stale = time.time() - 60
+    os.utime(layers, (stale, stale))
+    params = {'features': args.features, 'fields': args.fields,
+              'members': args.members, 'bytes': source_size}
+
+    # get_shapefile_files
+    def lookup_cold():
+        index = DirectoryIndex()
+        for name in names:
+            geopublisher.get_shapefile_files(name, index)
+
+    shared = DirectoryIndex()
+
+    def lookup_warm():
+        for name in names:
+            geopublisher.get_shapefile_files(name, shared)
+
+    layer_params = {'layers': args.layers, 'members': args.members}
+    suite.measure('get_shapefile_files.cold', lookup_cold,
+                  params=layer_params, size=len(names), unit='lookups')
+    lookup_warm()
+    suite.measure('get_shapefile_files.warm', lookup_warm,
+                  params=layer_params, size=len(names), unit='lookups')
+
+    # shape_zipper
+    zip_path = os.path.join(work, 'shape_zipper.zip')
+
+    def zip_serial():
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            geopublisher.shape_zipper(source, zf)
+
+    def zip_parallel():
+        with ParallelZipFile(zip_path, workers=args.workers) as zf:
+            geopublisher.shape_zipper(source, zf)
+
+    suite.measure('shape_zipper.zipfile', zip_serial, params=params,
+                  size=source_size)
+    suite.measure('shape_zipper.parallel', zip_parallel,
+                  params=dict(params, workers=args.workers), size=source_size)
+
+    # verify_shapefile
+    from geopublisher.verify import verify_shapefile
+    suite.measure('verify_shapefile', lambda: verify_shapefile(source),
+                  params=params, size=source_size)
+
+    # create_archive
+    shp_output = os.path.join(output, 'Parcels.shp')
+    gdb_output = os.path.join(gdb, 'Parcels')
+    arcpy.CopyFeatures_management(source, shp_output)
+    arcpy.CopyFeatures_management(source, gdb_output)
+
+    def clear_archive():
+        for name in os.listdir(archive):
+            os.remove(os.path.join(archive, name))
+
+    def clear_scratch():
+        clear_archive()
+        shutil.rmtree(arcpy.env.scratchWorkspace)
+        os.mkdir(arcpy.env.scratchWorkspace)
+
+    suite.measure('create_archive.shapefile',
+                  lambda: geopublisher.create_archive(archive, shp_output),
+                  setup=clear_archive, params=params, size=source_size)
+    suite.measure('create_archive.shapefile.parallel',
+                  lambda: geopublisher.create_archive(
+                      archive, shp_output, workers=args.workers),
+                  setup=clear_archive,
+                  params=dict(params, workers=args.workers), size=source_size)
+    suite.measure('create_archive.feature_class',
+                  lambda: geopublisher.create_archive(archive, gdb_output),
+                  setup=clear_scratch, params=params, size=source_size)
+    clear_archive()
+    geopublisher.create_archive(archive, shp_output, deduplicate=True)
+    suite.measure('create_archive.unchanged',
+                  lambda: geopublisher.create_archive(
+                      archive, shp_output, deduplicate=True),
+                  params=params, size=source_size)
+
+    # publish_data
+    suite.measure('publish_data.shapefile',
+                  lambda: geopublisher.publish_data(source, output,
+                                                    'Parcels.shp'),
+                  params=params, size=source_size)
+    suite.measure('publish_data.shapefile.swap',
+                  lambda: geopublisher.publish_data(source, output,
+                                                    'Parcels.shp', swap=True),
+                  params=params, size=source_size)
+    suite.measure('publish_data.feature_class',
+                  lambda: geopublisher.publish_data(source, gdb, 'Parcels'),
+                  params=params, size=source_size)
+    suite.measure('publish_data.shapefile.archive',
+                  lambda: geopublisher.publish_data(source, output,
+                                                    'Parcels.shp', archive),
+                  setup=clear_archive, params=params, size=source_size)
+
+    # the same layer to a shapefile, a file geodatabase and an archive
+    def publish_targets():
+        geopublisher.publish_data(source, output, 'Parcels.shp', archive)
+        geopublisher.publish_data(source, gdb, 'Parcels')
+
+    suite.measure('publish_data.two_targets.archive', publish_targets,
+                  setup=clear_archive, params=params, size=source_size)
+    suite.measure('publish_fanout.two_targets.archive',
+                  lambda: geopublisher.publish_fanout(
+                      source, [(output, 'Parcels.shp'), (gdb, 'Parcels')],
+                      archive),
+                  setup=clear_archive, params=params, size=source_size)
+    state_file = os.path.join(work, 'state.sqlite')
+    geopublisher.publish_data(source, output, 'Parcels.shp',
+                              state_file=state_file)
+    suite.measure('publish_data.unchanged',
+                  lambda: geopublisher.publish_data(
+                      source, output, 'Parcels.shp', state_file=state_file),
+                  params=params, size=source_size)
+
+    # Logger
+    message = 'Adding %s...' % source
+    log_params = {'messages': args.messages}
+
+    def log(background):
+        logger = Logger(background=background)
+        for i in range(args.messages):
+            logger.logMsg(message, printMsg=False)
+        logger.writeLogToFile(wait=True)
+
+    suite.measure('logger.logMsg', lambda: log(False), params=log_params,
+                  size=args.messages, unit='messages')
+    suite.measure('logger.logMsg.background', lambda: log(True),
+                  params=log_params, size=args.messages, unit='messages')
+
+    def log_flushing():
+        logger = Logger(background=True, maxEntries=1000, flushEvery=100)
+        for i in range(args.messages):
+            logger.logMsg(message, printMsg=False)
+        logger.writeLogToFile(wait=True)
+
+    suite.measure('logger.logMsg.flushEvery', log_flushing,
+                  params=dict(log_params, maxEntries=1000, flushEvery=100),
+                  size=args.messages, unit='messages')
+
+    def spans():
+        logger = Logger(background=True)
+        for i in range(args.messages):
+            with logger.span('bench', index=i):
+                pass
+        logger.writeLogToFile(wait=True)
+
+    suite.measure('logger.span', spans, params=log_params,
+                  size=args.messages, unit='spans')
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+Writes synthetic point shapefiles for the benchmarks. The files are valid
+shapefiles (readable by ArcGIS, GDAL or pyshp), with random coordinates and
+attributes so they compress about as well as real data.
+"""
+
+import datetime
+import os
+import random
+import struct
+
+
+# Files written besides .shp, .shx and .dbf, in the order they are added
+SIDECARS = ('.prj', '.cpg', '.shp.xml', '.sbn', '.sbx')
+
+PRJ = ('PROJCS["NAD_1983_HARN_StatePlane_Washington_North_FIPS_4601_Feet",'
+       'GEOGCS["GCS_North_American_1983_HARN",'
+       'DATUM["D_North_American_1983_HARN",SPHEROID["GRS_1980",6378137.0,'
+       '298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",'
+       '0.0174532925199433]],PROJECTION["Lambert_Conformal_Conic"],'
+       'PARAMETER["False_Easting",1640416.666666667],'
+       'PARAMETER["False_Northing",0.0],PARAMETER["Central_Meridian",'
+       '-120.8333333333333],PARAMETER["Standard_Parallel_1",47.5],'
+       'PARAMETER["Standard_Parallel_2",48.73333333333333],'
+       'PARAMETER["Latitude_Of_Origin",47.0],UNIT["Foot_US",'
+       '0.3048006096012192]]')
+
+WORDS = ('Friday', 'Harbor', 'Orcas', 'Lopez', 'Shaw', 'Waldron', 'Stuart',
+         'Roche', 'Eastsound', 'Deer', 'Olga', 'Doe', 'Bay', 'Road', 'Lane',
+         'Way', 'Point', 'Island', 'Park', 'Trail')
+
+BBOX = (1000000.0, 380000.0, 1100000.0, 480000.0)
+
+
+def make_shapefile(folder, name, features=1000, fields=6, members=3,
+                   seed=0):
+    """
+    folder: folder to write the shapefile in
+    name: base name of the shapefile (ex. Parcels)
+    features: number of points
+    fields: number of attribute fields, alternating text and numbers
+    members: number of files besides .shp, .shx and .dbf (0-5)
+    seed: seed for the random data, so runs are repeatable
+
+    Writes the shapefile and returns the path of its .shp file
+    """
+
+    rand = random.Random(seed)
+    base = os.path.join(folder, name)
+    points = [(rand.uniform(BBOX[0], BBOX[2]), rand.uniform(BBOX[1], BBOX[3]))
+              for i in range(features)]
+    _write_shp(base, points)
+    _write_dbf(base + '.dbf', features, fields, rand)
+    for ext in SIDECARS[:members]:
+        with open(base + ext, 'wb') as f:
+            if ext == '.prj':
+                f.write(PRJ.encode('ascii'))
+            elif ext == '.cpg':
+                f.write(b'UTF-8')
+            elif ext == '.shp.xml':
+                f.write(b'<?xml version="1.0"?><metadata><Esri><CreaDate>'
+                        b'20150414</CreaDate></Esri></metadata>')
+            else:
+                # spatial index files are opaque, any bytes will do
+                f.write(os.urandom(max(features // 4, 100)))
+    return base + '.shp'
+
+
+def make_folder(folder, count, features=10, members=3):
+    """
+    folder: folder to write the shapefiles in
+    count: number of shapefiles
+
+    Writes count small shapefiles named Layer0, Layer1... and returns the
+    paths of their .shp files
+    """
+
+    return [make_shapefile(folder, 'Layer%d' % i, features, members=members,
+                           seed=i) for i in range(count)]
+
+
+def _header(file_length, points):
+    xs = [p[0] for p in points] or [0.0]
+    ys = [p[1] for p in points] or [0.0]
+    return (struct.pack('>7i', 9994, 0, 0, 0, 0, 0, file_length // 2) +
+            struct.pack('<2i', 1000, 1) +
+            struct.pack('<8d', min(xs), min(ys), max(xs), max(ys),
+                        0, 0, 0, 0))
+
+
+def _write_shp(base, points):
+    # each record is an 8 byte header and 20 bytes of content
+    count = len(points)
+    with open(base + '.shp', 'wb') as shp, open(base + '.shx', 'wb') as shx:
+        shp.write(_header(100 + 28 * count, points))
+        shx.write(_header(100 + 8 * count, points))
+        offset = 100
+        records = []
+        index = []
+        for number, (x, y) in enumerate(points, 1):
+            records.append(struct.pack('>2i', number, 10) +
+                           struct.pack('<i2d', 1, x, y))
+            index.append(struct.pack('>2i', offset // 2, 10))
+            offset += 28
+            if len(records) == 10000:
+                shp.write(b''.join(records))
+                shx.write(b''.join(index))
+                records, index = [], []
+        shp.write(b''.join(records))
+        shx.write(b''.join(index))
+
+
+def _write_dbf(path, count, fields, rand):
+    columns = []
+    for i in range(fields):
+        if i % 2:
+            columns.append(('VALUE%d' % i, b'N', 12, 2))
+        else:
+            columns.append(('NAME%d' % i, b'C', 40, 0))
+    record_length = 1 + sum(c[2] for c in columns)
+    header_length = 32 + 32 * len(columns) + 1
+    today = datetime.date.today()
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4BIHH20x', 3, today.year - 1900, today.month,
+                            today.day, count, header_length, record_length))
+        for name, type, length, decimals in columns:
+            f.write(struct.pack('<11sc4xBB14x', name.encode('ascii'), type,
+                                length, decimals))
+        f.write(b'\r')
+        records = []
+        for i in range(count):
+            values = [b' ']
+            for name, type, length, decimals in columns:
+                if type == b'C':
+                    text = ' '.join(rand.choice(WORDS) for w in range(3))
+                    values.append(text.encode('ascii')[:length].ljust(length))
+                else:
+                    text = '%.2f' % rand.uniform(0, 100000)
+                    values.append(text.encode('ascii').rjust(length))
+            records.append(b''.join(values))
+            if len(records) == 10000:
+                f.write(b''.join(records))
+                records = []
+        f.write(b''.join(records))
+        f.write(b'\x1a')
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import os
+import sys
+import tempfile
+import time
+import traceback
+from collections import namedtuple
+from multiprocessing import Lock, Pool
+
+from . import geopublisher
+from .lazy import arcpy
+from .logging import Logger
+from .metadata import metadata_cache
+from .scratch import ScratchWorkspace
+
+
+PublishJob = namedtuple('PublishJob', ['input_fc', 'output_location',
+                                       'output_fc', 'archive_folder'])
+
+PublishResult = namedtuple('PublishResult', ['job', 'success', 'error',
+                                             'duration', 'output_file',
+                                             'unchanged'])
+
+# Locks shared with the worker processes, keyed by the workspace they guard
+_workspace_locks = {}
+
+
+def publish_many(jobs, max_workers=None, **options):
+    """
+    jobs: list of (input_fc, output_location, output_fc, archive_folder)
+    tuples, or the path of a CSV manifest file (see read_manifest)
+    max_workers: number of worker processes (optional, defaults to the number
+    of CPUs)
+    options: keyword arguments passed on to publish_data for every job, such
+    as state_file
+
+    Publishes many feature classes at once using a pool of worker processes.
+    Each worker has its own arcpy session, scratch workspace and Logger. Jobs
+    writing to the same file geodatabase (or the same output file) take turns
+    so they never write to it at the same time. Returns a list of
+    PublishResult in the same order as the jobs.
+    """
+
+    if isinstance(jobs, _string_types):
+        jobs = read_manifest(jobs)
+    jobs = [make_job(job) for job in jobs]
+    if not jobs:
+        return []
+
+    locks = dict((key, Lock()) for key in set(lock_key(job) for job in jobs))
+    # the workers' arcpy scratch workspaces are made in here and deleted
+    # with it once they have all exited
+    scratch = ScratchWorkspace(prefix='geopublisher_workers_')
+    pool = Pool(processes=max_workers, initializer=_init_worker,
+                initargs=(locks, scratch.create()))
+    try:
+        results = pool.map(_run_job, [(number, job, options) for number, job
+                                      in enumerate(jobs, 1)], chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        scratch.cleanup()
+    return results
+
+
+def make_job(job):
+    """
+    job: PublishJob, tuple or dict describing a publish job
+
+    Returns a PublishJob. The archive_folder may be left out or empty, in which
+    case no archive is created.
+    """
+
+    if isinstance(job, dict):
+        return PublishJob(job['input_fc'], job['output_location'],
+                          job['output_fc'], job.get('archive_folder') or None)
+    job = tuple(job)
+    if len(job) == 3:
+        job += (None,)
+    return PublishJob(job[0], job[1], job[2], job[3] or None)
+
+
+def read_manifest(manifest):
+    """
+    manifest: Path of a CSV file with a header row of input_fc,
+    output_location, output_fc and archive_folder columns
+
+    Reads a batch publishing manifest and returns a list of PublishJob.
+    """
+
+    if sys.version_info[0] < 3:
+        f = open(manifest, 'rb')
+    else:
+        f = open(manifest, 'r', newline='')
+    with f:
+        return [make_job(row) for row in csv.DictReader(f)]
+
+
+def lock_key(job):
+    """
+    job: PublishJob
+
+    Returns the path that must not be written to by two jobs at once. For
+    outputs inside a file geodatabase that is the geodatabase itself,
+    otherwise it is the output file.
+    """
+
+    output_file = os.path.normcase(os.path.abspath(
+        os.path.join(job.output_location, job.output_fc)))
+    path = output_file
+    while True:
+        if path.endswith('.gdb'):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return output_file
+        path = parent
+
+
+def _init_worker(locks, scratch_folder):
+    """
+    Prepares a worker process with its own Logger and scratch workspace, in
+    the scratch folder of the run, so temporary files don't collide with
+    other workers.
+    """
+
+    global _workspace_locks
+    _workspace_locks = locks
+    geopublisher.logger = Logger(background=True)
+    arcpy.env.scratchWorkspace = tempfile.mkdtemp(prefix='worker_',
+                                                  dir=scratch_folder)
+
+
+def _run_job(args):
+    number, job, options = args
+    logger = geopublisher.logger
+    start = time.time()
+    output_file = os.path.join(job.output_location, job.output_fc)
+    try:
+        with logger.jobContext(job=number), \
+                _workspace_locks[lock_key(job)]:
+            # other workers may have written to the workspace since this
+            # worker last looked at it
+            metadata_cache.invalidate(lock_key(job))
+            published = geopublisher.publish_data(*job, **options)
+    except Exception:
+        error = traceback.format_exc()
+        with logger.jobContext(job=number, layer=job.output_fc):
+            logger.logError()
+        return PublishResult(job, False, error, time.time() - start,
+                             output_file, False)
+    finally:
+        # pool workers exit without running atexit, so don't leave messages
+        # queued for the background writer
+        logger.writeLogToFile(wait=True)
+    return PublishResult(job, True, None, time.time() - start, output_file,
+                         not published)
+
+
+try:
+    _string_types = basestring
+except NameError:
+    _string_types = str
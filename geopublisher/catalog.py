@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import zipfile
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from .manifest import manifest_path
+
+
+Archive = namedtuple('Archive', ['archive', 'layer', 'archive_date', 'size',
+                                 'members', 'sha256'])
+
+# Archives are named <layer>_<YYYY-MM-DD>.zip by create_archive, or .gpkg
+# and .parquet for the other archive formats
+ARCHIVE_NAME = re.compile(r'^(?P<layer>.+)_(?P<date>\d{4}-\d{2}-\d{2})'
+                          r'\.(?P<ext>zip|gpkg|parquet)$', re.IGNORECASE)
+
+
+class ArchiveCatalog:
+    """
+    archiveFolder: folder containing the zip archives
+
+    Keeps a SQLite catalog of the archives in an archive folder (the layer,
+    date, size, member files and SHA-256 of each zip file), so the archives
+    of a layer or a date range can be found without listing the folder, and
+    old archives can be pruned with applyRetention. create_archive records
+    new archives in it when called with catalog=True. Archives made before
+    the catalog existed can be added with scan.
+    """
+
+    catalogName = 'archive_catalog.sqlite'
+
+    def __init__(self, archiveFolder):
+        self.archiveFolder = archiveFolder
+        self.catalogFile = os.path.join(archiveFolder, self.catalogName)
+        self.connection = sqlite3.connect(self.catalogFile, timeout=60)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS archives ('
+                'archive TEXT PRIMARY KEY, '
+                'layer TEXT NOT NULL, '
+                'archive_date TEXT NOT NULL, '
+                'size INTEGER NOT NULL, '
+                'members TEXT NOT NULL, '
+                'sha256 TEXT NOT NULL, '
+                'recorded TEXT NOT NULL)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS archives_layer_date '
+                'ON archives (layer, archive_date)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS archives_date '
+                'ON archives (archive_date)')
+
+    def record(self, archive, layer=None, archive_date=None, members=None,
+               sha256=None):
+        """
+        archive: path of the zip file (or GeoPackage or GeoParquet file)
+        layer: name of the archived layer (optional, read from the archive
+        name, with the extension added for GeoPackage and GeoParquet files so
+        each format is kept separately)
+        archive_date: date of the archive (optional, read from the archive
+        name)
+        members: names of the files in the zip file (optional, read from the
+        zip file, or the archive itself for other formats)
+        sha256: SHA-256 of the archive when it is already known (optional,
+        otherwise the archive is read to compute it)
+
+        Adds the archive to the catalog, or updates it if it is already there
+        """
+
+        name = os.path.basename(archive)
+        match = ARCHIVE_NAME.match(name)
+        if layer is None or archive_date is None:
+            if not match:
+                raise ValueError('%s is not named <layer>_<YYYY-MM-DD>.zip'
+                                 % name)
+            if layer is None:
+                layer = match.group('layer')
+                if match.group('ext').lower() != 'zip':
+                    layer += '.' + match.group('ext').lower()
+            archive_date = archive_date or match.group('date')
+        if isinstance(archive_date, (date, datetime)):
+            archive_date = archive_date.isoformat()[:10]
+        if members is None:
+            if zipfile.is_zipfile(archive):
+                with zipfile.ZipFile(archive) as zf:
+                    members = zf.namelist()
+            elif name.lower().endswith('.zip'):
+                raise zipfile.BadZipfile('%s is not a zip file' % name)
+            else:
+                members = [name]
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO archives (archive, layer, '
+                'archive_date, size, members, sha256, recorded) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (name, layer, archive_date, os.path.getsize(archive),
+                 json.dumps(list(members)), sha256 or file_sha256(archive),
+                 datetime.now().isoformat()))
+
+    def get(self, archive):
+        """
+        archive: path or file name of an archive
+
+        Returns the Archive recorded for it, or None
+        """
+
+        archives = self._select('WHERE archive = ?',
+                                (os.path.basename(archive),))
+        return archives[0] if archives else None
+
+    def latest(self, layer):
+        """
+        layer: name of the archived layer (ex. Parcels.shp)
+
+        Returns the newest Archive of the layer, or None
+        """
+
+        archives = self._select('WHERE layer = ? ORDER BY archive_date DESC '
+                                'LIMIT 1', (layer,))
+        return archives[0] if archives else None
+
+    def between(self, start, end, layer=None):
+        """
+        start: first date to include (a date or 'YYYY-MM-DD')
+        end: last date to include
+        layer: only return archives of this layer (optional)
+
+        Returns the Archives made between start and end, oldest first
+        """
+
+        where = 'WHERE archive_date BETWEEN ? AND ?'
+        args = [_iso(start), _iso(end)]
+        if layer is not None:
+            where += ' AND layer = ?'
+            args.append(layer)
+        return self._select(where + ' ORDER BY archive_date, layer', args)
+
+    def layers(self):
+        """
+        Returns the names of the archived layers
+        """
+
+        return [row[0] for row in self.connection.execute(
+            'SELECT DISTINCT layer FROM archives ORDER BY layer')]
+
+    def path(self, archive):
+        """
+        archive: Archive from the catalog
+
+        Returns the path of the zip file
+        """
+
+        return os.path.join(self.archiveFolder, archive.archive)
+
+    def scan(self):
+        """
+        Adds archives in the archive folder that aren't in the catalog and
+        forgets archives whose files have been deleted. Returns the number of
+        archives added and forgotten.
+        """
+
+        known = set(row[0] for row in self.connection.execute(
+            'SELECT archive FROM archives'))
+        files = set(name for name in os.listdir(self.archiveFolder)
+                    if ARCHIVE_NAME.match(name))
+        added = 0
+        for name in sorted(files - known):
+            try:
+                self.record(os.path.join(self.archiveFolder, name))
+                added += 1
+            except zipfile.BadZipfile:
+                pass
+        missing = known - files
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM archives WHERE archive = ?',
+                [(name,) for name in missing])
+        return added, len(missing)
+
+    def applyRetention(self, dailyDays=30, weeklyWeeks=12, monthly=True,
+                       today=None, dryRun=False):
+        """
+        dailyDays: keep every archive this many days old or newer
+        weeklyWeeks: for this many weeks after that, keep the newest archive
+        of each week
+        monthly: keep the newest archive of each month after that, forever
+        (if False, older archives are all removed)
+        today: date the ages are counted from (optional, defaults to today)
+        dryRun: only return what would be removed
+
+        Removes the archives the policy doesn't keep, deleting their files,
+        manifests and catalog entries together. The newest archive of each
+        layer is always kept. Returns the removed Archives.
+        """
+
+        today = today or date.today()
+        daily_limit = today - timedelta(days=dailyDays)
+        weekly_limit = daily_limit - timedelta(weeks=weeklyWeeks)
+        removed = []
+        for layer in self.layers():
+            kept_periods = set()
+            archives = self._select('WHERE layer = ? ORDER BY archive_date '
+                                    'DESC, archive DESC', (layer,))
+            for number, archive in enumerate(archives):
+                archive_date = datetime.strptime(archive.archive_date,
+                                                 '%Y-%m-%d').date()
+                if number == 0 or archive_date > daily_limit:
+                    continue
+                if archive_date > weekly_limit:
+                    period = ('week',) + tuple(archive_date.isocalendar()[:2])
+                elif monthly:
+                    period = ('month', archive_date.year, archive_date.month)
+                else:
+                    period = None
+                if period is not None and period not in kept_periods:
+                    kept_periods.add(period)
+                    continue
+                removed.append(archive)
+        if dryRun or not removed:
+            return removed
+        for archive in removed:
+            # the zip file and its manifest, if it has one
+            for file in (self.path(archive),
+                         manifest_path(self.path(archive))):
+                try:
+                    os.remove(file)
+                except OSError:
+                    if os.path.exists(file):
+                        raise
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM archives WHERE archive = ?',
+                [(archive.archive,) for archive in removed])
+        return removed
+
+    def close(self):
+        self.connection.close()
+
+    def _select(self, where, args):
+        rows = self.connection.execute(
+            'SELECT archive, layer, archive_date, size, members, sha256 '
+            'FROM archives ' + where, args)
+        return [Archive(row[0], row[1], row[2], row[3], json.loads(row[4]),
+                        row[5]) for row in rows]
+
+
+def file_sha256(file, block_size=1024 * 1024):
+    """
+    file: path of the file to hash
+
+    Returns the SHA-256 of the file's contents
+    """
+
+    sha256 = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _iso(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    return value
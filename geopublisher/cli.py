@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+"""
+Command line interface for geopublisher.
+
+    geopublisher serve
+    geopublisher publish Data.gdb/Parcels C:/Published Parcels.shp
+    geopublisher fanout Parcels.sde/Parcels C:/Published/Parcels.shp \
+        C:/Published/Data.gdb/Parcels --archive-folder C:/Archive
+    geopublisher archive C:/Archive C:/Published/Parcels.shp
+    geopublisher watch layers.csv --state-file C:/Published/state.sqlite
+
+publish, fanout and archive are sent to a running service (see service.py)
+unless --local is given, in which case they run in this process. watch always
+runs its jobs in this process.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='geopublisher', description='Publish GIS data using arcpy.')
+    parser.add_argument('--address', help='named pipe or socket of the '
+                        'service (default: GEOPUBLISHER_ADDRESS, or a '
+                        'geopublisher pipe/socket of the current user)')
+    parser.add_argument('--json', action='store_true',
+                        help='print each status as a line of JSON')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    serve = commands.add_parser(
+        'serve', help='run the service that keeps arcpy loaded')
+    serve.add_argument('--queue-size', type=int, default=16,
+                       help='jobs that can wait to run before new ones are '
+                       'rejected (default 16)')
+
+    publish = commands.add_parser('publish', help='publish a feature class')
+    publish.add_argument('input_fc', help='feature class to export')
+    publish.add_argument('output_location',
+                         help='folder or geodatabase for the output')
+    publish.add_argument('output_fc', help='name of the output feature class')
+    _add_publish_options(publish)
+
+    fanout = commands.add_parser(
+        'fanout', help='publish a feature class to several outputs, reading '
+        'it once')
+    fanout.add_argument('input_fc', help='feature class to export')
+    fanout.add_argument('outputs', nargs='+', metavar='output',
+                        help='path of an output feature class')
+    fanout.add_argument('--scratch-folder',
+                        help='folder for the local copy of the input')
+    _add_publish_options(fanout)
+
+    watch = commands.add_parser(
+        'watch', help='publish layers when their source files change')
+    watch.add_argument('manifest', help='CSV file with input_fc, '
+                       'output_location, output_fc and archive_folder '
+                       'columns')
+    watch.add_argument('--quiet', type=float, default=30,
+                       help='seconds a source must be left alone before it '
+                       'is published (default 30)')
+    watch.add_argument('--max-delay', type=float, default=600,
+                       help='most seconds a source that keeps changing waits '
+                       '(default 600)')
+    watch.add_argument('--polling', action='store_true',
+                       help='list the folders instead of using inotify')
+    watch.add_argument('--interval', type=float, default=5,
+                       help='seconds between listings when polling '
+                       '(default 5)')
+    _add_publish_options(watch, local=False)
+
+    archive = commands.add_parser('archive',
+                                  help='archive a feature class to a zip file')
+    archive.add_argument('archive_folder', help='folder to store the zip file')
+    archive.add_argument('output_file', help='feature class to archive')
+    archive.add_argument('--workers', type=int,
+                         help='threads used to compress the archive')
+    archive.add_argument('--deduplicate', action='store_true',
+                         help='link to the previous archive if unchanged')
+    archive.add_argument('--verify', action='store_true',
+                         help='check the shapefile before zipping it')
+    archive.add_argument('--catalog', action='store_true',
+                         help='record the archive in the archive catalog')
+    archive.add_argument('--manifest', action='store_true',
+                         help='write a JSON manifest next to the archive')
+    archive.add_argument('--format', dest='archive_format',
+                         help='shapefile (default), gpkg or geoparquet, or '
+                         'several separated by commas')
+    archive.add_argument('--where', help='archive only rows matching this SQL '
+                         'expression')
+    archive.add_argument('--fields', help='archive only these comma separated '
+                         'fields, name:new_name renames one')
+    archive.add_argument('--local', action='store_true',
+                         help="run here instead of in the service")
+
+    archives = commands.add_parser(
+        'archives', help='list archives from the catalog of an archive folder')
+    archives.add_argument('archive_folder', help='folder with the zip files')
+    archives.add_argument('--layer', help='only archives of this layer')
+    archives.add_argument('--since', default='0000-00-00',
+                          help='first date to list (YYYY-MM-DD)')
+    archives.add_argument('--until', default='9999-99-99',
+                          help='last date to list (YYYY-MM-DD)')
+    archives.add_argument('--latest', action='store_true',
+                          help='only the newest archive of each layer')
+    archives.add_argument('--scan', action='store_true',
+                          help='first add zip files missing from the catalog')
+
+    prune = commands.add_parser(
+        'prune', help='remove archives the retention policy does not keep')
+    prune.add_argument('archive_folder', help='folder with the zip files')
+    prune.add_argument('--daily', type=int, default=30,
+                       help='keep every archive this many days (default 30)')
+    prune.add_argument('--weekly', type=int, default=12,
+                       help='then keep one archive a week for this many weeks'
+                       ' (default 12)')
+    prune.add_argument('--no-monthly', dest='monthly', action='store_false',
+                       help="don't keep one archive a month after that")
+    prune.add_argument('--dry-run', action='store_true',
+                       help='only list the archives that would be removed')
+
+    commands.add_parser('status', help='show what the service is doing')
+    commands.add_parser('stop', help='stop the service after queued jobs')
+    return parser
+
+
+def _add_publish_options(parser, local=True):
+    parser.add_argument('--archive-folder',
+                        help='also archive the output to this folder')
+    parser.add_argument('--state-file', help='skip the input if it is '
+                        'unchanged since it was published')
+    parser.add_argument('--swap', action='store_true',
+                        help='copy to a staging output and rename it into '
+                        'place')
+    parser.add_argument('--archive-workers', type=int,
+                        help='threads used to compress the archive')
+    parser.add_argument('--deduplicate', action='store_true',
+                        help='link to the previous archive if unchanged')
+    parser.add_argument('--no-fast-copy', dest='fast_copy',
+                        action='store_false',
+                        help='always copy shapefiles with CopyFeatures')
+    parser.add_argument('--key-field', help='apply only changed rows, '
+                        'matched on this unique field')
+    parser.add_argument('--verify', action='store_true',
+                        help='fail if the shapefile output is corrupt')
+    parser.add_argument('--catalog', action='store_true',
+                        help='record the archive in the archive catalog')
+    parser.add_argument('--manifest', action='store_true',
+                        help='write a JSON manifest next to the archive')
+    parser.add_argument('--archive-format', help='shapefile (default), gpkg '
+                        'or geoparquet, or several separated by commas')
+    parser.add_argument('--where', help='publish only rows matching this SQL '
+                        'expression')
+    parser.add_argument('--fields', help='publish only these comma separated '
+                        'fields, name:new_name renames one')
+    if local:
+        parser.add_argument('--local', action='store_true',
+                            help="run here instead of in the service")
+
+
+def job_args(args):
+    """
+    args: parsed publish, fanout or archive arguments
+
+    Returns the keyword arguments for publish_data, publish_fanout or
+    create_archive. Paths are made absolute since the service may run in
+    another folder.
+    """
+
+    if args.command == 'publish':
+        return dict(input_fc=_absolute(args.input_fc),
+                    output_location=_absolute(args.output_location),
+                    output_fc=args.output_fc,
+                    archive_folder=_absolute(args.archive_folder),
+                    state_file=_absolute(args.state_file), swap=args.swap,
+                    archive_workers=args.archive_workers,
+                    deduplicate=args.deduplicate,
+                    key_field=args.key_field, fast_copy=args.fast_copy,
+                    verify=args.verify, catalog=args.catalog,
+                    manifest=args.manifest, where_clause=args.where,
+                    fields=_fields(args.fields),
+                    archive_format=args.archive_format)
+    if args.command == 'watch':
+        return dict(state_file=_absolute(args.state_file), swap=args.swap,
+                    archive_workers=args.archive_workers,
+                    deduplicate=args.deduplicate,
+                    key_field=args.key_field, fast_copy=args.fast_copy,
+                    verify=args.verify, catalog=args.catalog,
+                    manifest=args.manifest, where_clause=args.where,
+                    fields=_fields(args.fields),
+                    archive_format=args.archive_format)
+    if args.command == 'fanout':
+        return dict(input_fc=_absolute(args.input_fc),
+                    targets=[os.path.split(_absolute(output))
+                             for output in args.outputs],
+                    archive_folder=_absolute(args.archive_folder),
+                    state_file=_absolute(args.state_file), swap=args.swap,
+                    archive_workers=args.archive_workers,
+                    deduplicate=args.deduplicate,
+                    key_field=args.key_field, fast_copy=args.fast_copy,
+                    verify=args.verify, catalog=args.catalog,
+                    manifest=args.manifest, where_clause=args.where,
+                    fields=_fields(args.fields),
+                    archive_format=args.archive_format,
+                    scratch_folder=_absolute(args.scratch_folder))
+    return dict(archive_folder=_absolute(args.archive_folder),
+                output_file=_absolute(args.output_file), workers=args.workers,
+                deduplicate=args.deduplicate, verify=args.verify,
+                catalog=args.catalog, manifest=args.manifest,
+                where_clause=args.where, fields=_fields(args.fields),
+                archive_format=args.archive_format)
+
+
+def describe(reply):
+    """
+    reply: status sent by the service
+
+    Returns a line of text describing the status
+    """
+
+    status = reply.get('status')
+    job = 'job %s' % reply['job'] if 'job' in reply else 'service'
+    if status == 'queued':
+        return '%s queued (position %s)' % (job, reply.get('position'))
+    if status in ('finished', 'failed'):
+        text = '%s %s in %.2f seconds' % (job, status, reply['duration'])
+        if status == 'failed':
+            text += ': ' + reply['error']
+        return text
+    if status == 'ok':
+        text = 'service running (pid %s), %s queued, running job %s, ' \
+            '%s jobs received' % (reply['pid'], reply['queued'],
+                                  reply['running'], reply['jobs'])
+        if 'metadata' in reply:
+            text += ', metadata cache %(hits)s hits, %(misses)s misses' % \
+                reply['metadata']
+        return text
+    if 'error' in reply:
+        return '%s %s: %s' % (job, status, reply['error'])
+    return '%s %s' % (job, status)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'serve':
+        from .service import PublisherService
+        PublisherService(args.address, maxQueue=args.queue_size).serve()
+        return 0
+    if args.command in ('archives', 'prune'):
+        return catalog_command(args)
+    if args.command == 'watch':
+        return watch_command(args)
+    if getattr(args, 'local', False):
+        from . import geopublisher
+        if args.command == 'publish':
+            geopublisher.publish_data(**job_args(args))
+        elif args.command == 'fanout':
+            geopublisher.publish_fanout(**job_args(args))
+        else:
+            geopublisher.create_archive(**job_args(args))
+        return 0
+
+    from .service import submit
+    kwargs = {}
+    if args.command in ('publish', 'fanout', 'archive'):
+        kwargs = job_args(args)
+    succeeded = True
+    try:
+        for reply in submit(args.command, args.address, **kwargs):
+            if args.json:
+                print(json.dumps(reply, default=str))
+            else:
+                print(describe(reply))
+            if reply.get('status') in ('failed', 'rejected', 'error'):
+                succeeded = False
+            sys.stdout.flush()
+    except (IOError, OSError) as e:
+        print('Could not reach the geopublisher service: %s' % e,
+              file=sys.stderr)
+        return 2
+    return 0 if succeeded else 1
+
+
+def watch_command(args):
+    """
+    args: parsed watch arguments
+
+    Publishes the layers of a manifest whenever their sources change, until
+    interrupted. Jobs run in this process.
+    """
+
+    from .batch import read_manifest
+    from .watch import LayerWatcher
+    jobs = [job._replace(archive_folder=job.archive_folder or
+                         args.archive_folder)
+            for job in read_manifest(args.manifest)]
+    options = job_args(args)
+    LayerWatcher(jobs, quiet=args.quiet, maxDelay=args.max_delay,
+                 polling=args.polling, interval=args.interval,
+                 **options).run()
+    return 0
+
+
+def catalog_command(args):
+    """
+    args: parsed archives or prune arguments
+
+    Lists or prunes the archives in the catalog of an archive folder
+    """
+
+    from .catalog import ArchiveCatalog
+    catalog = ArchiveCatalog(args.archive_folder)
+    try:
+        if args.command == 'prune':
+            archives = catalog.applyRetention(args.daily, args.weekly,
+                                              args.monthly,
+                                              dryRun=args.dry_run)
+            verb = 'Would remove' if args.dry_run else 'Removed'
+        else:
+            if args.scan:
+                catalog.scan()
+            if args.latest:
+                layers = [args.layer] if args.layer else catalog.layers()
+                archives = [a for a in map(catalog.latest, layers) if a]
+            else:
+                archives = catalog.between(args.since, args.until, args.layer)
+            verb = None
+        for archive in archives:
+            if args.json:
+                print(json.dumps(archive._asdict()))
+            elif verb:
+                print('%s %s' % (verb, archive.archive))
+            else:
+                print('%s  %s  %10d  %s' % (archive.archive_date,
+                                            archive.sha256[:12], archive.size,
+                                            archive.archive))
+    finally:
+        catalog.close()
+    return 0
+
+
+def _fields(text):
+    if not text:
+        return None
+    from .subset import parse_fields
+    return parse_fields(text)
+
+
+def _absolute(path):
+    # leaves names arcpy resolves itself alone (ex. Database Connections)
+    if path and os.path.exists(os.path.dirname(path) or os.curdir):
+        return os.path.abspath(path)
+    return path
+
+
+if __name__ == '__main__':
+    sys.exit(main())
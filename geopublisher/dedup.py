@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import sqlite3
+
+
+class ArchiveIndex:
+    """
+    archiveFolder: folder containing the zip archives
+
+    Keeps a small SQLite file in the archive folder that records the content
+    hash of the latest archive of each layer, so an identical archive can be
+    detected without opening old zip files. Several processes can record
+    archives in the same folder at once (ex. publish_many workers).
+    """
+
+    indexName = 'archive_index.sqlite'
+
+    def __init__(self, archiveFolder):
+        self.archiveFolder = archiveFolder
+        self.indexFile = os.path.join(archiveFolder, self.indexName)
+        self.connection = sqlite3.connect(self.indexFile, timeout=60)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS latest ('
+                'layer TEXT PRIMARY KEY, '
+                'archive TEXT NOT NULL, '
+                'sha256 TEXT NOT NULL)')
+
+    def latest(self, layer):
+        """
+        layer: name of the archived layer (ex. Parcels.shp)
+
+        Returns the path of the latest archive of the layer and its content
+        hash, or (None, None) if the layer hasn't been archived or the archive
+        no longer exists
+        """
+
+        row = self.connection.execute(
+            'SELECT archive, sha256 FROM latest WHERE layer = ?',
+            (layer,)).fetchone()
+        if row:
+            archive = os.path.join(self.archiveFolder, row[0])
+            if os.path.exists(archive):
+                return archive, row[1]
+        return None, None
+
+    def record(self, layer, archive, digest):
+        """
+        layer: name of the archived layer
+        archive: path of the new archive
+        digest: content hash of the new archive
+
+        Records the archive as the latest one for the layer
+        """
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO latest (layer, archive, sha256) '
+                'VALUES (?, ?, ?)', (layer, os.path.basename(archive), digest))
+
+    def close(self):
+        self.connection.close()
+
+
+def content_digest(files, block_size=1024 * 1024):
+    """
+    files: list of files that make up an archive
+
+    Returns a SHA-256 hash of the names and contents of the files. The
+    last-update date in .dbf headers and .xml metadata files are left out,
+    since ArcGIS rewrites them on every copy even when the data is the same.
+    """
+
+    digest = hashlib.sha256()
+    for file in sorted(files, key=lambda f: os.path.basename(f).lower()):
+        name = os.path.basename(file).lower()
+        if name.endswith('.xml'):
+            continue
+        digest.update(name.encode('utf-8') + b'\0')
+        with open(file, 'rb') as f:
+            block = f.read(block_size)
+            if name.endswith('.dbf'):
+                # bytes 1-3 are the YYMMDD date of the last update
+                block = block[:1] + block[4:]
+            while block:
+                digest.update(block)
+                block = f.read(block_size)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, destination):
+    """
+    source: existing file
+    destination: path to create
+
+    Hard links destination to source, or copies it where hard links aren't
+    supported
+    """
+
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except (AttributeError, OSError):
+        shutil.copyfile(source, destination)
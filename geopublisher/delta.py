@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .lazy import arcpy
+from .metadata import metadata_cache
+
+
+DeltaResult = namedtuple('DeltaResult', ['inserted', 'updated', 'deleted'])
+
+# Field types that aren't compared or copied
+SKIPPED_TYPES = frozenset(['OID', 'Geometry', 'GlobalID', 'Raster', 'Blob'])
+
+GEOMETRY_TOKEN = 'SHAPE@WKB'
+
+
+class FullCopyRequired(Exception):
+    """
+    Raised when the output can't be updated row by row, such as when its
+    fields differ from the input's. The output should be copied in full.
+    """
+
+
+def publish_delta(input_fc, output_file, key_field):
+    """
+    input_fc: Feature class to be exported
+    output_file: Existing feature class to update
+    key_field: Field whose values uniquely identify rows in both feature
+    classes (ex. PARCEL_ID)
+
+    Updates output_file to match input_fc by inserting, updating and deleting
+    only the rows that differ. Rows are matched on key_field and compared by a
+    hash of their attributes and geometry (as WKB). Returns a DeltaResult with
+    the number of rows inserted, updated and deleted.
+
+    Raises FullCopyRequired, without changing output_file, when the fields,
+    geometry type or spatial reference of the two differ, or when key_field
+    is missing, empty or not unique.
+    """
+
+    fields = matching_fields(input_fc, output_file, key_field)
+    with arcpy.da.SearchCursor(output_file, fields) as cursor:
+        target = read_digests(cursor)
+    with arcpy.da.SearchCursor(input_fc, fields) as cursor:
+        inserts, updates, deletes = diff_rows(cursor, target)
+    if not (inserts or updates or deletes):
+        return DeltaResult(0, 0, 0)
+
+    with _edit_session(output_file):
+        if updates or deletes:
+            with arcpy.da.UpdateCursor(output_file, fields) as cursor:
+                for row in cursor:
+                    key = row[0]
+                    if key in deletes:
+                        cursor.deleteRow()
+                    elif key in updates:
+                        cursor.updateRow(updates[key])
+        if inserts:
+            with arcpy.da.InsertCursor(output_file, fields) as cursor:
+                for row in inserts:
+                    cursor.insertRow(row)
+    return DeltaResult(len(inserts), len(updates), len(deletes))
+
+
+def matching_fields(input_fc, output_file, key_field):
+    """
+    input_fc: source feature class
+    output_file: target feature class
+    key_field: field identifying rows
+
+    Returns the cursor fields to compare, key_field first and the geometry
+    last, or raises FullCopyRequired if the schemas differ
+    """
+
+    source = metadata_cache.describe(input_fc)
+    target = metadata_cache.describe(output_file)
+    if source.shapeType != target.shapeType:
+        raise FullCopyRequired('geometry type changed from %s to %s' % (
+            target.shapeType, source.shapeType))
+    if _spatial_reference(source) != _spatial_reference(target):
+        raise FullCopyRequired('spatial reference changed')
+    source_fields = _fields(source)
+    target_fields = _fields(target)
+    if source_fields != target_fields:
+        raise FullCopyRequired('fields changed from %s to %s' % (
+            _field_names(target_fields), _field_names(source_fields)))
+    names = [name for name, type in source_fields]
+    if key_field.lower() not in names:
+        raise FullCopyRequired('%s has no %s field' % (input_fc, key_field))
+    names.remove(key_field.lower())
+    return [key_field] + names + [GEOMETRY_TOKEN]
+
+
+def read_digests(rows):
+    """
+    rows: rows with the key first
+
+    Returns a dictionary of the hash of each row by its key
+    """
+
+    digests = {}
+    for row in rows:
+        key = _check_key(row[0])
+        if key in digests:
+            raise FullCopyRequired('key %r is not unique' % (key,))
+        digests[key] = row_digest(row)
+    return digests
+
+
+def diff_rows(rows, target):
+    """
+    rows: source rows with the key first
+    target: hashes of the target rows by key, see read_digests
+
+    Returns the rows to insert (a list), the rows to update (a dictionary by
+    key) and the keys to delete (a set)
+    """
+
+    remaining = dict(target)
+    seen = set()
+    inserts = []
+    updates = {}
+    for row in rows:
+        key = _check_key(row[0])
+        if key in seen:
+            raise FullCopyRequired('key %r is not unique' % (key,))
+        seen.add(key)
+        digest = remaining.pop(key, None)
+        if digest is None:
+            inserts.append(tuple(row))
+        elif digest != row_digest(row):
+            updates[key] = list(row)
+    return inserts, updates, set(remaining)
+
+
+def row_digest(row):
+    """
+    row: values of a row, geometry as WKB
+
+    Returns a hash of the values
+    """
+
+    values = []
+    for value in row:
+        if isinstance(value, bytearray):
+            value = bytes(value)
+        values.append(repr(value))
+    return hashlib.sha1('\0'.join(values).encode('utf-8')).hexdigest()
+
+
+def _check_key(key):
+    if key is None or key == '':
+        raise FullCopyRequired('rows with an empty key')
+    return key
+
+
+def _fields(desc):
+    skipped = set(name.lower() for name in (
+        getattr(desc, 'lengthFieldName', ''),
+        getattr(desc, 'areaFieldName', '')) if name)
+    return sorted((field.name.lower(), field.type) for field in desc.fields
+                  if field.type not in SKIPPED_TYPES and
+                  field.name.lower() not in skipped)
+
+
+def _field_names(fields):
+    return ', '.join(name for name, type in fields)
+
+
+def _spatial_reference(desc):
+    spatial_reference = getattr(desc, 'spatialReference', None)
+    if spatial_reference is None:
+        return None
+    return spatial_reference.factoryCode or spatial_reference.name
+
+
+@contextmanager
+def _edit_session(output_file):
+    """
+    Starts an edit session for outputs in enterprise geodatabases, where
+    cursors can't write without one. Versioned data is edited in multiuser
+    mode and data that isn't versioned without it, as arcpy requires.
+    """
+
+    workspace = _workspace(output_file)
+    if not workspace.lower().endswith('.sde'):
+        yield
+        return
+    versioned = bool(getattr(metadata_cache.describe(output_file),
+                             'isVersioned', False))
+    editor = arcpy.da.Editor(workspace)
+    editor.startEditing(False, versioned)
+    editor.startOperation()
+    try:
+        yield
+    except Exception:
+        editor.abortOperation()
+        editor.stopEditing(False)
+        raise
+    editor.stopOperation()
+    editor.stopEditing(True)
+
+
+def _workspace(path):
+    folder = os.path.dirname(path)
+    while folder and os.path.dirname(folder) != folder:
+        if os.path.splitext(folder)[1].lower() in ('.gdb', '.sde', '.mdb'):
+            return folder
+        folder = os.path.dirname(folder)
+    return os.path.dirname(path)
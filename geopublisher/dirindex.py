@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+SHAPEFILE_EXTENSIONS = frozenset([
+    '.shp', '.shx', '.dbf', '.sbn', '.sbx', '.fbn', '.fbx', '.ain', '.aih',
+    '.atx', '.ixs', '.mxs', '.prj', '.xml', '.cpg'
+])
+
+
+class DirectoryIndex:
+    """
+    maxAge: (optional) seconds a folder listing is trusted before the folder
+    is listed again, even if its modified time hasn't changed
+    mtimeResolution: (optional) seconds of modified time resolution to allow
+    for, 2 covers FAT and most SMB shares
+
+    Lists each folder once and maps the base name of every shapefile in it to
+    the shapefile's files, so finding the files of many shapefiles in the same
+    folder doesn't list the folder every time. Extensions are matched without
+    regard to case (ex. Parcels.SHP and Parcels.DBF from older tools). A
+    folder is listed again when its modified time changes, which happens
+    whenever files are added, removed or renamed in it.
+
+    Network shares and some file systems keep modified times to the second
+    or coarser, so a file added just after a folder was listed can leave its
+    modified time as it was. A listing taken less than mtimeResolution after
+    the folder was modified isn't trusted for that reason, and maxAge bounds
+    how long NFS attribute caching can hide a change.
+    """
+
+    def __init__(self, maxAge=30, mtimeResolution=2):
+        self.maxAge = maxAge
+        self.mtimeResolution = mtimeResolution
+        self._folders = {}
+        self._lock = threading.Lock()
+
+    def shapefileFiles(self, shp_name):
+        """
+        shp_name: The name of the shapefile (ex. Parcels.shp)
+
+        Returns a list of the files of the shapefile, in the same form as the
+        folder in shp_name
+        """
+
+        folder, name = os.path.split(shp_name)
+        base = os.path.splitext(name)[0].lower()
+        return [os.path.join(folder, file)
+                for file in self._listing(folder).get(base, [])]
+
+    def refresh(self, folder=None):
+        """
+        folder: (optional) folder to forget, defaults to all folders
+
+        Forgets folder listings so they are listed again on the next lookup
+        """
+
+        with self._lock:
+            if folder is None:
+                self._folders.clear()
+            else:
+                self._folders.pop(_key(folder), None)
+
+    def _listing(self, folder):
+        key = _key(folder)
+        try:
+            mtime = os.stat(folder or os.curdir).st_mtime
+        except OSError:
+            return {}
+        now = time.time()
+        with self._lock:
+            cached = self._folders.get(key)
+            # a folder changed again within the same modified time tick as
+            # the listing would look unchanged
+            if cached and cached[0] == mtime and \
+                    now - cached[1] < self.maxAge and \
+                    cached[1] - mtime >= self.mtimeResolution:
+                return cached[2]
+        listing = {}
+        for name in _list_files(folder or os.curdir):
+            stem, ext = os.path.splitext(name)
+            ext = ext.lower()
+            if ext not in SHAPEFILE_EXTENSIONS:
+                continue
+            if ext == '.xml' and os.path.splitext(stem)[1].lower() == '.shp':
+                # metadata is named Parcels.shp.xml
+                stem = os.path.splitext(stem)[0]
+            listing.setdefault(stem.lower(), []).append(name)
+        with self._lock:
+            self._folders[key] = (mtime, now, listing)
+        return listing
+
+
+def _list_files(folder):
+    if scandir is None:
+        return os.listdir(folder)
+    return [entry.name for entry in scandir(folder) if entry.is_file()]
+
+
+def _key(folder):
+    return os.path.normcase(os.path.abspath(folder or os.curdir))
+
+
+# Index shared by get_shapefile_files
+directory_index = DirectoryIndex()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .dirindex import directory_index
+from .lazy import arcpy
+
+
+# ioctl that makes a file share the blocks of another (btrfs, XFS)
+FICLONE = 0x40049409
+
+# Errors meaning a copy method isn't supported for these files
+_UNSUPPORTED = frozenset(getattr(errno, name) for name in (
+    'ENOSYS', 'EXDEV', 'EOPNOTSUPP', 'ENOTSUP', 'EINVAL', 'ENOTTY', 'EBADF',
+    'EPERM') if hasattr(errno, name))
+
+
+def can_fast_copy(input_fc, output_file, where_clause=None, fields=None):
+    """
+    input_fc: Feature class to be exported
+    output_file: Feature class to be created
+    where_clause: SQL expression selecting the rows to copy (optional)
+    fields: fields to copy (optional)
+
+    Returns True if output_file can be created by copying the files of
+    input_fc: both are shapefiles, every row and field is copied and no
+    output coordinate system is set in the arcpy environment, which
+    CopyFeatures would project to.
+    """
+
+    return not (where_clause or fields) and \
+        os.path.splitext(input_fc)[1].lower() == '.shp' and \
+        os.path.splitext(output_file)[1].lower() == '.shp' and \
+        os.path.isfile(input_fc) and \
+        not arcpy.env.outputCoordinateSystem
+
+
+def copy_shapefile(shapefile, new_shapefile, index=None):
+    """
+    shapefile: Path of the shapefile to copy (ex. Parcels.shp)
+    new_shapefile: Path of the copy (ex. Published/Parcels_2015.shp)
+    index: DirectoryIndex to look the files up in (optional)
+
+    Copies every file of the shapefile to the new base name, keeping
+    extensions such as .shp.xml. Files are copied by the operating system
+    where it can (see copy_file). If a file can't be copied the files already
+    copied are removed. Returns the copy methods used.
+    """
+
+    index = index or directory_index
+    base_length = len(os.path.splitext(os.path.basename(shapefile))[0])
+    new_base = os.path.splitext(new_shapefile)[0]
+    copied = []
+    methods = set()
+    try:
+        for file in index.shapefileFiles(shapefile):
+            new_file = new_base + os.path.basename(file)[base_length:]
+            methods.add(copy_file(file, new_file))
+            copied.append(new_file)
+    except Exception:
+        for new_file in copied:
+            os.remove(new_file)
+        raise
+    finally:
+        index.refresh(os.path.dirname(new_shapefile))
+    return sorted(methods)
+
+
+def copy_file(source, destination):
+    """
+    source: file to copy
+    destination: path of the copy
+
+    Copies the contents of source without reading them into Python. A
+    reflink is tried first, which shares the blocks on filesystems that
+    support it, then copy_file_range and sendfile, which copy inside the
+    kernel, then an ordinary copy. Returns the name of the method that
+    worked.
+    """
+
+    with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        if size:
+            for name, method in _METHODS:
+                try:
+                    method(fsrc.fileno(), fdst.fileno(), size)
+                    return name
+                except (IOError, OSError) as e:
+                    if e.errno not in _UNSUPPORTED:
+                        raise
+                    fdst.seek(0)
+                    fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    return 'copy'
+
+
+def _reflink(src, dst, size):
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, 'reflinks are not supported')
+    fcntl.ioctl(dst, FICLONE, src)
+
+
+def _copy_file_range(src, dst, size):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, 'copy_file_range is not supported')
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src, dst, size - offset, offset, offset)
+        if not copied:
+            break
+        offset += copied
+    _check_size(offset, size)
+
+
+def _sendfile(src, dst, size):
+    if not hasattr(os, 'sendfile'):
+        raise OSError(errno.ENOSYS, 'sendfile is not supported')
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst, src, offset, size - offset)
+        if not sent:
+            break
+        offset += sent
+    _check_size(offset, size)
+
+
+def _check_size(copied, size):
+    if copied != size:
+        # the source changed while it was copied, let the plain copy retry
+        raise OSError(errno.EINVAL, 'copied %d of %d bytes' % (copied, size))
+
+
+_METHODS = (
+    ('reflink', _reflink),
+    ('copy_file_range', _copy_file_range),
+    ('sendfile', _sendfile),
+)
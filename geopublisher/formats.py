@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from datetime import date
+
+from .lazy import LazyModule, arcpy
+from .metadata import metadata_cache
+from .subset import copy_subset, field_pairs
+
+# Optional (pip install geopublisher[geoparquet]), imported when a GeoParquet
+# file is written so importing geopublisher doesn't pay for them
+pyarrow = LazyModule('pyarrow')
+parquet = LazyModule('pyarrow.parquet')
+pyproj = LazyModule('pyproj')
+
+ARCHIVE_FORMATS = ('shapefile', 'gpkg', 'geoparquet')
+
+# Extensions of the single file archive formats
+EXTENSIONS = {
+    'gpkg': '.gpkg',
+    'geoparquet': '.parquet',
+}
+
+# Rows written to a GeoParquet file at a time
+BATCH_ROWS = 64 * 1024
+
+# arcpy field types that are written to GeoParquet, with their Arrow types.
+# Blob and raster fields are left out.
+ARROW_TYPES = {
+    'OID': 'int64',
+    'SmallInteger': 'int16',
+    'Integer': 'int32',
+    'Single': 'float32',
+    'Double': 'float64',
+    'String': 'string',
+    'Date': 'timestamp',
+    'GUID': 'string',
+    'GlobalID': 'string',
+}
+
+
+def archive_formats(archive_format):
+    """
+    archive_format: a format name, comma separated format names or a list
+    of them (see ARCHIVE_FORMATS). None means a shapefile.
+
+    Returns the list of archive formats, or raises ValueError for unknown
+    ones
+    """
+
+    if not archive_format:
+        return ['shapefile']
+    if not isinstance(archive_format, (list, tuple)):
+        archive_format = archive_format.split(',')
+    formats = []
+    for name in archive_format:
+        name = name.strip().lower()
+        if name not in ARCHIVE_FORMATS:
+            raise ValueError('Unknown archive format %s, use one of %s' % (
+                name, ', '.join(ARCHIVE_FORMATS)))
+        if name not in formats:
+            formats.append(name)
+    return formats
+
+
+def archive_path(archive_folder, layer, archive_format, archive_date=None):
+    """
+    archive_folder: Folder to store the archive
+    layer: name of the archived layer (ex. Parcels.shp or Parcels)
+    archive_format: gpkg or geoparquet
+    archive_date: date of the archive (optional, defaults to today)
+
+    Returns the path of the archive (ex. Parcels_2015-03-18.gpkg)
+    """
+
+    name = layer[:-4] if layer.lower().endswith('.shp') else layer
+    archive_date = archive_date or date.today()
+    return os.path.join(archive_folder, '%s_%s%s' % (
+        name, archive_date.isoformat()[:10], EXTENSIONS[archive_format]))
+
+
+def export_archive(feature_class, archive_file, archive_format,
+                   where_clause=None, fields=None):
+    """
+    feature_class: Feature class to archive
+    archive_file: path of the archive (see archive_path)
+    archive_format: gpkg or geoparquet
+    where_clause: SQL expression selecting the rows to archive (optional)
+    fields: fields to archive, see subset.field_pairs (optional)
+
+    Writes the feature class to a single file archive, replacing any file
+    already there. Nothing is left behind if it fails.
+    """
+
+    if os.path.exists(archive_file):
+        os.remove(archive_file)
+    try:
+        if archive_format == 'gpkg':
+            export_geopackage(feature_class, archive_file, where_clause,
+                              fields)
+        else:
+            export_geoparquet(feature_class, archive_file, where_clause,
+                              fields)
+    except Exception:
+        if os.path.exists(archive_file):
+            os.remove(archive_file)
+        raise
+
+
+def export_geopackage(feature_class, geopackage, where_clause=None,
+                      fields=None):
+    """
+    feature_class: Feature class to export
+    geopackage: path of the GeoPackage to create (ex. Parcels.gpkg)
+    where_clause: SQL expression selecting the rows to export (optional)
+    fields: fields to export, see subset.field_pairs (optional)
+
+    Creates a GeoPackage holding the feature class under its own name.
+    Unlike a shapefile it has no 2 GB limit and keeps long field names.
+    """
+
+    arcpy.CreateSQLiteDatabase_management(geopackage, 'GEOPACKAGE')
+    name = os.path.basename(feature_class)
+    if name.lower().endswith('.shp'):
+        name = name[:-4]
+    # unqualified name of enterprise geodatabase feature classes
+    name = arcpy.ValidateTableName(name.split('.')[-1], geopackage)
+    copy_subset(feature_class, os.path.join(geopackage, name), where_clause,
+                fields)
+
+
+def export_geoparquet(feature_class, parquet_file, where_clause=None,
+                      fields=None, compression='zstd'):
+    """
+    feature_class: Feature class to export
+    parquet_file: path of the GeoParquet file to create
+    where_clause: SQL expression selecting the rows to export (optional)
+    fields: fields to export, see subset.field_pairs (optional, defaults to
+    every field with a type in ARROW_TYPES)
+    compression: Parquet compression codec (optional)
+
+    Writes the feature class to a GeoParquet file with the geometry as WKB in
+    a geometry column. Rows are read with a search cursor and written in
+    batches, so the layer is never held in memory. Needs pyarrow; the CRS is
+    only recorded when pyproj is installed. Returns the number of rows.
+    """
+
+    _require_pyarrow()
+    desc = metadata_cache.describe(feature_class)
+    available = dict((f.name.lower(), f) for f in desc.fields
+                     if f.type in ARROW_TYPES)
+    if fields:
+        pairs = field_pairs(fields)
+        for name, _ in pairs:
+            if name.lower() not in available:
+                raise ValueError('%s has no field named %s that can be '
+                                 'written to GeoParquet' % (feature_class,
+                                                            name))
+    else:
+        pairs = [(f.name, f.name) for f in desc.fields
+                 if f.type in ARROW_TYPES]
+    columns = [(output_name, available[name.lower()].type)
+               for name, output_name in pairs]
+    cursor_fields = [available[name.lower()].name for name, _ in pairs]
+    with arcpy.da.SearchCursor(feature_class, cursor_fields + ['SHAPE@WKB'],
+                               where_clause) as cursor:
+        return write_geoparquet(parquet_file, columns, cursor,
+                                geo_metadata(desc), compression)
+
+
+def write_geoparquet(parquet_file, columns, rows, geo,
+                     compression='zstd', batchRows=BATCH_ROWS):
+    """
+    parquet_file: path of the GeoParquet file to create
+    columns: (name, arcpy field type) of each attribute column
+    rows: rows of attribute values followed by the geometry as WKB
+    geo: GeoParquet metadata, see geo_metadata
+    compression: Parquet compression codec (optional)
+    batchRows: rows per row group (optional)
+
+    Writes the rows to a GeoParquet file. Returns the number of rows.
+    """
+
+    _require_pyarrow()
+    schema = pyarrow.schema(
+        [pyarrow.field(name, _arrow_type(type)) for name, type in columns] +
+        [pyarrow.field(geo['primary_column'], pyarrow.binary())],
+        metadata={b'geo': json.dumps(geo).encode('utf-8')})
+    writer = parquet.ParquetWriter(parquet_file, schema,
+                                   compression=compression)
+    count = 0
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batchRows:
+                _write_batch(writer, schema, batch)
+                count += len(batch)
+                batch = []
+        if batch or not count:
+            _write_batch(writer, schema, batch)
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+def geo_metadata(desc, geometry_column='geometry'):
+    """
+    desc: arcpy.Describe result of the feature class
+
+    Returns the GeoParquet 1.0 metadata of the geometry column: WKB encoded,
+    with the extent as its bbox and the CRS as PROJJSON when pyproj can
+    convert the spatial reference (otherwise the CRS is unknown)
+    """
+
+    column = {'encoding': 'WKB', 'geometry_types': [], 'crs': None}
+    try:
+        extent = desc.extent
+        bbox = [float(extent.XMin), float(extent.YMin), float(extent.XMax),
+                float(extent.YMax)]
+        if all(value == value for value in bbox):
+            # empty feature classes have a NaN extent
+            column['bbox'] = bbox
+    except (AttributeError, TypeError, ValueError):
+        pass
+    spatial_reference = getattr(desc, 'spatialReference', None)
+    if spatial_reference is not None and _available(pyproj):
+        try:
+            column['crs'] = pyproj.CRS.from_wkt(
+                spatial_reference.exportToString().split(';')[0]
+            ).to_json_dict()
+        except Exception:
+            pass
+    return {'version': '1.0.0', 'primary_column': geometry_column,
+            'columns': {geometry_column: column}}
+
+
+def _require_pyarrow():
+    if not _available(parquet):
+        raise ImportError('GeoParquet archives need pyarrow, install the '
+                          'geoparquet extra (pip install '
+                          'geopublisher[geoparquet])')
+
+
+def _available(module):
+    try:
+        module.load()
+    except ImportError:
+        return False
+    return True
+
+
+def _write_batch(writer, schema, batch):
+    values = list(zip(*batch)) if batch else [[] for _ in schema]
+    arrays = []
+    for field, column in zip(schema, values):
+        if field.type == pyarrow.binary():
+            column = [bytes(value) if value is not None else None
+                      for value in column]
+        arrays.append(pyarrow.array(list(column), type=field.type))
+    writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+
+def _arrow_type(field_type):
+    arrow_type = ARROW_TYPES[field_type]
+    if arrow_type == 'timestamp':
+        return pyarrow.timestamp('ms')
+    return getattr(pyarrow, arrow_type)()
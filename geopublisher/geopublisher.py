@@ -1,17 +1,34 @@
 # -*- coding: utf-8 -*-
 
 import os
-import glob
-import arcpy
 from datetime import date, datetime
-import zipfile
-from logging import Logger
+from .lazy import arcpy
+from .logging import LazyLogger
+from .state import StateStore, fingerprint
+from .zipper import zip_writer
+from .dedup import ArchiveIndex, content_digest, link_or_copy
+from .dirindex import directory_index
+from .delta import FullCopyRequired, publish_delta
+from .fastcopy import can_fast_copy, copy_shapefile
+from .verify import verify_shapefile
+from .catalog import ArchiveCatalog
+from .manifest import (copy_manifest, dbf_record_count, make_manifest,
+                       write_manifest)
+from .subset import copy_subset, count_rows, field_pairs
+from .scratch import ScratchWorkspace, estimate_shapefile_size
+from .formats import archive_formats, archive_path, export_archive
+from .metadata import metadata_cache
 
 
-logger = Logger()
+# created on first use so importing this module has no side effects
+logger = LazyLogger(background=True)
 
 
-def publish_data(input_fc, output_location, output_fc, archive_folder=None):
+def publish_data(input_fc, output_location, output_fc, archive_folder=None,
+                 state_file=None, swap=False, archive_workers=None,
+                 deduplicate=False, key_field=None, fast_copy=True,
+                 verify=False, catalog=False, manifest=False,
+                 where_clause=None, fields=None, archive_format=None):
     """
     input_fc: Feature class to be exported
     output_location: Folder or geodatabase location for output feature
@@ -19,78 +36,663 @@ def publish_data(input_fc, output_location, output_fc, archive_folder=None):
     name will be deleted)
     archive_folder: Folder for archived data to be exported as zip file
     (optional)
+    state_file: SQLite file remembering what was last published (optional).
+    When given, the publish and archive are skipped if input_fc hasn't changed
+    since it was last published to output_fc with the same subset and archive
+    options and the output still exists.
+    swap: copy into a staging feature class next to the output, check it and
+    then rename it over the existing output (optional). The output is only
+    unavailable for the time it takes to rename it and is left untouched if
+    the copy fails.
+    archive_workers: number of threads used to compress the archive
+    (optional, see create_archive)
+    deduplicate: link to the previous archive instead of creating a new one
+    when the archived files haven't changed (optional, see create_archive)
+    key_field: field uniquely identifying rows in input_fc (optional). When
+    given and the output exists, only the rows that were added, changed or
+    deleted are applied to the output (see delta.publish_delta). The output
+    is copied in full if its fields, geometry type or spatial reference no
+    longer match input_fc. With swap, the rows are applied to a staging copy
+    of the output, which is swapped in once it has been checked.
+    fast_copy: when both input_fc and the output are shapefiles, copy their
+    files directly instead of with CopyFeatures (optional, on by default).
+    CopyFeatures is still used when an output coordinate system is set in
+    arcpy.env.
+    verify: check that a shapefile output isn't truncated or corrupt before
+    it replaces the existing output (with swap) or is archived (optional, see
+    verify.verify_shapefile). A corrupt output fails the publish.
+    catalog: record the archive in the catalog of the archive folder
+    (optional, see create_archive)
+    manifest: write a JSON manifest of the archive next to it (optional, see
+    create_archive)
+    where_clause: SQL expression selecting the rows to publish (optional)
+    fields: fields to publish, as names or (name, output_name) pairs to
+    rename them (optional, defaults to every field). The filter and fields
+    are applied while copying (see subset.copy_subset), so the rows and
+    fields left out are never written. Rows are not applied by key_field and
+    shapefiles are not fast copied when either is given.
+    archive_format: format of the archive, 'shapefile', 'gpkg',
+    'geoparquet' or a list of them (optional, see create_archive)
 
     Exports a feature class from one type to another. Existing feature classes
     with same name will be deleted. We can also create an archived zip file of
     the output feature class at a location we specify. The zip file is
     automatically named after the output feature class with the current date
     (ex. 'Buildings.shp_20150318.zip')
+
+    Returns True if the data was published or False if it was skipped as
+    unchanged. Messages logged while publishing are tagged with output_fc and
+    each step is timed with logger.span. Exists and Describe lookups go
+    through metadata.metadata_cache, and the outputs written are forgotten
+    by it.
+    """
+    state = None
+    with logger.jobContext(layer=output_fc):
+        try:
+            output_file = os.path.join(output_location, output_fc)
+            logger.logMsg('Publishing ' + input_fc + ' to ' + output_file)
+            subset = dict(where_clause=where_clause, fields=fields)
+            if state_file:
+                state = StateStore(state_file)
+                current = fingerprint(input_fc, options=_publish_options(
+                    where_clause, fields, archive_folder, archive_format,
+                    manifest, catalog))
+                if state.getFingerprint(input_fc, output_file) == current and \
+                        metadata_cache.exists(output_file):
+                    logger.logMsg('%s is unchanged, skipping' % input_fc)
+                    logger.writeLogToFile()
+                    return False
+            with logger.span('exists', path=output_file):
+                output_exists = metadata_cache.exists(output_file)
+            delta = None
+            staging_file = _renamed(output_file, '_staging')
+            if key_field and output_exists:
+                if where_clause or fields:
+                    logger.logMsg('Copying all rows, key_field is not used '
+                                  'with where_clause or fields')
+                elif swap:
+                    # the rows are changed in a copy, so the output is never
+                    # left half updated
+                    _delete_staging(staging_file)
+                    logger.logMsg('Copying %s to %s to apply the changes to'
+                                  % (output_file, staging_file))
+                    _timed_copy(output_file, staging_file, step='stage',
+                                fast_copy=fast_copy)
+                    delta = _apply_delta(input_fc, staging_file, key_field)
+                else:
+                    delta = _apply_delta(input_fc, output_file, key_field)
+            if delta:
+                logger.logMsg('Applied %d inserts, %d updates and %d deletes '
+                              'to %s' % (delta.inserted, delta.updated,
+                                         delta.deleted, output_file))
+                if swap and not (delta.inserted or delta.updated or
+                                 delta.deleted):
+                    _delete_staging(staging_file)
+                elif swap:
+                    _swap_staging(input_fc, staging_file, output_file,
+                                  None, verify)
+            elif swap and output_exists:
+                _delete_staging(staging_file)
+                logger.logMsg('Exporting %s to %s' % (input_fc, staging_file))
+                _timed_copy(input_fc, staging_file, fast_copy=fast_copy,
+                            **subset)
+                _swap_staging(input_fc, staging_file, output_file,
+                              where_clause, verify)
+            else:
+                if output_exists:
+                    logger.logMsg(output_file + ' exists, trying to delete...')
+                    with logger.span('delete', path=output_file):
+                        arcpy.Delete_management(output_file)
+                    metadata_cache.invalidate(output_file)
+                logger.logMsg('Exporting %s to %s' % (input_fc, output_file))
+                _timed_copy(input_fc, output_file, fast_copy=fast_copy,
+                            **subset)
+                if verify:
+                    verify_output(output_file)
+            if archive_folder:
+                try:
+                    create_archive(archive_folder, output_file,
+                                   workers=archive_workers,
+                                   deduplicate=deduplicate, verify=verify,
+                                   catalog=catalog, manifest=manifest,
+                                   archive_format=archive_format)
+                except arcpy.ExecuteError as e:
+                    raise e
+                    logger.logError()
+            if state_file:
+                state.setFingerprint(input_fc, output_file, current)
+            logger.writeLogToFile()
+            return True
+        except arcpy.ExecuteError as e:
+            raise e
+            logger.logError()
+            logger.writeLogToFile()
+        finally:
+            # closed when the publish fails too, so the state file isn't
+            # left locked for the next run
+            if state:
+                state.close()
+
+
+def publish_fanout(input_fc, targets, archive_folder=None, state_file=None,
+                   swap=False, archive_workers=None, deduplicate=False,
+                   key_field=None, fast_copy=True, verify=False, catalog=False,
+                   manifest=False, where_clause=None, fields=None,
+                   scratch_folder=None, archive_format=None):
+    """
+    input_fc: Feature class to be exported
+    targets: list of (output_location, output_fc) pairs to publish input_fc
+    to
+    archive_folder: Folder for archived data to be exported as zip file
+    (optional)
+    state_file: SQLite file remembering what was last published (optional).
+    When given, everything is skipped if input_fc hasn't changed since it was
+    last published to every target with the same subset and archive options
+    and the outputs all still exist.
+    scratch_folder: folder to create the local copy in (optional, defaults to
+    the system temporary folder)
+    swap, archive_workers, deduplicate, key_field, fast_copy, verify,
+    catalog, manifest, where_clause, fields and archive_format are used as
+    in publish_data.
+    The filter and fields are applied when the source is read, so only the
+    rows and fields published are copied from it.
+
+    Publishes one feature class to several outputs while reading it only
+    once. input_fc is copied into a scratch file geodatabase and every target
+    is published from that local copy, so an SDE source is read over the
+    network one time instead of once per output. The shapefile archive is
+    made from the first shapefile target, or from the local copy if there is
+    none, and GeoPackage and GeoParquet archives from the local copy. The
+    scratch geodatabase is deleted afterwards.
+
+    Returns True if the data was published or False if it was skipped as
+    unchanged.
+    """
+    targets = [tuple(target) for target in targets]
+    outputs = [os.path.join(location, fc) for location, fc in targets]
+    formats = archive_formats(archive_format)
+    with logger.jobContext(layer=os.path.basename(input_fc)):
+        logger.logMsg('Publishing %s to %s' % (input_fc, ', '.join(outputs)))
+        state = None
+        scratch = ScratchWorkspace(scratch_folder)
+        try:
+            if state_file:
+                state = StateStore(state_file)
+                current = fingerprint(input_fc, options=_publish_options(
+                    where_clause, fields, archive_folder, archive_format,
+                    manifest, catalog))
+                if all(state.getFingerprint(input_fc, output) == current and
+                       metadata_cache.exists(output) for output in outputs):
+                    logger.logMsg('%s is unchanged, skipping' % input_fc)
+                    logger.writeLogToFile()
+                    return False
+            with logger.span('scratch') as span:
+                scratch_gdb = scratch.geodatabase('fanout')
+                span['path'] = scratch_gdb
+            # named after the first target so an archive made from it is
+            # named like the one publish_data would make
+            name = os.path.splitext(targets[0][1])[0]
+            local_fc = os.path.join(
+                scratch_gdb, arcpy.ValidateTableName(name, scratch_gdb))
+            logger.logMsg('Reading %s into %s' % (input_fc, local_fc))
+            _reserve_scratch(scratch, input_fc, where_clause, fields)
+            _timed_copy(input_fc, local_fc, step='read',
+                        where_clause=where_clause, fields=fields)
+            scratch.checkBudget()
+            for location, fc in targets:
+                publish_data(local_fc, location, fc, swap=swap,
+                             key_field=key_field, fast_copy=fast_copy,
+                             verify=verify)
+            if archive_folder and 'shapefile' in formats:
+                shapefiles = [output for output in outputs
+                              if os.path.splitext(output)[1].lower() == '.shp']
+                create_archive(archive_folder, (shapefiles or [local_fc])[0],
+                               workers=archive_workers,
+                               deduplicate=deduplicate, verify=verify,
+                               catalog=catalog, manifest=manifest,
+                               scratch_folder=scratch_folder)
+            others = [f for f in formats if f != 'shapefile']
+            if archive_folder and others:
+                create_archive(archive_folder, local_fc, catalog=catalog,
+                               archive_format=others)
+            if state:
+                for output in outputs:
+                    state.setFingerprint(input_fc, output, current)
+        finally:
+            if state:
+                state.close()
+            scratch.cleanup()
+        logger.writeLogToFile()
+        return True
+
+
+def _delete_staging(staging_file):
+    """
+    Deletes a staging feature class left behind by an earlier publish
+    """
+
+    if metadata_cache.exists(staging_file):
+        arcpy.Delete_management(staging_file)
+        metadata_cache.invalidate(staging_file)
+
+
+def _swap_staging(input_fc, staging_file, output_file, where_clause,
+                  verify):
+    """
+    Checks the staging feature class against input_fc and swaps it into
+    place of output_file
+    """
+
+    with logger.span('validate', path=staging_file) as span:
+        span['rows'] = validate_copy(input_fc, staging_file, where_clause)
+    if verify:
+        verify_output(staging_file)
+    logger.logMsg('Swapping %s into %s' % (staging_file, output_file))
+    with logger.span('swap', path=output_file):
+        swap_output(staging_file, output_file)
+
+
+def _apply_delta(input_fc, output_file, key_field):
+    """
+    Updates output_file row by row, returning the DeltaResult or None if it
+    has to be copied in full
+    """
+
+    logger.logMsg('Comparing %s to %s on %s' % (input_fc, output_file,
+                                                key_field))
+    with logger.span('delta', path=output_file) as span:
+        try:
+            delta = publish_delta(input_fc, output_file, key_field)
+        except FullCopyRequired as e:
+            span['fallback'] = str(e)
+            logger.logMsg('Copying all rows instead: %s' % e)
+            return None
+        finally:
+            metadata_cache.invalidate(output_file)
+        span['rows'] = delta.inserted + delta.updated + delta.deleted
+    return delta
+
+
+def _timed_copy(input_fc, output_file, step='copy', fast_copy=False,
+                where_clause=None, fields=None):
+    """
+    Copies features inside a span recording the bytes read and written where
+    they are known (shapefiles). With fast_copy, shapefiles are copied file
+    by file when nothing needs to change (see fastcopy.can_fast_copy). With
+    where_clause or fields only the selected rows and fields are copied.
+    """
+
+    with logger.span(step, path=output_file,
+                     bytes_in=_shapefile_size(input_fc)) as span:
+        try:
+            if fast_copy and can_fast_copy(input_fc, output_file,
+                                           where_clause, fields):
+                span['method'] = ','.join(copy_shapefile(input_fc,
+                                                         output_file))
+            elif where_clause or fields:
+                span['method'] = 'subset'
+                copy_subset(input_fc, output_file, where_clause, fields)
+            else:
+                arcpy.CopyFeatures_management(input_fc, output_file)
+        finally:
+            metadata_cache.invalidate(output_file)
+        directory_index.refresh(os.path.dirname(output_file))
+        span['bytes_out'] = _shapefile_size(output_file)
+
+
+def _publish_options(where_clause, fields, archive_folder=None,
+                     archive_format=None, manifest=False, catalog=False):
+    """
+    Returns the options to fingerprint with the input, so changing the subset
+    or what is archived republishes, or None when everything is published
+    without an archive
+    """
+
+    options = {}
+    if where_clause or fields:
+        options['where_clause'] = where_clause
+        options['fields'] = field_pairs(fields) if fields else None
+    if archive_folder:
+        options['archive'] = {
+            'folder': os.path.normcase(os.path.abspath(archive_folder)),
+            'formats': archive_formats(archive_format),
+            'manifest': bool(manifest), 'catalog': bool(catalog)}
+    return options or None
+
+
+def _reserve_scratch(scratch, feature_class, where_clause=None, fields=None):
+    """
+    Raises ScratchBudgetExceeded before feature_class is copied into the
+    scratch workspace if the copy won't fit. The size of feature classes that
+    aren't shapefiles is estimated (see scratch.estimate_shapefile_size),
+    which takes a count and a short read, so only when there is a budget.
+    """
+
+    size = _shapefile_size(feature_class)
+    if size is None and scratch.budget is not None:
+        with logger.span('estimate', path=feature_class) as span:
+            size = span['bytes_in'] = estimate_shapefile_size(
+                feature_class, where_clause, fields)
+    scratch.reserve(size)
+
+
+def _shapefile_size(feature_class):
+    """
+    Returns the total size of the files of a shapefile, or None for other
+    feature classes
+    """
+
+    if os.path.splitext(feature_class)[1].lower() != '.shp':
+        return None
+    return sum(os.path.getsize(f) for f in get_shapefile_files(feature_class))
+
+
+def validate_copy(input_fc, copy_fc, where_clause=None):
+    """
+    input_fc: Feature class that was copied
+    copy_fc: The copy of input_fc
+    where_clause: SQL expression the copied rows were selected with
+    (optional)
+
+    Raises an exception if the copy doesn't exist or doesn't have the same
+    number of rows as input_fc (or as the rows of input_fc matching
+    where_clause). Returns the number of rows.
     """
+
+    if not metadata_cache.exists(copy_fc):
+        raise Exception('%s was not created' % copy_fc)
+    input_count = count_rows(input_fc, where_clause)
+    copy_count = count_rows(copy_fc)
+    if input_count != copy_count:
+        raise Exception('%s has %d rows but %s has %d' % (
+            copy_fc, copy_count, input_fc, input_count))
+    return copy_count
+
+
+def verify_output(output_file):
+    """
+    output_file: Feature class that was written
+
+    Checks the files of a shapefile output (see verify.verify_shapefile) and
+    raises ShapefileIntegrityError if they are corrupt. Other feature classes
+    aren't checked.
+    """
+
+    if os.path.splitext(output_file)[1].lower() != '.shp':
+        logger.logMsg('Not verifying %s, it is not a shapefile' % output_file)
+        return
+    with logger.span('verify', path=output_file) as span:
+        span['rows'] = verify_shapefile(output_file)
+
+
+def swap_output(staging_file, output_file):
+    """
+    staging_file: Feature class to move into place
+    output_file: Existing feature class to be replaced
+
+    Replaces output_file with staging_file by renaming. The old output is
+    renamed out of the way first and restored if the swap fails. For
+    shapefiles every file of the shapefile is renamed as a group.
+    """
+
+    backup_file = _renamed(output_file, '_old')
     try:
-        output_file = os.path.join(output_location, output_fc)
-        logger.logMsg('Publishing ' + input_fc + ' to ' + output_file)
-        if arcpy.Exists(output_file):
-            logger.logMsg(output_file + ' exists, trying to delete...')
-            arcpy.Delete_management(output_file)
-        logger.logMsg('Exporting %s to %s' % (input_fc, output_file))
-        arcpy.CopyFeatures_management(input_fc, output_file)
-        if archive_folder:
+        if metadata_cache.exists(backup_file):
+            arcpy.Delete_management(backup_file)
+        if os.path.splitext(output_file)[1].lower() == '.shp':
+            _swap_shapefile(staging_file, output_file, backup_file)
+        else:
+            arcpy.Rename_management(output_file, backup_file)
             try:
-                create_archive(archive_folder, output_file)
-            except arcpy.ExecuteError as e:
-                raise e
-                logger.logError()
-        logger.writeLogToFile()
-    except arcpy.ExecuteError as e:
-        raise e
-        logger.logError()
-        logger.writeLogToFile()
+                arcpy.Rename_management(staging_file, output_file)
+            except Exception:
+                arcpy.Rename_management(backup_file, output_file)
+                raise
+        arcpy.Delete_management(backup_file)
+    finally:
+        for feature_class in (staging_file, output_file, backup_file):
+            metadata_cache.invalidate(feature_class)
+    directory_index.refresh(os.path.dirname(output_file))
+
 
+def _swap_shapefile(staging_file, output_file, backup_file):
+    renamed = []
+    try:
+        renamed.extend(_rename_shapefile(output_file, backup_file))
+        renamed.extend(_rename_shapefile(staging_file, output_file))
+    except Exception:
+        for old, new in reversed(renamed):
+            os.rename(new, old)
+        raise
 
-def create_archive(archive_folder, output_file):
+
+def _rename_shapefile(shapefile, new_shapefile):
+    """
+    Renames every file of a shapefile, returning (old, new) pairs
+    """
+
+    base = os.path.splitext(shapefile)[0]
+    new_base = os.path.splitext(new_shapefile)[0]
+    renamed = []
+    try:
+        for file in get_shapefile_files(shapefile):
+            new_file = new_base + file[len(base):]
+            os.rename(file, new_file)
+            renamed.append((file, new_file))
+    except Exception:
+        for old, new in reversed(renamed):
+            os.rename(new, old)
+        raise
+    finally:
+        directory_index.refresh(os.path.dirname(shapefile))
+    return renamed
+
+
+def _renamed(feature_class, suffix):
+    """
+    Returns the feature class path with suffix added to its name
+    (ex. 'Roads.shp' to 'Roads_staging.shp')
+    """
+
+    base, ext = os.path.splitext(feature_class)
+    if ext.lower() != '.shp':
+        base, ext = feature_class, ''
+    return base + suffix + ext
+
+
+def create_archive(archive_folder, output_file, workers=None,
+                   deduplicate=False, verify=False, catalog=False,
+                   manifest=False, where_clause=None, fields=None,
+                   scratch_folder=None, archive_format=None):
     """
     archive_folder: Folder to store zip file
     output_file: Feature class to be archived
+    workers: number of threads used to compress the zip file (optional). When
+    given, the shapefile files, and chunks of large files, are compressed in
+    parallel by a ParallelZipFile. Otherwise zipfile compresses them one at a
+    time.
+    deduplicate: hash the shapefile files first and, if they match the latest
+    archive of this layer, hard link (or copy) that archive instead of
+    compressing a new one (optional). The hashes are kept in an
+    archive_index.sqlite file in the archive folder.
+    verify: check the shapefile for truncated or inconsistent files before
+    anything is zipped (optional, see verify.verify_shapefile)
+    catalog: record the archive in the archive_catalog.sqlite file in the
+    archive folder (optional, see catalog.ArchiveCatalog)
+    manifest: write a JSON manifest next to the zip file with the sizes,
+    CRC-32 and SHA-256 of each member and the feature count (optional, see
+    manifest.make_manifest). The hashes are computed while the members are
+    zipped.
+    where_clause: SQL expression selecting the rows to archive (optional)
+    fields: fields to archive, as in publish_data (optional)
+    scratch_folder: folder for the temporary shapefile (optional, see
+    scratch.default_root)
+    archive_format: 'shapefile', 'gpkg', 'geoparquet' or a list of them
+    (optional, defaults to 'shapefile'). A GeoPackage or GeoParquet file is
+    written straight from output_file next to or instead of the shapefile
+    zip file, named after the layer and the date (ex.
+    'Buildings_2015-03-18.gpkg'), without the shapefile limits on size and
+    field names. GeoParquet needs pyarrow. They are recorded in the catalog
+    with catalog, but aren't deduplicated or given manifests.
 
     Creates a zip file containing a shapefile representation of the
     output_file.
-    If the output_file is not a shapefile, it creates a temporary shapefile to
-    add to the archive.
-    """
-    output_desc = arcpy.Describe(output_file)
-    if not output_desc.dataType == 'ShapeFile':
-        """
-        If output_file isn't a shapefile, create a temporary one to
-        use for archiving
-        """
-        temp_name = arcpy.CreateUniqueName(os.path.basename(output_file),
-                                            arcpy.env.scratchFolder)
-        temp_file = os.path.join(os.environ['TMP'], temp_name)
-        arcpy.CopyFeatures_management(output_file, temp_file)
-        output_file = temp_file
-        logger.logMsg('Creating temporary shapefile %s for archiving' % output_file)
-    logger.logMsg('output_desc.file: %s' % output_desc.file)
-    archive_file = output_desc.file
-    archive_file += '_'
-    archive_file += date.isoformat(datetime.now())
-    archive_file += '.zip'
-    archive_filepath = os.path.join(archive_folder, archive_file)
+    If the output_file is not a shapefile, or only some of its rows or fields
+    are archived, it creates a temporary shapefile to add to the archive in
+    a ScratchWorkspace, which is deleted afterwards. Each step is timed with
+    logger.span.
+    """
+    formats = archive_formats(archive_format)
+    with ScratchWorkspace(scratch_folder) as scratch:
+        with logger.span('describe', path=output_file):
+            output_desc = metadata_cache.describe(output_file)
+        for single_format in formats:
+            if single_format != 'shapefile':
+                _export_archive(output_file, archive_folder, output_desc.file,
+                                single_format, where_clause, fields, catalog)
+        if 'shapefile' not in formats:
+            return
+        if not output_desc.dataType == 'ShapeFile' or where_clause or fields:
+            """
+            If output_file isn't a shapefile, or is filtered, create a
+            temporary one to use for archiving
+            """
+            name = os.path.basename(output_file)
+            if name.lower().endswith('.shp'):
+                name = name[:-4]
+            temp_file = scratch.shapefile(
+                arcpy.ValidateTableName(name, scratch.create()))
+            _reserve_scratch(scratch, output_file, where_clause, fields)
+            _timed_copy(output_file, temp_file, step='temp_copy',
+                        where_clause=where_clause, fields=fields)
+            scratch.checkBudget()
+            output_file = temp_file
+            logger.logMsg('Creating temporary shapefile %s for archiving' %
+                          output_file)
+        logger.logMsg('output_desc.file: %s' % output_desc.file)
+        layer = output_desc.file
+        archive_file = layer
+        archive_file += '_'
+        archive_file += date.isoformat(datetime.now())
+        archive_file += '.zip'
+        archive_filepath = os.path.join(archive_folder, archive_file)
+        if verify:
+            verify_output(output_file)
+        if deduplicate:
+            with logger.span('hash', path=output_file,
+                             bytes_in=_shapefile_size(output_file)):
+                digest = content_digest(get_shapefile_files(output_file))
+            index = ArchiveIndex(archive_folder)
+            try:
+                previous, previous_digest = index.latest(layer)
+            finally:
+                index.close()
+            if previous_digest == digest:
+                if os.path.normcase(previous) != \
+                        os.path.normcase(archive_filepath):
+                    logger.logMsg('%s is identical to %s, linking' % (
+                        output_file, previous))
+                    link_or_copy(previous, archive_filepath)
+                    record_digest(archive_filepath, layer, digest)
+                    if manifest:
+                        copy_manifest(previous, archive_filepath)
+                    if catalog:
+                        catalog_archive(archive_filepath, layer,
+                                        previous=previous)
+                else:
+                    logger.logMsg('%s is identical to %s, skipping' % (
+                        output_file, previous))
+                return
+        if os.path.exists(archive_filepath):
+            # never write through a hard link to an older archive
+            os.remove(archive_filepath)
+        logger.logMsg('Archiving %s to %s' % (output_file, archive_filepath))
+        try:
+            zf = zip_writer(archive_filepath, workers, digests=manifest)
+            with logger.span('zip', path=archive_filepath,
+                             bytes_in=_shapefile_size(output_file)) as span:
+                with zf:
+                    shape_zipper(output_file, zf)
+                    zip_info(zf)
+                    members = zf.namelist()
+                span['bytes_out'] = os.path.getsize(archive_filepath)
+            if manifest:
+                with logger.span('manifest', path=archive_filepath):
+                    write_manifest(archive_filepath, make_manifest(
+                        archive_filepath, layer, zf,
+                        dbf_record_count(output_file)))
+            if deduplicate:
+                record_digest(archive_filepath, layer, digest)
+            if catalog:
+                catalog_archive(archive_filepath, layer, members)
+        except arcpy.ExecuteError as e:
+            raise e
+            logger.logError()
+
+
+def _export_archive(output_file, archive_folder, layer, archive_format,
+                    where_clause, fields, catalog):
+    """
+    Writes a GeoPackage or GeoParquet archive of output_file
+    """
+
+    archive_filepath = archive_path(archive_folder, layer, archive_format)
     logger.logMsg('Archiving %s to %s' % (output_file, archive_filepath))
-    output_desc = arcpy.Describe(output_file)
+    with logger.span(archive_format, path=archive_filepath) as span:
+        export_archive(output_file, archive_filepath, archive_format,
+                       where_clause, fields)
+        span['bytes_out'] = os.path.getsize(archive_filepath)
+    if catalog:
+        catalog_archive(archive_filepath, None)
+
+
+def record_digest(archive_filepath, layer, digest):
+    """
+    archive_filepath: path of the zip file
+    layer: name of the archived layer
+    digest: content hash of the archived files
+
+    Records the archive as the latest one of the layer in the archive index
+    of its folder
+    """
+
+    index = ArchiveIndex(os.path.dirname(archive_filepath))
     try:
-        with zipfile.ZipFile(archive_filepath, mode='w',
-                             compression=zipfile.ZIP_DEFLATED) as zf:
-            shape_zipper(output_file, zf)
-            zip_info(zf)
-    except arcpy.ExecuteError as e:
-        raise e
-        logger.logError()
+        index.record(layer, archive_filepath, digest)
+    finally:
+        index.close()
+
+
+def catalog_archive(archive_filepath, layer, members=None, previous=None):
+    """
+    archive_filepath: path of the zip file
+    layer: name of the archived layer (None to read it from the archive
+    name)
+    members: names of the files in the zip file (optional)
+    previous: zip file that archive_filepath is a link or copy of
+    (optional). Its members and SHA-256 are taken from the catalog, if it
+    is there, instead of reading the zip file again.
+
+    Records the archive in the catalog of its folder
+    """
+
+    with logger.span('catalog', path=archive_filepath):
+        catalog = ArchiveCatalog(os.path.dirname(archive_filepath))
+        try:
+            sha256 = None
+            known = catalog.get(previous) if previous else None
+            if known:
+                members, sha256 = known.members, known.sha256
+            catalog.record(archive_filepath, layer, members=members,
+                           sha256=sha256)
+        finally:
+            catalog.close()
 
 
 def shape_zipper(shapefile, zip):
     """
     shapefile: Path of shapefile to be zipped
-    zip: zip file to add shapefile to
+    zip: zip file to add shapefile to (a zipfile.ZipFile or ParallelZipFile)
 
     Takes a shapefile name and adds all possible shapefile file extensions to
     the given zip file.
@@ -107,30 +709,32 @@ def shape_zipper(shapefile, zip):
                 logger.logError()
 
 
-def get_shapefile_files(shp_name):
+def get_shapefile_files(shp_name, index=None):
     """
     shp_name: The name of the shapefile (ex. Parcels.shp)
+    index: DirectoryIndex to look the files up in (optional, defaults to the
+    index shared by the whole package)
 
     Takes the base name of a shapefile and finds all possible shapefile files
     extensions in the same directory. Returns a list of all shapefile files.
+    The directory is listed once and reused for other shapefiles in it until
+    files in it are added, removed or renamed.
     """
 
-    shapefile_extensions = ['.shp', '.shx', '.dbf', '.sbn', '.sbx', '.fbn',
-                            '.fbx', '.ain', '.aih', '.atx', '.ixs', '.mxs',
-                            '.prj', '.xml', '.cpg']
-    shapefile_wildcard = os.path.splitext(shp_name)[0] + ".*"
-    files = []
-    for file in glob.glob(shapefile_wildcard):
-        if os.path.splitext(file)[1] in shapefile_extensions:
-            files.append(file)
-    return files
+    if index is None:
+        index = directory_index
+    return index.shapefileFiles(shp_name)
 
 
 def zip_info(zip):
     zipInfo = []
     for info in zip.infolist():
+        comment = info.comment
+        if not isinstance(comment, str):
+            # comments are bytes on Python 3
+            comment = comment.decode('utf-8', 'replace')
         zipInfo.append(info.filename)
-        zipInfo.append('\tComment:\t' + info.comment)
+        zipInfo.append('\tComment:\t' + comment)
         zipInfo.append('\tModified:\t' + datetime(*info.date_time).isoformat())
         zipInfo.append('\tSystem:\t\t' + str(info.create_system) + ' (0 = Windows, 3 = Unix)')
         zipInfo.append('\tZIP version:\t' + str(info.create_version))
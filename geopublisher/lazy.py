@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import importlib
+import sys
+import threading
+
+
+class _NeverRaised(Exception):
+    """
+    Stands in for exception classes of modules that haven't been imported.
+    Nothing raises it, so except clauses using it never match.
+    """
+
+
+class LazyModule(object):
+    """
+    name: name of the module to import (ex. arcpy)
+
+    Stands in for a module that is slow to import and imports it the first
+    time one of its attributes is used. Importing arcpy takes 10-20 seconds,
+    so geopublisher only pays for it when a geoprocessing function is called.
+
+    ExecuteError is handled specially: until the module has been imported
+    anywhere, it is a placeholder exception that is never raised, so
+    "except arcpy.ExecuteError" clauses don't import arcpy (or fail without
+    it) while handling unrelated errors.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def load(self):
+        """
+        Imports the module if it hasn't been yet and returns it
+        """
+
+        module = self.__dict__['_module']
+        if module is None:
+            with self._lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    self.__dict__['_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, attr):
+        if not self.loaded and attr == 'ExecuteError' and \
+                sys.modules.get(self._name) is None:
+            return _NeverRaised
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return '<LazyModule {0} ({1})>'.format(self._name, state)
+
+
+# Shared stand-in for arcpy used by the package
+arcpy = LazyModule('arcpy')
@@ -1,28 +1,237 @@
 import sys
+import atexit
 import datetime
+import json
 import os
-from arcpy import GetMessages
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
-class Logger:
-    log = ''
+
+class LogWriter(object):
+    """
+    maxBatch: most pieces of text to write in one go
+
+    Appends text to log files on a background thread so callers don't wait
+    for file I/O. Text queued close together is batched into one write per
+    file. A writer only works in the process that created it; forked
+    processes (ex. publish_many workers) get their own from getLogWriter.
+    """
+
+    def __init__(self, maxBatch=1000):
+        self.maxBatch = maxBatch
+        self.pid = os.getpid()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='LogWriter')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, logFile, text):
+        """
+        logFile: file to append to
+        text: text to append
+        """
+
+        self.queue.put((logFile, text))
+
+    def flush(self):
+        """
+        Waits until all queued text has been written
+        """
+
+        if self.pid != os.getpid():
+            # inherited through a fork, its thread isn't running here
+            return
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            try:
+                while len(items) < self.maxBatch:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self._writeBatch(items)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                for item in items:
+                    self.queue.task_done()
+
+    def _writeBatch(self, items):
+        files = []
+        texts = {}
+        for logFile, text in items:
+            if logFile not in texts:
+                files.append(logFile)
+                texts[logFile] = []
+            texts[logFile].append(text)
+        for logFile in files:
+            with open(logFile, mode='a') as f:
+                f.write(''.join(texts[logFile]))
+
+
+_writer = None
+_writerLock = threading.Lock()
+
+
+def GetMessages(severity=0):
+    """
+    Returns the arcpy geoprocessing messages. arcpy is imported on the first
+    call instead of with this module since importing it is slow.
+    """
+
+    import arcpy
+    return arcpy.GetMessages(severity)
+
+
+def getLogWriter():
+    """
+    Returns the LogWriter shared by all background loggers in this process,
+    starting it the first time
+    """
+
+    global _writer
+    with _writerLock:
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = LogWriter()
+            atexit.register(_writer.flush)
+    return _writer
+
+
+def _resetAfterFork():
+    # the lock may have been held by another thread when the process forked
+    global _writerLock
+    _writerLock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_resetAfterFork)
+
+
+class Logger(object):
+    """
+    addLogsToArcpyMessages: (optional) also add messages to the arcpy
+    geoprocessing messages
+    maxEntries: (optional) only keep this many of the latest messages in
+    memory. Older messages are written to the log file before they are
+    dropped.
+    flushEvery: (optional) write the messages to the log file every time this
+    many have been logged, rather than only when writeLogToFile is called
+    background: (optional) hand writes to a LogWriter thread instead of
+    writing the log file before returning
+
+    Loggers can be shared between threads. Use jobContext to tag the messages
+    a thread logs for one job. Steps timed with span are written as JSON lines
+    to a spans file next to the log file.
+    """
     logFolder = os.path.join(os.getcwd(), 'Logs')
     scriptName = ''
     addLogsToArcpyMessages = False
 
-    def __init__(self, addLogsToArcpyMessages=False):
+    def __init__(self, addLogsToArcpyMessages=False, maxEntries=None,
+                 flushEvery=None, background=False):
         self.addLogsToArcpyMessages = addLogsToArcpyMessages
+        self.background = background
+        self._lock = threading.RLock()
+        self._context = threading.local()
+        if maxEntries and (not flushEvery or flushEvery > maxEntries):
+            flushEvery = maxEntries
+        self.flushEvery = flushEvery
         now = datetime.datetime.now()
         today = datetime.date.isoformat(now.date())
         time = datetime.time.isoformat(now.time())
         self.scriptName = os.path.split(sys.argv[0])[1]
-        self.log = "{0} || {1} || {2} || {3}".format(self.scriptName, today, time, os.getenv('COMPUTERNAME'))
-
-        if not os.path.exists(self.logFolder):
-            os.mkdir(self.logFolder)
+        self.header = "{0} || {1} || {2} || {3}".format(self.scriptName, today, time, os.getenv('COMPUTERNAME'))
+        self.entries = deque(maxlen=maxEntries)
+        self._unwritten = []
+        self._headerWritten = False
 
+        # the log folder is created when the log is first written
         self.logFile = os.path.join(self.logFolder, today + '.txt')
-        print('Logger Initialized: {0}'.format(self.log))
+        self.spanFile = os.path.join(self.logFolder, today + '_spans.jsonl')
+        print('Logger Initialized: {0}'.format(self.header))
+
+    @property
+    def log(self):
+        """
+        The header and the messages kept in memory, one per line
+        """
+
+        with self._lock:
+            return '\n'.join([self.header] + list(self.entries))
+
+    @contextmanager
+    def jobContext(self, **context):
+        """
+        context: values identifying the job, such as job and layer
+
+        Tags every message logged by this thread inside the with block with
+        the context (ex. '[job=3 layer=Parcels.shp] Adding Parcels.dbf...').
+        Contexts can be nested.
+        """
+
+        previous = getattr(self._context, 'values', {})
+        values = dict(previous)
+        values.update(context)
+        self._context.values = values
+        try:
+            yield
+        finally:
+            self._context.values = previous
+
+    @contextmanager
+    def span(self, step, **fields):
+        """
+        step: name of the step being timed (ex. 'copy')
+        fields: values to record with the step, such as bytes_in, bytes_out
+        or rows
+
+        Times the with block and writes a JSON record of it to the spans file
+        with the step, the job context, the start time, the duration in
+        seconds and the fields. The record is yielded so values only known at
+        the end of the step can be added to it. Failed steps are recorded
+        with an error.
+        """
+
+        record = dict(getattr(self._context, 'values', None) or {})
+        record.update(fields)
+        record['step'] = step
+        start = datetime.datetime.now()
+        record['start'] = start.isoformat()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = '{0}: {1}'.format(type(e).__name__, e)
+            raise
+        finally:
+            record['duration'] = (datetime.datetime.now() -
+                                  start).total_seconds()
+            self.logSpan(record)
+
+    def logSpan(self, record):
+        """
+        record: dictionary describing a timed step
+
+        Appends the record to the spans file as one line of JSON
+        """
+
+        line = json.dumps(record, sort_keys=True, default=str) + '\n'
+        _makeFolder(os.path.dirname(self.spanFile))
+        if self.background:
+            getLogWriter().write(self.spanFile, line)
+        else:
+            with self._lock:
+                with open(self.spanFile, mode='a') as f:
+                    f.write(line)
 
     def logMsg(self, msg, printMsg=True):
         """
@@ -35,14 +244,26 @@ class Logger:
         """
 
         time = datetime.time.isoformat(datetime.datetime.now().time())
-        self.log = '{0}\n{1} | {2}'.format(self.log, time, msg)
+        context = getattr(self._context, 'values', None)
+        if context:
+            msg = '[{0}] {1}'.format(' '.join(
+                '{0}={1}'.format(key, context[key])
+                for key in sorted(context)), msg)
+        entry = '{0} | {1}'.format(time, msg)
+        with self._lock:
+            self.entries.append(entry)
+            self._unwritten.append(entry)
+            flush = self.flushEvery and len(self._unwritten) >= self.flushEvery
         if printMsg:
-            print msg
+            print(msg)
 
         if self.addLogsToArcpyMessages:
             from arcpy import AddMessage
             AddMessage(msg)
 
+        if flush:
+            self.writeLogToFile()
+
     def logGPMsg(self, printMsg=True):
         """
         printMsg: boolean value whether or not to print the message
@@ -58,21 +279,69 @@ class Logger:
         except:
             self.logMsg('Error getting arcpy message', printMsg)
 
-    def writeLogToFile(self):
+    def writeLogToFile(self, wait=False):
         """
-        Writes the log to a file
+        wait: (optional) for background loggers, wait until the messages are
+        in the file before returning
+
+        Writes the messages logged since the last write to the log file. The
+        header is written before the first message.
         """
 
-        with open(self.logFile, mode='a') as f:
-            f.write('\n\n{0}'.format(self.log))
+        with self._lock:
+            lines = self._unwritten
+            self._unwritten = []
+            if not self._headerWritten:
+                lines.insert(0, '\n' + self.header)
+                self._headerWritten = True
+            if lines:
+                text = ''.join('\n' + line for line in lines)
+                _makeFolder(os.path.dirname(self.logFile))
+                if self.background:
+                    getLogWriter().write(self.logFile, text)
+                else:
+                    with open(self.logFile, mode='a') as f:
+                        f.write(text)
+        if self.background and wait:
+            getLogWriter().flush()
 
     def logError(self, printMsg=True):
         """
         Logs the error traceback
         """
 
-        import traceback
-
         self.logMsg('**ERROR**', printMsg)
         errMsg = traceback.format_exc()
         self.logMsg(errMsg, printMsg)
+
+
+class LazyLogger(object):
+    """
+    kwargs: arguments for the Logger
+
+    Stands in for a Logger and creates it the first time it is used, so
+    modules can have a logger without printing or creating the Logs folder
+    when they are imported
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._logger = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._logger is None:
+            with self._lock:
+                if self._logger is None:
+                    self._logger = Logger(**self._kwargs)
+        return getattr(self._logger, attr)
+
+
+def _makeFolder(folder):
+    if not os.path.exists(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            # another thread or process made it first
+            if not os.path.isdir(folder):
+                raise
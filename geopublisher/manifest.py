@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import struct
+from datetime import datetime
+
+
+def manifest_path(archive):
+    """
+    archive: path of a zip file
+
+    Returns the path of the manifest written next to it
+    (ex. Parcels.shp_2015-03-18.zip.json)
+    """
+
+    return archive + '.json'
+
+
+def make_manifest(archive, layer, zf, features=None):
+    """
+    archive: path of the zip file
+    layer: name of the archived layer
+    zf: the closed zip file, with the SHA-256 of its members in digests (see
+    zipper.zip_writer)
+    features: number of features in the layer (optional)
+
+    Returns the manifest of the archive: its name, layer, date, size and
+    feature count, and the name, sizes, CRC-32 and SHA-256 of each member.
+    Everything comes from what was recorded while the zip was written, so
+    nothing is read again.
+    """
+
+    members = []
+    for info in zf.infolist():
+        members.append({
+            'name': info.filename,
+            'size': info.file_size,
+            'compressed_size': info.compress_size,
+            'crc32': '%08x' % info.CRC,
+            'sha256': zf.digests.get(info.filename),
+        })
+    return {
+        'archive': os.path.basename(archive),
+        'layer': layer,
+        'created': datetime.now().isoformat(),
+        'size': os.path.getsize(archive),
+        'features': features,
+        'members': members,
+    }
+
+
+def write_manifest(archive, manifest):
+    """
+    archive: path of the zip file
+    manifest: manifest of the zip file, see make_manifest
+
+    Writes the manifest next to the zip file as compact JSON
+    """
+
+    path = manifest_path(archive)
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f, sort_keys=True, separators=(',', ':'))
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(temp_file, path)
+
+
+def load_manifest(archive):
+    """
+    archive: path of a zip file
+
+    Returns the manifest written next to the zip file, or None
+    """
+
+    path = manifest_path(archive)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def copy_manifest(previous, archive):
+    """
+    previous: zip file that archive is a copy or link of
+    archive: path of the new zip file
+
+    Writes a manifest for archive from the manifest of previous. Returns
+    False if previous has no manifest.
+    """
+
+    manifest = load_manifest(previous)
+    if manifest is None:
+        return False
+    manifest['archive'] = os.path.basename(archive)
+    manifest['created'] = datetime.now().isoformat()
+    write_manifest(archive, manifest)
+    return True
+
+
+def dbf_record_count(shapefile):
+    """
+    shapefile: path of a shapefile
+
+    Returns the number of records in the header of its .dbf, or None if it
+    can't be read
+    """
+
+    try:
+        with open(os.path.splitext(shapefile)[0] + '.dbf', 'rb') as f:
+            header = f.read(8)
+    except (IOError, OSError):
+        return None
+    if len(header) < 8:
+        return None
+    return struct.unpack('<I', header[4:8])[0]
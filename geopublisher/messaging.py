@@ -1,4 +1,13 @@
-from smtplib import SMTP, SMTPException
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from smtplib import (SMTP, SMTPException, SMTPRecipientsRefused,
+                     SMTPResponseException, SMTPServerDisconnected)
 from email.mime.text import MIMEText
 
 
@@ -7,14 +16,23 @@ class Emailer:
     toAddress: python list of addresses to send emails to
     testing: (optional) set to true to not actually send the email but print
     the email output to stdout instead
+    digest: (optional) set to true to collect emails instead of sending them
+    and send them as one summary email per list of recipients with sendDigest
+
+    timeout is the most seconds to wait for the mail server to answer, so a
+    server that never does can't hang the script.
     """
     fromAddress = 'noreply@sanjuanco.com'
     toAddress = []
     server = 'mail.sanjuanco.com'
     port = 25
+    timeout = 60
 
-    def __init__(self, toAddress, testing=False):
+    def __init__(self, toAddress, testing=False, digest=False):
         self.testing = testing
+        self.digest = digest
+        self._digestEmails = []
+        self._smtp = None
 
         if len(toAddress) > 0:
             self.toAddress = toAddress
@@ -31,7 +49,9 @@ class Emailer:
         toAddress: (optional) python list of email recipients instead of those
         already specified in the class definition
 
-        Sends an email through the County email server
+        Sends an email through the County email server. Inside a session()
+        the session's connection is used, and in digest mode the email is
+        collected for sendDigest instead.
         """
 
         if not toAddress:
@@ -42,8 +62,19 @@ class Emailer:
         message['From'] = self.fromAddress
         message['To'] = ','.join(toAddress)
 
-        if not self.testing:
-            s = SMTP(self.server, self.port)
+        if self.digest:
+            self._digestEmails.append((list(toAddress), subject, body))
+        elif self._smtp is not None:
+            try:
+                self._smtp.sendmail(self.fromAddress, toAddress,
+                                    message.as_string())
+            except SMTPServerDisconnected:
+                # the server closed the idle connection, so reconnect once
+                self._smtp = self._connect()
+                self._smtp.sendmail(self.fromAddress, toAddress,
+                                    message.as_string())
+        elif not self.testing:
+            s = self._connect()
             try:
                 s.sendmail(self.fromAddress, toAddress, message.as_string())
             except SMTPException:
@@ -53,3 +84,228 @@ class Emailer:
             print('*** Test Email Message to {0} ***'.format(toAddress))
             print(message)
             print('*** End Email Message ***')
+
+    def _connect(self):
+        return SMTP(self.server, self.port, timeout=self.timeout)
+
+    @contextmanager
+    def session(self):
+        """
+        Keeps one connection to the mail server open for all the emails sent
+        inside the with block, instead of connecting for every email
+
+        with emailer.session():
+            emailer.sendEmail('Parcels published', body)
+            emailer.sendEmail('Roads published', body)
+        """
+
+        if self.testing or self._smtp is not None:
+            yield self
+            return
+        self._smtp = self._connect()
+        try:
+            yield self
+        finally:
+            smtp, self._smtp = self._smtp, None
+            try:
+                smtp.quit()
+            except SMTPServerDisconnected:
+                pass
+
+    def sendDigest(self, subject):
+        """
+        subject: subject of the summary emails
+
+        Sends the emails collected in digest mode as one summary email for
+        each list of recipients, over a single connection. Does nothing if no
+        emails were collected.
+        """
+
+        emails, self._digestEmails = self._digestEmails, []
+        recipients = []
+        bodies = {}
+        for toAddress, emailSubject, body in emails:
+            key = tuple(toAddress)
+            if key not in bodies:
+                recipients.append(key)
+                bodies[key] = []
+            bodies[key].append('{0}\n{1}\n{2}'.format(
+                emailSubject, '-' * len(emailSubject), body))
+        digest, self.digest = self.digest, False
+        try:
+            with self.session():
+                for key in recipients:
+                    self.sendEmail(subject, '\n\n'.join(bodies[key]),
+                                   list(key))
+        finally:
+            self.digest = digest
+
+
+class Outbox:
+    """
+    emailer: Emailer whose settings are used to deliver the emails
+    folder: folder to spool emails in (created if it doesn't exist)
+    retryDelay: (optional) seconds to wait after the first failed delivery.
+    The wait doubles after every failure in a row.
+    maxDelay: (optional) longest wait between delivery attempts in seconds
+    exitTimeout: (optional) seconds to keep delivering when the script ends.
+    Emails still in the outbox after that are sent by the next Outbox started
+    on the same folder.
+
+    Sends emails without making the caller wait for the mail server. Each
+    email is saved to a file in the outbox folder and delivered by a
+    background thread, which keeps retrying with exponential backoff while
+    the server is slow or down. Emails already in the folder when the Outbox
+    starts, such as ones left by a previous run, are delivered first.
+    Emails that can never be delivered, because the server rejected them
+    for good (a 5xx reply, such as refused recipients) or their file can't
+    be read, are moved to a failed folder inside the outbox so the emails
+    after them still go out.
+    """
+
+    def __init__(self, emailer, folder, retryDelay=5, maxDelay=600,
+                 exitTimeout=10):
+        self.emailer = copy.copy(emailer)
+        self.emailer.digest = False
+        self.emailer._smtp = None
+        self.folder = folder
+        self.failedFolder = os.path.join(folder, 'failed')
+        self.retryDelay = retryDelay
+        self.maxDelay = maxDelay
+        self.exitTimeout = exitTimeout
+        self.failures = 0
+        self.lastError = None
+        self._wake = threading.Event()
+        self._stopping = False
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.thread = threading.Thread(target=self._run, name='Outbox')
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def queueEmail(self, subject, body, toAddress=False):
+        """
+        subject: subject of email
+        body: text body of email
+        toAddress: (optional) python list of email recipients instead of
+        those of the emailer
+
+        Saves the email to the outbox and returns without waiting for it to
+        be delivered
+        """
+
+        email = {'subject': subject, 'body': body,
+                 'toAddress': list(toAddress or self.emailer.toAddress)}
+        name = '{0:.6f}_{1}'.format(time.time(), uuid.uuid4().hex)
+        temp_file = os.path.join(self.folder, name + '.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump(email, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_file, os.path.join(self.folder, name + '.json'))
+        self._wake.set()
+
+    def pending(self):
+        """
+        Returns the files of the emails waiting to be delivered, oldest first
+        """
+
+        return sorted(os.path.join(self.folder, name)
+                      for name in os.listdir(self.folder)
+                      if name.endswith('.json'))
+
+    def flush(self, timeout=None):
+        """
+        timeout: (optional) most seconds to wait
+
+        Waits until every email in the outbox has been delivered. Returns
+        True if the outbox is empty.
+        """
+
+        end = None if timeout is None else time.time() + timeout
+        self._wake.set()
+        while self.pending():
+            if end is not None and time.time() >= end:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self, timeout=None):
+        """
+        timeout: (optional) most seconds to wait for emails to be delivered,
+        defaults to exitTimeout
+
+        Tries to deliver the emails in the outbox and stops the delivery
+        thread. Emails that couldn't be delivered stay in the outbox.
+        """
+
+        if self._stopping:
+            return
+        self.flush(self.exitTimeout if timeout is None else timeout)
+        self._stopping = True
+        self._wake.set()
+        self.thread.join(1)
+
+    def _run(self):
+        while not self._stopping:
+            files = self.pending()
+            if files and self._deliver(files):
+                self.failures = 0
+                continue
+            if files:
+                self.failures += 1
+                delay = min(self.retryDelay * 2 ** (self.failures - 1),
+                            self.maxDelay)
+            else:
+                delay = None
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _deliver(self, files):
+        """
+        Sends the emails in files over one connection, deleting each file
+        once it is sent and moving emails that can never be sent to the
+        failed folder. Returns False if the server couldn't be reached or
+        failed for a while, leaving the unsent emails for the next attempt.
+        """
+
+        try:
+            with self.emailer.session():
+                for file in files:
+                    try:
+                        with open(file, 'r') as f:
+                            email = json.load(f)
+                        self.emailer.sendEmail(email['subject'],
+                                               email['body'],
+                                               email['toAddress'])
+                    except Exception as e:
+                        if not _permanent(e):
+                            raise
+                        self.lastError = e
+                        self._moveToFailed(file)
+                    else:
+                        os.remove(file)
+        except Exception as e:
+            self.lastError = e
+            return False
+        return True
+
+    def _moveToFailed(self, file):
+        if not os.path.exists(self.failedFolder):
+            os.makedirs(self.failedFolder)
+        os.rename(file, os.path.join(self.failedFolder,
+                                     os.path.basename(file)))
+
+
+def _permanent(error):
+    """
+    Returns True if sending an email failed in a way retrying won't fix
+    """
+
+    if isinstance(error, (ValueError, KeyError, TypeError,
+                          SMTPRecipientsRefused)):
+        # unreadable spool file, or every recipient refused
+        return True
+    return isinstance(error, SMTPResponseException) and \
+        error.smtp_code >= 500
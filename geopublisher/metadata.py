@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .lazy import arcpy
+
+
+def default_ttl():
+    """
+    Returns the seconds a metadata lookup is trusted: GEOPUBLISHER_METADATA_TTL
+    if it is set, otherwise 0, which turns the cache off. Datasets deleted or
+    created by other programs look unchanged until the ttl runs out, so the
+    cache is only used when asked for.
+    """
+
+    ttl = os.getenv('GEOPUBLISHER_METADATA_TTL')
+    return float(ttl) if ttl else 0.0
+
+
+class MetadataCache:
+    """
+    ttl: seconds a lookup is trusted before it is made again (optional, see
+    default_ttl)
+    maxEntries: most lookups kept, the least recently used are dropped first
+    (optional)
+    clock: function returning the current time in seconds (optional)
+
+    Remembers the results of arcpy.Describe and arcpy.Exists by path. Against
+    an enterprise geodatabase each of these is a round trip to the database,
+    and in batch runs the same feature classes are looked up again and
+    again. Failed lookups (ex. Describe of a missing dataset) aren't kept.
+
+    Anything that writes a dataset must call invalidate with its path, which
+    forgets the dataset, everything inside it and the workspaces and folders
+    holding it. Changes made by other programs are seen once ttl runs out.
+    hits and misses count the lookups answered from the cache and made with
+    arcpy, see stats.
+    """
+
+    def __init__(self, ttl=None, maxEntries=1024, clock=time.time):
+        self.ttl = ttl if ttl is not None else default_ttl()
+        self.maxEntries = maxEntries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def describe(self, path):
+        """
+        path: dataset, workspace or file to describe
+
+        Returns arcpy.Describe(path), from the cache when it is fresh
+        """
+
+        return self._lookup('describe', path, arcpy.Describe)
+
+    def exists(self, path):
+        """
+        path: dataset, workspace or file to look for
+
+        Returns arcpy.Exists(path), from the cache when it is fresh
+        """
+
+        return self._lookup('exists', path, arcpy.Exists)
+
+    def invalidate(self, path=None):
+        """
+        path: (optional) dataset that was written, defaults to everything
+
+        Forgets the lookups of path, of everything inside it and of the
+        workspaces and folders that hold it
+        """
+
+        with self._lock:
+            self._generation += 1
+            if path is None:
+                self._entries.clear()
+                return
+            key = _key(path)
+            for kind, entry_path in list(self._entries):
+                if entry_path == key or \
+                        entry_path.startswith(key + os.sep) or \
+                        key.startswith(entry_path.rstrip(os.sep) + os.sep):
+                    del self._entries[(kind, entry_path)]
+
+    def stats(self):
+        """
+        Returns a dictionary of the hits, misses, evictions and entries of the
+        cache
+        """
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries)}
+
+    def _lookup(self, kind, path, function):
+        entry_key = (kind, _key(path))
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and now - entry[0] < self.ttl:
+                # most recently used last
+                del self._entries[entry_key]
+                self._entries[entry_key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = function(path)
+        with self._lock:
+            # a dataset invalidated while it was looked up may have changed
+            if self.ttl > 0 and generation == self._generation:
+                self._entries.pop(entry_key, None)
+                self._entries[entry_key] = (now, value)
+                while len(self._entries) > self.maxEntries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+# Cache shared by publish_data, create_archive and publish_delta
+metadata_cache = MetadataCache()
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import errno
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from .lazy import arcpy
+from .subset import count_rows, field_pairs
+
+
+# Bytes a value of each field type takes in a dbf record. Strings take their
+# length, up to 254, and types shapefiles don't keep take nothing.
+DBF_WIDTHS = {
+    'SmallInteger': 5,
+    'Integer': 10,
+    'Single': 13,
+    'Double': 19,
+    'Date': 8,
+    'GUID': 38,
+    'GlobalID': 38,
+}
+
+# Scratch workspaces that haven't been cleaned up, removed at exit
+_active = set()
+_active_lock = threading.Lock()
+
+
+class ScratchBudgetExceeded(Exception):
+    """
+    Raised when a scratch workspace would use more than its budget or more
+    than the free space of its root folder
+    """
+
+
+def default_root():
+    """
+    Returns the folder scratch workspaces are created in:
+    GEOPUBLISHER_SCRATCH if it is set (ex. a tmpfs such as /dev/shm or a RAM
+    disk), otherwise the temp folder
+    """
+
+    return os.getenv('GEOPUBLISHER_SCRATCH') or tempfile.gettempdir()
+
+
+def default_budget():
+    """
+    Returns the most bytes a scratch workspace may use, from
+    GEOPUBLISHER_SCRATCH_BUDGET (in MB) if it is set, otherwise None for no
+    limit
+    """
+
+    budget = os.getenv('GEOPUBLISHER_SCRATCH_BUDGET')
+    return int(float(budget) * 1024 * 1024) if budget else None
+
+
+class ScratchWorkspace:
+    """
+    root: folder to create the scratch folder in (optional, see
+    default_root)
+    budget: most bytes the scratch folder may use (optional, see
+    default_budget)
+    prefix: start of the scratch folder name (optional)
+
+    A folder of temporary files for one job. The folder is created when the
+    first path is handed out. Used as a context manager, it is deleted with
+    everything in it on leaving, whether the job succeeded or failed.
+    Workspaces that are still open when Python exits are deleted then, and
+    folders left behind by processes that were killed are swept from the
+    root the next time a workspace is created there. Each folder holds a
+    pid file naming the process that made it, so the folders of long runs
+    that are still going are never swept.
+
+    Paths are handed out with path, shapefile and geodatabase, which keep
+    track of them. Before writing something of a known size call reserve,
+    and after writing call checkBudget; both raise ScratchBudgetExceeded if
+    the budget or the disk would be overrun.
+    """
+
+    # folders older than this are swept once the process that made them has
+    # exited
+    staleAge = 24 * 60 * 60
+
+    # file in the scratch folder naming the host and process that made it
+    pidName = '.geopublisher.pid'
+
+    def __init__(self, root=None, budget=None,
+                 prefix='geopublisher_scratch_'):
+        self.root = root or default_root()
+        self.budget = budget if budget is not None else default_budget()
+        self.prefix = prefix
+        self.folder = None
+        self.artifacts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.cleanup()
+
+    def create(self):
+        """
+        Creates the scratch folder, if it hasn't been yet, and returns it
+        """
+
+        if self.folder is None:
+            if not os.path.isdir(self.root):
+                os.makedirs(self.root)
+            sweep(self.root, self.prefix, self.staleAge)
+            self.folder = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+            with open(os.path.join(self.folder, self.pidName), 'w') as f:
+                f.write('%s %d' % (socket.gethostname(), os.getpid()))
+            with _active_lock:
+                _active.add(self)
+        return self.folder
+
+    def path(self, name):
+        """
+        name: file or dataset name (ex. Parcels.shp)
+
+        Returns a path in the scratch folder that isn't in use yet, adding a
+        number to name if needed, and tracks it
+        """
+
+        folder = self.create()
+        base, ext = os.path.splitext(name)
+        candidate = name
+        number = 0
+        while os.path.exists(os.path.join(folder, candidate)) or \
+                os.path.join(folder, candidate) in self.artifacts:
+            number += 1
+            candidate = '%s_%d%s' % (base, number, ext)
+        path = os.path.join(folder, candidate)
+        self.artifacts.append(path)
+        return path
+
+    def shapefile(self, name):
+        """
+        name: name of the shapefile, with or without .shp
+
+        Returns a path for a temporary shapefile
+        """
+
+        return self.path(os.path.splitext(name)[0] + '.shp')
+
+    def geodatabase(self, name):
+        """
+        name: name of the file geodatabase, with or without .gdb
+
+        Creates a temporary file geodatabase and returns its path
+        """
+
+        gdb = self.path(os.path.splitext(name)[0] + '.gdb')
+        arcpy.CreateFileGDB_management(os.path.dirname(gdb),
+                                       os.path.basename(gdb))
+        return gdb
+
+    def used(self):
+        """
+        Returns the number of bytes in the scratch folder
+        """
+
+        if self.folder is None:
+            return 0
+        size = 0
+        for folder, _, files in os.walk(self.folder):
+            for file in files:
+                if file == self.pidName and folder == self.folder:
+                    continue
+                try:
+                    size += os.path.getsize(os.path.join(folder, file))
+                except OSError:
+                    pass
+        return size
+
+    def reserve(self, size):
+        """
+        size: bytes about to be written to the scratch folder
+
+        Raises ScratchBudgetExceeded if writing them would go over the budget
+        or fill the disk
+        """
+
+        if not size:
+            return
+        if self.budget is not None and self.used() + size > self.budget:
+            raise ScratchBudgetExceeded(
+                '%d more bytes would put %s over its budget of %d bytes' % (
+                    size, self.create(), self.budget))
+        available = free_space(self.create())
+        if available is not None and size > available:
+            raise ScratchBudgetExceeded(
+                '%s has %d bytes free but %d are needed' % (
+                    self.root, available, size))
+
+    def checkBudget(self):
+        """
+        Raises ScratchBudgetExceeded if the scratch folder uses more than the
+        budget. Returns the bytes used.
+        """
+
+        used = self.used()
+        if self.budget is not None and used > self.budget:
+            raise ScratchBudgetExceeded(
+                '%s uses %d bytes, over its budget of %d bytes' % (
+                    self.folder, used, self.budget))
+        return used
+
+    def cleanup(self):
+        """
+        Deletes the scratch folder and everything in it
+        """
+
+        if self.folder is None:
+            return
+        if arcpy.loaded:
+            # release arcpy's locks on the datasets it made
+            for artifact in reversed(self.artifacts):
+                try:
+                    if arcpy.Exists(artifact):
+                        arcpy.Delete_management(artifact)
+                except Exception:
+                    pass
+        shutil.rmtree(self.folder, ignore_errors=True)
+        with _active_lock:
+            _active.discard(self)
+        self.folder = None
+        self.artifacts = []
+
+
+def sweep(root, prefix='geopublisher_scratch_',
+          maxAge=ScratchWorkspace.staleAge):
+    """
+    root: folder scratch workspaces are created in
+    prefix: start of the scratch folder names
+    maxAge: seconds since a folder was last modified before it is deleted
+
+    Deletes scratch folders left behind by processes that didn't clean up
+    (ex. ones that were killed). A folder is only deleted once it is older
+    than maxAge and the process named in its pid file has exited. Folders
+    made on other hosts sharing the root can't be checked and are kept.
+    Returns the folders deleted.
+    """
+
+    deleted = []
+    cutoff = time.time() - maxAge
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return deleted
+    with _active_lock:
+        active = set(workspace.folder for workspace in _active)
+    for name in names:
+        folder = os.path.join(root, name)
+        if not name.startswith(prefix) or folder in active or \
+                not os.path.isdir(folder):
+            continue
+        try:
+            if os.path.getmtime(folder) > cutoff:
+                continue
+        except OSError:
+            continue
+        if _owner_running(folder):
+            continue
+        shutil.rmtree(folder, ignore_errors=True)
+        deleted.append(folder)
+    return deleted
+
+
+def _owner_running(folder):
+    """
+    Returns True if the process named in the pid file of a scratch folder
+    is still running, or can't be checked because it ran on another host
+    """
+
+    try:
+        with open(os.path.join(folder, ScratchWorkspace.pidName)) as f:
+            host, pid = f.read().split()
+        pid = int(pid)
+    except (IOError, OSError, ValueError):
+        # folders without a pid file are swept on age alone
+        return False
+    if host != socket.gethostname():
+        return True
+    return _pid_running(pid)
+
+
+def _pid_running(pid):
+    if sys.platform == 'win32':
+        # os.kill would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            # access denied means the process exists
+            return ctypes.GetLastError() == 5
+        try:
+            code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            # STILL_ACTIVE
+            return code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def estimate_shapefile_size(feature_class, where_clause=None, fields=None,
+                            sample=100):
+    """
+    feature_class: Feature class that will be copied to a shapefile
+    where_clause: SQL expression selecting the rows to copy (optional)
+    fields: fields to copy, see subset.field_pairs (optional)
+    sample: number of geometries read to find their average size (optional)
+
+    Returns an estimate of the bytes a shapefile copy of the feature class
+    takes: the number of rows times the width of a dbf record plus the
+    average size of the first geometries. Used to reserve room before
+    copying feature classes whose size isn't known, such as ones in a file
+    or enterprise geodatabase.
+    """
+
+    rows = count_rows(feature_class, where_clause)
+    if not rows:
+        return 1024
+    width = dbf_record_width(arcpy.ListFields(feature_class), fields)
+    geometry_bytes = 0
+    sampled = 0
+    with arcpy.da.SearchCursor(feature_class, ['SHAPE@WKB'],
+                               where_clause) as cursor:
+        for row in cursor:
+            geometry_bytes += len(row[0]) if row[0] else 0
+            sampled += 1
+            if sampled >= sample:
+                break
+    average = float(geometry_bytes) / max(sampled, 1)
+    # shp and shx record headers, and the headers of the files
+    return int(rows * (width + average + 16)) + 1024
+
+
+def dbf_record_width(feature_class_fields, fields=None):
+    """
+    feature_class_fields: fields of the feature class (from arcpy.ListFields)
+    fields: fields that are copied, see subset.field_pairs (optional,
+    defaults to all of them)
+
+    Returns the bytes of one record of a dbf file holding the fields
+    """
+
+    copied = None
+    if fields:
+        copied = set(name.lower() for name, _ in field_pairs(fields))
+    width = 1
+    for field in feature_class_fields:
+        if copied is not None and field.name.lower() not in copied:
+            continue
+        if field.type == 'String':
+            width += min(field.length, 254)
+        else:
+            width += DBF_WIDTHS.get(field.type, 0)
+    return width
+
+
+def free_space(folder):
+    """
+    Returns the bytes free on the disk holding folder, or None if it can't
+    be found out
+    """
+
+    if hasattr(shutil, 'disk_usage'):
+        return shutil.disk_usage(folder).free
+    if hasattr(os, 'statvfs'):
+        stat = os.statvfs(folder)
+        return stat.f_bavail * stat.f_frsize
+    if sys.platform == 'win32':
+        import ctypes
+        free = ctypes.c_ulonglong(0)
+        if ctypes.windll.kernel32.GetDiskFreeSpaceExW(
+                ctypes.c_wchar_p(folder), ctypes.byref(free), None, None):
+            return free.value
+    return None
+
+
+@atexit.register
+def _cleanup_all():
+    with _active_lock:
+        workspaces = list(_active)
+    for workspace in workspaces:
+        workspace.cleanup()
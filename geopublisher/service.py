@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+import binascii
+import errno
+import getpass
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import (Client, Listener, answer_challenge,
+                                        deliver_challenge)
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .lazy import arcpy
+from .metadata import metadata_cache
+
+
+# Replies that end a request
+FINAL_STATUSES = frozenset(['finished', 'failed', 'rejected', 'error', 'ok',
+                            'stopping'])
+
+# Functions run for each action, looked up in the geopublisher module
+ACTIONS = {
+    'publish': 'publish_data',
+    'archive': 'create_archive',
+    'fanout': 'publish_fanout',
+}
+
+
+def default_address():
+    """
+    Returns the address the service listens on: GEOPUBLISHER_ADDRESS if it
+    is set, otherwise a named pipe on Windows or a Unix socket in a folder
+    of the temp folder that only the current user can open elsewhere
+    """
+
+    address = os.getenv('GEOPUBLISHER_ADDRESS')
+    if address:
+        return address
+    if sys.platform == 'win32':
+        return r'\\.\pipe\geopublisher-' + getpass.getuser()
+    return os.path.join(_socket_folder(), 'geopublisher.sock')
+
+
+def default_authkey_file():
+    """
+    Returns the file the service key is kept in: GEOPUBLISHER_AUTHKEY_FILE if
+    it is set, otherwise .geopublisher/authkey in the home folder
+    """
+
+    return os.getenv('GEOPUBLISHER_AUTHKEY_FILE') or os.path.join(
+        os.path.expanduser('~'), '.geopublisher', 'authkey')
+
+
+def default_authkey():
+    """
+    Returns the key clients must know to use the service: GEOPUBLISHER_AUTHKEY
+    if it is set, otherwise a random key made the first time and kept in a
+    file only the current user can read (see default_authkey_file). Requests
+    are unpickled, so anyone who knows the key can run code as the service.
+    """
+
+    authkey = os.getenv('GEOPUBLISHER_AUTHKEY')
+    if authkey:
+        return authkey.encode('utf-8')
+    key_file = default_authkey_file()
+    _private_folder(os.path.dirname(key_file))
+    try:
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(binascii.hexlify(os.urandom(32)).decode('ascii'))
+    _check_private(key_file)
+    with open(key_file, 'r') as f:
+        authkey = f.read().strip()
+    if not authkey:
+        raise ValueError('%s is empty, delete it to make a new key' %
+                         key_file)
+    return authkey.encode('utf-8')
+
+
+class PublisherService:
+    """
+    address: (optional) named pipe or Unix socket to listen on, see
+    default_address
+    authkey: (optional) key clients must know, see default_authkey
+    maxQueue: (optional) number of jobs that can wait to run. Jobs submitted
+    while the queue is full are rejected.
+    preload: (optional) import arcpy before accepting jobs
+
+    A long running process that imports arcpy once and runs publish, fanout
+    and archive jobs sent by clients (see submit), so each job doesn't pay for
+    starting Python, importing arcpy and checking out a license. Jobs run one
+    at a time on a worker thread, in the order they were received. Each
+    client is sent a status when its job is queued, started and finished (or
+    failed).
+
+    Clients are checked and their requests read on a thread of their own, so
+    a slow or idle client doesn't hold up the others. Unix sockets are made
+    in a folder only the current user can open.
+    """
+
+    requestTimeout = 10
+
+    def __init__(self, address=None, authkey=None, maxQueue=16, preload=True):
+        self.address = address or default_address()
+        self.authkey = authkey or default_authkey()
+        self.preload = preload
+        # imported here so clients, which only need submit, don't load the
+        # publishing modules
+        from . import geopublisher
+        self.logger = geopublisher.logger
+        self.actions = dict((action, getattr(geopublisher, name))
+                            for action, name in ACTIONS.items())
+        self.jobs = queue.Queue(maxQueue)
+        self.running = None
+        self.jobCount = 0
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def serve(self):
+        """
+        Accepts jobs until a client asks the service to stop. Jobs already
+        queued are finished before returning.
+        """
+
+        logger = self.logger
+        if self.preload:
+            start = time.time()
+            arcpy.load()
+            logger.logMsg('Loaded arcpy in %.1f seconds' %
+                          (time.time() - start))
+        unix_socket = sys.platform != 'win32' and \
+            not isinstance(self.address, tuple)
+        if unix_socket:
+            folder = os.path.dirname(os.path.abspath(self.address))
+            if folder == _socket_folder():
+                _private_folder(folder)
+            if os.path.exists(self.address):
+                # left behind by a service that didn't stop cleanly
+                os.remove(self.address)
+            # the socket is never open to other users, even while binding
+            umask = os.umask(0o077)
+            try:
+                listener = Listener(self.address)
+            finally:
+                os.umask(umask)
+        else:
+            listener = Listener(self.address)
+        worker = threading.Thread(target=self._work, name='geopublisher-jobs')
+        worker.daemon = True
+        worker.start()
+        logger.logMsg('Listening on %s' % self.address)
+        logger.writeLogToFile()
+        try:
+            while not self._stopping:
+                try:
+                    conn = listener.accept()
+                except (EOFError, IOError, OSError) as e:
+                    logger.logMsg('Refused a connection: %s' % e)
+                    continue
+                if self._stopping:
+                    conn.close()
+                    break
+                handler = threading.Thread(target=self._handle, args=(conn,),
+                                           name='geopublisher-client')
+                handler.daemon = True
+                handler.start()
+        finally:
+            listener.close()
+            self.jobs.put(None)
+            worker.join()
+            logger.logMsg('Stopped listening on %s' % self.address)
+            logger.writeLogToFile(wait=True)
+
+    def _handle(self, conn):
+        try:
+            # the key is checked before anything is unpickled
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+        except (AuthenticationError, EOFError, IOError, OSError) as e:
+            self.logger.logMsg('Refused a connection: %s' % e)
+            conn.close()
+            return
+        try:
+            if not conn.poll(self.requestTimeout):
+                conn.close()
+                return
+            request = conn.recv()
+            action = request['action']
+            args = request.get('args') or {}
+        except Exception as e:
+            _send(conn, {'status': 'error', 'error': 'Bad request: %s' % e})
+            conn.close()
+            return
+        if action == 'status':
+            _send(conn, {'status': 'ok', 'pid': os.getpid(),
+                         'queued': self.jobs.qsize(), 'running': self.running,
+                         'jobs': self.jobCount,
+                         'metadata': metadata_cache.stats()})
+            conn.close()
+        elif action == 'stop':
+            self._stopping = True
+            _send(conn, {'status': 'stopping', 'queued': self.jobs.qsize()})
+            conn.close()
+            self._wakeListener()
+        elif action in self.actions:
+            with self._lock:
+                self.jobCount += 1
+                job = self.jobCount
+                try:
+                    self.jobs.put_nowait((job, action, args, conn))
+                except queue.Full:
+                    _send(conn, {'status': 'rejected', 'job': job,
+                                 'error': 'The job queue is full'})
+                    conn.close()
+                    return
+                _send(conn, {'status': 'queued', 'job': job,
+                             'position': self.jobs.qsize()})
+        else:
+            _send(conn, {'status': 'error',
+                         'error': 'Unknown action %r' % action})
+            conn.close()
+
+    def _wakeListener(self):
+        # accept waits for a connection, so make one to let serve return
+        try:
+            Client(self.address).close()
+        except (EOFError, IOError, OSError):
+            pass
+
+    def _work(self):
+        logger = self.logger
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            job, action, args, conn = item
+            with self._lock:
+                # the queued status has been sent by now
+                self.running = job
+                _send(conn, {'status': 'started', 'job': job})
+            start = time.time()
+            with logger.jobContext(job=job):
+                try:
+                    result = self.actions[action](**args)
+                    reply = {'status': 'finished', 'job': job,
+                             'result': result}
+                except Exception as e:
+                    logger.logError()
+                    reply = {'status': 'failed', 'job': job,
+                             'error': '{0}: {1}'.format(type(e).__name__, e),
+                             'traceback': traceback.format_exc()}
+            logger.writeLogToFile()
+            reply['duration'] = time.time() - start
+            self.running = None
+            _send(conn, reply)
+            conn.close()
+
+
+def submit(action, address=None, authkey=None, **args):
+    """
+    action: publish, archive, status or stop
+    address: (optional) address of the service, see default_address
+    authkey: (optional) key of the service, see default_authkey
+    args: keyword arguments for publish_data (publish) or create_archive
+    (archive)
+
+    Sends a request to a running PublisherService and yields each status the
+    service sends back as a dictionary with a status key (queued, started,
+    finished, failed, rejected...) until the request is done.
+    """
+
+    conn = Client(address or default_address(),
+                  authkey=authkey or default_authkey())
+    try:
+        conn.send({'action': action, 'args': args})
+        while True:
+            try:
+                reply = conn.recv()
+            except EOFError:
+                return
+            yield reply
+            if reply.get('status') in FINAL_STATUSES:
+                return
+    finally:
+        conn.close()
+
+
+def _send(conn, message):
+    try:
+        conn.send(message)
+    except (EOFError, IOError, OSError):
+        # the client went away, the job still runs
+        pass
+
+
+def _socket_folder():
+    return os.path.join(tempfile.gettempdir(), 'geopublisher-%d' % os.getuid())
+
+
+def _private_folder(folder):
+    """
+    Creates folder so only the current user can open it, or checks that an
+    existing one is private
+    """
+
+    if not os.path.isdir(folder):
+        try:
+            os.makedirs(folder, 0o700)
+        except OSError:
+            if not os.path.isdir(folder):
+                raise
+    _check_private(folder)
+
+
+def _check_private(path):
+    """
+    Raises an error if other users could open path. Only checked where file
+    modes are used (not on Windows, where the user's folders are private).
+    """
+
+    if sys.platform == 'win32':
+        return
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise OSError(errno.EPERM, '%s must belong to the current user and '
+                      'not be open to other users (chmod go-rwx)' % path)
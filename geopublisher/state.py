@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from .lazy import arcpy
+
+
+class StateStore:
+    """
+    stateFile: path of the SQLite file that stores the fingerprints (it is
+    created if it doesn't exist)
+
+    Remembers the fingerprint of each input feature class at the time it was
+    last published to an output, so unchanged inputs can be skipped.
+    """
+
+    def __init__(self, stateFile):
+        self.stateFile = stateFile
+        self.connection = sqlite3.connect(stateFile, timeout=60)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS fingerprints ('
+                'input_fc TEXT NOT NULL, '
+                'output_file TEXT NOT NULL, '
+                'fingerprint TEXT NOT NULL, '
+                'published TEXT NOT NULL, '
+                'PRIMARY KEY (input_fc, output_file))')
+
+    def getFingerprint(self, input_fc, output_file):
+        """
+        input_fc: Feature class that was published
+        output_file: Feature class it was published to
+
+        Returns the fingerprint recorded for the last publish, or None
+        """
+
+        row = self.connection.execute(
+            'SELECT fingerprint FROM fingerprints '
+            'WHERE input_fc = ? AND output_file = ?',
+            (_key(input_fc), _key(output_file))).fetchone()
+        return row[0] if row else None
+
+    def setFingerprint(self, input_fc, output_file, fingerprint):
+        """
+        input_fc: Feature class that was published
+        output_file: Feature class it was published to
+        fingerprint: fingerprint of input_fc at the time it was published
+        """
+
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO fingerprints '
+                '(input_fc, output_file, fingerprint, published) '
+                'VALUES (?, ?, ?, ?)',
+                (_key(input_fc), _key(output_file), fingerprint,
+                 datetime.now().isoformat()))
+
+    def close(self):
+        self.connection.close()
+
+
+def fingerprint(input_fc, hash_files=False, options=None):
+    """
+    input_fc: Feature class to fingerprint
+    hash_files: for shapefiles, also hash the contents of every file
+    (optional, slower but catches edits that keep size and modified time)
+    options: publish options that change the output, such as a where clause
+    (optional). Changing them changes the fingerprint.
+
+    Returns a string that changes whenever input_fc changes. Shapefiles are
+    fingerprinted from the name, size and modified time of their files.
+    Geodatabase feature classes are fingerprinted from their fields, row
+    count, extent and, when editor tracking is enabled, the latest edit date.
+    Without editor tracking, attribute edits that keep the row count and
+    extent are not detected.
+    """
+
+    if os.path.splitext(input_fc)[1].lower() == '.shp':
+        parts = _shapefile_parts(input_fc, hash_files)
+    else:
+        parts = _feature_class_parts(input_fc)
+    if options:
+        parts = {'data': parts, 'options': options}
+    data = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def _shapefile_parts(shapefile, hash_files):
+    from .geopublisher import get_shapefile_files
+
+    parts = []
+    for file in sorted(get_shapefile_files(shapefile)):
+        stat = os.stat(file)
+        part = [os.path.basename(file).lower(), stat.st_size, stat.st_mtime]
+        if hash_files:
+            part.append(_hash_file(file))
+        parts.append(part)
+    return parts
+
+
+def _feature_class_parts(feature_class):
+    desc = arcpy.Describe(feature_class)
+    extent = desc.extent
+    parts = {
+        'fields': [(f.name, f.type, f.length) for f in desc.fields],
+        'count': arcpy.GetCount_management(feature_class).getOutput(0),
+        'extent': [extent.XMin, extent.YMin, extent.XMax, extent.YMax]
+    }
+    if getattr(desc, 'editorTrackingEnabled', False) and \
+            desc.editedAtFieldName:
+        sql_clause = (None, 'ORDER BY %s DESC' % desc.editedAtFieldName)
+        with arcpy.da.SearchCursor(feature_class, [desc.editedAtFieldName],
+                                   sql_clause=sql_clause) as cursor:
+            for row in cursor:
+                parts['last_edit'] = row[0]
+                break
+    return parts
+
+
+def _hash_file(file, block_size=1024 * 1024):
+    sha1 = hashlib.sha1()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
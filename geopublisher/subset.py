@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import os
+import uuid
+
+from .lazy import arcpy
+
+
+def field_pairs(fields):
+    """
+    fields: field names, (name, output_name) pairs, or a dict of name to
+    output_name
+
+    Returns a list of (name, output_name) pairs, in order. A field listed by
+    name alone keeps its name.
+    """
+
+    if isinstance(fields, dict):
+        return sorted(fields.items())
+    pairs = []
+    for field in fields:
+        if isinstance(field, (list, tuple)):
+            name, output_name = field
+        else:
+            name = output_name = field
+        pairs.append((name, output_name or name))
+    return pairs
+
+
+def parse_fields(text):
+    """
+    text: comma separated field names, with name:output_name for renamed
+    fields (ex. 'PIN,SITUS_ADDR:ADDRESS,ACRES')
+
+    Returns the (name, output_name) pairs
+    """
+
+    pairs = []
+    for field in text.split(','):
+        field = field.strip()
+        if field:
+            name, _, output_name = field.partition(':')
+            pairs.append((name.strip(), output_name.strip() or name.strip()))
+    return pairs
+
+
+def field_mappings(input_fc, fields):
+    """
+    input_fc: Feature class the fields are read from
+    fields: fields to keep, see field_pairs
+
+    Returns arcpy.FieldMappings holding only the fields to keep, renamed
+    where asked. The output name is also used as the alias.
+    """
+
+    available = dict((f.name.lower(), f.name)
+                     for f in arcpy.ListFields(input_fc))
+    mappings = arcpy.FieldMappings()
+    for name, output_name in field_pairs(fields):
+        if name.lower() not in available:
+            raise ValueError('%s has no field named %s' % (input_fc, name))
+        field_map = arcpy.FieldMap()
+        field_map.addInputField(input_fc, available[name.lower()])
+        output_field = field_map.outputField
+        output_field.name = output_name
+        output_field.aliasName = output_name
+        field_map.outputField = output_field
+        mappings.addFieldMap(field_map)
+    return mappings
+
+
+def copy_subset(input_fc, output_file, where_clause=None, fields=None):
+    """
+    input_fc: Feature class to copy
+    output_file: Feature class to be created
+    where_clause: SQL expression selecting the rows to copy (optional)
+    fields: fields to copy, see field_pairs (optional, defaults to all of
+    them)
+
+    Copies only the selected rows and fields. The filter and field mappings
+    are handed to FeatureClassToFeatureClass, so rows and fields that aren't
+    wanted are never written.
+    """
+
+    mappings = field_mappings(input_fc, fields) if fields else None
+    arcpy.FeatureClassToFeatureClass_conversion(
+        input_fc, os.path.dirname(output_file), os.path.basename(output_file),
+        where_clause or '', mappings)
+
+
+def count_rows(feature_class, where_clause=None):
+    """
+    feature_class: Feature class to count
+    where_clause: only count rows matching this SQL expression (optional)
+
+    Returns the number of rows
+    """
+
+    if not where_clause:
+        return int(arcpy.GetCount_management(feature_class).getOutput(0))
+    # layer names are shared by everything running in the process, so two
+    # counts at once mustn't reuse one
+    name = 'geopublisher_count_' + uuid.uuid4().hex
+    layer = arcpy.MakeFeatureLayer_management(
+        feature_class, name, where_clause).getOutput(0)
+    try:
+        return int(arcpy.GetCount_management(layer).getOutput(0))
+    finally:
+        arcpy.Delete_management(layer)
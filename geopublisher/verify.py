@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+
+SHAPE_TYPES = frozenset([0, 1, 3, 5, 8, 11, 13, 15, 18, 21, 23, 25, 28, 31])
+
+# Records whose headers in the .shp are checked against the .shx. Checking
+# every record would read the whole .shp, so large files are sampled.
+SAMPLE_RECORDS = 1024
+
+
+class ShapefileIntegrityError(Exception):
+    """
+    Raised when the files of a shapefile are truncated or don't agree with
+    each other. problems lists everything that was found.
+    """
+
+    def __init__(self, shapefile, problems):
+        Exception.__init__(self, '%s is corrupt: %s' % (
+            shapefile, '; '.join(problems)))
+        self.shapefile = shapefile
+        self.problems = problems
+
+
+def verify_shapefile(shapefile):
+    """
+    shapefile: Path of the shapefile to check (ex. Parcels.shp)
+
+    Checks that the .shp, .shx and .dbf headers are valid, that each file is
+    as long as its header says, that the .shx offsets point at consecutive
+    records inside the .shp and that all three have the same number of
+    records. The files are memory-mapped and only their headers, the .shx and
+    a sample of .shp record headers are read, so multi-GB shapefiles are
+    checked in well under a second. NumPy is used for the .shx when it is
+    installed.
+
+    Returns the number of records, or raises ShapefileIntegrityError.
+    """
+
+    base = os.path.splitext(shapefile)[0]
+    problems = []
+    with _mapped(base + '.shp', problems) as shp, \
+            _mapped(base + '.shx', problems) as shx, \
+            _mapped(base + '.dbf', problems) as dbf:
+        shape_type = _check_header(shp, '.shp', problems)
+        index_type = _check_header(shx, '.shx', problems)
+        if None not in (shape_type, index_type) and shape_type != index_type:
+            problems.append('.shp shape type %d but .shx shape type %d' % (
+                shape_type, index_type))
+        records = None
+        if shx is not None:
+            if (len(shx) - 100) % 8:
+                problems.append('.shx length %d is not 100 plus 8 bytes per '
+                                'record' % len(shx))
+            else:
+                records = (len(shx) - 100) // 8
+                if shp is not None and shape_type is not None:
+                    _check_offsets(shp, shx, records, problems)
+        dbf_records = _check_dbf(dbf, problems)
+        if None not in (records, dbf_records) and records != dbf_records:
+            problems.append('.shx has %d records but .dbf has %d' % (
+                records, dbf_records))
+    if problems:
+        raise ShapefileIntegrityError(shapefile, problems)
+    return records
+
+
+@contextmanager
+def _mapped(file, problems):
+    """
+    Yields a read-only memory map of file, or None if it is missing or empty
+    """
+
+    ext = os.path.splitext(file)[1]
+    try:
+        f = open(file, 'rb')
+    except (IOError, OSError):
+        problems.append('%s is missing' % ext)
+        yield None
+        return
+    with f:
+        if not os.fstat(f.fileno()).st_size:
+            problems.append('%s is empty' % ext)
+            yield None
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def _check_header(mapped, ext, problems):
+    """
+    Checks a .shp or .shx header and returns the shape type
+    """
+
+    if mapped is None:
+        return None
+    if len(mapped) < 100:
+        problems.append('%s is shorter than its 100 byte header' % ext)
+        return None
+    code, length = struct.unpack('>i20xi', mapped[:28])
+    version, shape_type = struct.unpack('<2i', mapped[28:36])
+    if code != 9994 or version != 1000:
+        problems.append('%s header has file code %d and version %d' % (
+            ext, code, version))
+        return None
+    if length * 2 != len(mapped):
+        problems.append('%s header says %d bytes but the file has %d' % (
+            ext, length * 2, len(mapped)))
+    if shape_type not in SHAPE_TYPES:
+        problems.append('%s has unknown shape type %d' % (ext, shape_type))
+        return None
+    return shape_type
+
+
+def _check_offsets(shp, shx, records, problems):
+    if not records:
+        return
+    # imported here so importing geopublisher doesn't load NumPy for
+    # publishes that never verify
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        index = numpy.frombuffer(shx, dtype='>i4', offset=100).reshape(-1, 2)
+        offsets = index[:, 0].astype('i8') * 2
+        lengths = index[:, 1].astype('i8') * 2
+        ends = offsets + 8 + lengths
+        if offsets[0] != 100:
+            problems.append('first .shx offset is %d, not 100' % offsets[0])
+        if (lengths < 0).any():
+            problems.append('.shx has negative record lengths')
+        overlaps = numpy.flatnonzero(offsets[1:] < ends[:-1])
+        if len(overlaps):
+            problems.append('.shx record %d overlaps the one before it' % (
+                overlaps[0] + 2))
+        if ends.max() > len(shp):
+            problems.append('.shx points past the end of the .shp (%d > %d '
+                            'bytes)' % (ends.max(), len(shp)))
+    else:
+        # only the offsets and lengths of the records that are sampled
+        index = [struct.unpack('>2i', shx[100 + number * 8:108 + number * 8])
+                 for number in _sample(records)]
+        offsets = [offset * 2 for offset, length in index]
+        lengths = [length * 2 for offset, length in index]
+        ends = [o + 8 + l for o, l in zip(offsets, lengths)]
+        if offsets[0] != 100:
+            problems.append('first .shx offset is %d, not 100' % offsets[0])
+        if max(ends) > len(shp):
+            problems.append('.shx points past the end of the .shp (%d > %d '
+                            'bytes)' % (max(ends), len(shp)))
+    if problems:
+        return
+    for position, number in enumerate(_sample(records)):
+        if numpy is not None:
+            offset, length = int(offsets[number]), int(lengths[number])
+        else:
+            offset, length = offsets[position], lengths[position]
+        header = struct.unpack('>2i', shp[offset:offset + 8])
+        if header != (number + 1, length // 2):
+            problems.append('.shp record at byte %d is numbered %d with '
+                            'length %d, the .shx expects record %d with '
+                            'length %d' % (offset, header[0], header[1] * 2,
+                                           number + 1, length))
+            return
+
+
+def _sample(records):
+    """
+    Returns the record numbers whose .shp headers are checked: all of them
+    for small files, otherwise evenly spaced ones including the last
+    """
+
+    if records <= SAMPLE_RECORDS:
+        return range(records)
+    step = float(records - 1) / (SAMPLE_RECORDS - 1)
+    return sorted(set(int(round(i * step)) for i in range(SAMPLE_RECORDS)))
+
+
+def _check_dbf(dbf, problems):
+    """
+    Checks the .dbf header and length and returns the number of records
+    """
+
+    if dbf is None:
+        return None
+    if len(dbf) < 33:
+        problems.append('.dbf is shorter than its header')
+        return None
+    records, header_length, record_length = struct.unpack('<IHH', dbf[4:12])
+    if header_length < 33 or header_length > len(dbf):
+        problems.append('.dbf header length %d is invalid' % header_length)
+        return None
+    # field descriptors are 32 bytes each, ending with a 0x0D byte
+    field_lengths = 0
+    position = 32
+    while position < header_length and dbf[position:position + 1] != b'\r':
+        field_lengths += ord(dbf[position + 16:position + 17])
+        position += 32
+    if position >= header_length:
+        problems.append('.dbf field descriptors are not terminated')
+        return None
+    if field_lengths + 1 != record_length:
+        problems.append('.dbf record length is %d but its fields add up to '
+                        '%d' % (record_length, field_lengths + 1))
+    expected = header_length + records * record_length
+    if len(dbf) < expected:
+        problems.append('.dbf is truncated: %d records of %d bytes need %d '
+                        'bytes but the file has %d' % (
+                            records, record_length, expected, len(dbf)))
+    elif len(dbf) > expected + 1:
+        problems.append('.dbf has %d bytes after its %d records' % (
+            len(dbf) - expected, records))
+    return records
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from . import batch
+
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+              IN_MOVED_TO | IN_CREATE | IN_DELETE)
+
+_EVENT = struct.Struct('iIII')
+
+# Files ArcGIS writes while a layer is open, which aren't edits
+IGNORED_SUFFIXES = ('.lock',)
+
+
+try:
+    _string_types = basestring
+except NameError:
+    _string_types = str
+
+
+class InotifyWatcher:
+    """
+    folders: folders to watch
+
+    Reports files changed in the folders using Linux inotify, called through
+    ctypes, so changes are seen as they happen without listing the folders.
+    Raises OSError if inotify isn't available.
+    """
+
+    def __init__(self, folders):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not supported')
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK |
+                                          getattr(os, 'O_CLOEXEC', 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = {}
+        try:
+            for folder in folders:
+                self._add(folder)
+        except Exception:
+            self.close()
+            raise
+
+    def _add(self, folder):
+        path = folder.encode(sys.getfilesystemencoding())
+        wd = self.libc.inotify_add_watch(self.fd, path, WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, '%s: %s' % (os.strerror(code), folder))
+        self.folders[wd] = folder
+
+    def changes(self, timeout=1.0):
+        """
+        timeout: seconds to wait for a change
+
+        Returns the paths of the files changed since the last call, waiting
+        up to timeout for the first one. If too many changes happened to be
+        queued, the folders themselves are returned.
+        """
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return changed
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].split(b'\0')[0]
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.folders.values())
+                elif mask & IN_IGNORED:
+                    # the folder was deleted or unmounted
+                    self.folders.pop(wd, None)
+                elif wd in self.folders and name:
+                    changed.add(os.path.join(
+                        self.folders[wd],
+                        name.decode(sys.getfilesystemencoding())))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """
+    folders: folders to watch
+    interval: seconds between listings of the folders
+
+    Reports files changed in the folders by listing them and comparing the
+    size and modified time of each file. Works anywhere, including network
+    shares that don't send change notifications.
+    """
+
+    def __init__(self, folders, interval=5.0):
+        self.folders = list(folders)
+        self.interval = interval
+        self.snapshot = self._snapshot()
+        self._next = time.time() + interval
+
+    def changes(self, timeout=1.0):
+        """
+        timeout: seconds to wait for a change
+
+        Returns the paths of the files added, changed or removed since the
+        last listing. The folders are listed at most once per interval.
+        """
+
+        wait = self._next - time.time()
+        if wait > timeout:
+            time.sleep(max(timeout, 0))
+            return set()
+        if wait > 0:
+            time.sleep(wait)
+        self._next = time.time() + self.interval
+        snapshot = self._snapshot()
+        changed = set(path for path in set(snapshot) | set(self.snapshot)
+                      if snapshot.get(path) != self.snapshot.get(path))
+        self.snapshot = snapshot
+        return changed
+
+    def _snapshot(self):
+        snapshot = {}
+        for folder in self.folders:
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def close(self):
+        pass
+
+
+def make_watcher(folders, polling=False, interval=5.0):
+    """
+    folders: folders to watch
+    polling: always list the folders instead of using inotify (optional)
+    interval: seconds between listings when polling (optional)
+
+    Returns an InotifyWatcher where inotify works, otherwise a
+    PollingWatcher
+    """
+
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folders)
+        except OSError:
+            pass
+    return PollingWatcher(folders, interval)
+
+
+class Debouncer:
+    """
+    quiet: seconds without changes before a key is ready
+    maxDelay: seconds after the first change when a key is ready even if it
+    keeps changing
+
+    Collects bursts of changes, such as the many writes of an editing
+    session, into one. A key is ready once it has been quiet for quiet
+    seconds, or maxDelay seconds after its first change.
+    """
+
+    def __init__(self, quiet=30.0, maxDelay=600.0, clock=time.time):
+        self.quiet = quiet
+        self.maxDelay = maxDelay
+        self.clock = clock
+        self.pending = {}
+
+    def touch(self, key):
+        """
+        Records a change of key
+        """
+
+        now = self.clock()
+        first, _ = self.pending.get(key, (now, now))
+        self.pending[key] = (first, now)
+
+    def ready(self):
+        """
+        Returns the keys that are ready and forgets them
+        """
+
+        now = self.clock()
+        keys = [key for key, (first, last) in self.pending.items()
+                if now - last >= self.quiet or now - first >= self.maxDelay]
+        for key in keys:
+            del self.pending[key]
+        return keys
+
+
+class LayerWatcher:
+    """
+    jobs: list of (input_fc, output_location, output_fc, archive_folder)
+    tuples, or the path of a CSV manifest file (see batch.read_manifest)
+    quiet: seconds an input must be left alone before it is published
+    (optional)
+    maxDelay: most seconds an input that keeps changing waits (optional)
+    polling: list the folders instead of using inotify (optional)
+    interval: seconds between listings when polling (optional)
+    publish: function called with each job and the options (optional,
+    defaults to publish_data)
+    options: keyword arguments passed on to publish_data for every job, such
+    as state_file
+
+    Watches the folders of shapefile and file geodatabase inputs and
+    publishes a job when the files of its input change, once the changes
+    have settled (see Debouncer). Only the jobs whose input changed are
+    published. Shapefile jobs react to their own files only; file
+    geodatabase jobs to any file in the geodatabase, so give a state_file to
+    skip the feature classes that didn't change. Inputs that aren't files,
+    such as SDE feature classes, can't be watched and are left out.
+    """
+
+    def __init__(self, jobs, quiet=30.0, maxDelay=600.0, polling=False,
+                 interval=5.0, publish=None, **options):
+        from .geopublisher import logger
+        self.logger = logger
+        if isinstance(jobs, _string_types):
+            jobs = batch.read_manifest(jobs)
+        self.jobs = [batch.make_job(job) for job in jobs]
+        self.options = options
+        self.publish = publish
+        self.debouncer = Debouncer(quiet, maxDelay)
+        self.shapefiles = {}
+        self.geodatabases = {}
+        for job in self.jobs:
+            self._register(job)
+        folders = set(os.path.dirname(key) for key in self.shapefiles)
+        folders.update(self.geodatabases)
+        self.folders = sorted(folders)
+        self.watcher = make_watcher(self.folders, polling, interval)
+
+    def _register(self, job):
+        path = os.path.normcase(os.path.abspath(job.input_fc))
+        if path.lower().endswith('.shp') and os.path.isfile(path):
+            self.shapefiles.setdefault(path[:-4], []).append(job)
+            return
+        gdb = path
+        while not gdb.lower().endswith('.gdb'):
+            parent = os.path.dirname(gdb)
+            if parent == gdb:
+                self.logger.logMsg("Can't watch %s, it isn't a shapefile or "
+                                   "in a file geodatabase" % job.input_fc)
+                return
+            gdb = parent
+        self.geodatabases.setdefault(gdb, []).append(job)
+
+    def jobsFor(self, path):
+        """
+        path: file that changed
+
+        Returns the jobs whose input includes the file
+        """
+
+        path = os.path.normcase(os.path.abspath(path))
+        if path.lower().endswith(IGNORED_SUFFIXES):
+            return []
+        if path in self.geodatabases:
+            # inotify queue overflowed, or the geodatabase itself changed
+            return list(self.geodatabases[path])
+        folder = os.path.dirname(path)
+        if folder in self.geodatabases:
+            return list(self.geodatabases[folder])
+        if path in self.folders:
+            folder, name = path, None
+        else:
+            name = os.path.basename(path).lower()
+        # the files of Parcels.shp are Parcels.dbf, Parcels.shp.xml...
+        return [job for base, jobs in sorted(self.shapefiles.items())
+                if os.path.dirname(base) == folder and (
+                    name is None or
+                    name.startswith(os.path.basename(base).lower() + '.'))
+                for job in jobs]
+
+    def poll(self, timeout=1.0):
+        """
+        timeout: seconds to wait for changes
+
+        Collects changes for up to timeout seconds, then publishes the jobs
+        that are ready. Returns the jobs that were published.
+        """
+
+        for path in self.watcher.changes(timeout):
+            for job in self.jobsFor(path):
+                self.debouncer.touch(job)
+        published = []
+        for job in self.debouncer.ready():
+            self.logger.logMsg('%s changed, publishing' % job.input_fc)
+            try:
+                if self.publish:
+                    self.publish(*job, **self.options)
+                else:
+                    from .geopublisher import publish_data
+                    publish_data(*job, **self.options)
+                published.append(job)
+            except Exception:
+                with self.logger.jobContext(layer=job.output_fc):
+                    self.logger.logError()
+            self.logger.writeLogToFile()
+        return published
+
+    def run(self):
+        """
+        Watches and publishes until interrupted
+        """
+
+        self.logger.logMsg('Watching %d layers in %d folders' % (
+            len(self.jobs), len(self.folders)))
+        try:
+            while True:
+                self.poll()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watcher.close()
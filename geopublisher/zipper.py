@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import struct
+import sys
+import time
+import zlib
+import zipfile
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+
+ZIP64_LIMIT = (1 << 31) - 1
+# ZipFile.open(name, 'w') streams members into the zip from Python 3.6
+STREAMING_WRITES = sys.version_info >= (3, 6)
+_MAX_32 = 0xFFFFFFFF
+_MAX_16 = 0xFFFF
+
+
+class ParallelZipFile:
+    """
+    file: path of the zip file to create
+    workers: number of compression threads (optional, defaults to the number
+    of CPUs)
+    chunkSize: members larger than this many bytes are split into chunks that
+    are compressed in parallel (optional)
+    compressLevel: zlib compression level (optional)
+
+    Writes a standard deflated zip file like zipfile.ZipFile, but compresses
+    the members, and chunks of large members, on a pool of threads. Members
+    added with write() are compressed together when the zip is flushed or
+    closed. Each chunk is compressed into its own deflate block sequence, so
+    the chunks can simply be joined, and their CRCs are combined without
+    reading the data again. The SHA-256 of each member is computed from the
+    same reads and kept in digests, by member name.
+    """
+
+    def __init__(self, file, workers=None, chunkSize=4 * 1024 * 1024,
+                 compressLevel=6):
+        self.filename = file
+        self.workers = workers or cpu_count()
+        self.chunkSize = chunkSize
+        self.compressLevel = compressLevel
+        self.fp = open(file, 'wb')
+        self.filelist = []
+        self.digests = {}
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, filename, arcname=None):
+        """
+        filename: path of the file to add
+        arcname: name of the file inside the zip (optional, defaults to
+        filename)
+
+        Adds a file to the zip. The file is read and compressed on the next
+        flush().
+        """
+
+        if arcname is None:
+            arcname = filename
+        arcname = os.path.normpath(os.path.splitdrive(arcname)[1])
+        arcname = arcname.lstrip(os.sep).replace(os.sep, '/')
+        st = os.stat(filename)
+        date_time = time.localtime(st.st_mtime)[0:6]
+        if date_time[0] < 1980:
+            date_time = (1980, 1, 1, 0, 0, 0)
+        info = zipfile.ZipInfo(arcname, date_time)
+        info.external_attr = (st.st_mode & 0xFFFF) << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.file_size = st.st_size
+        self._pending.append((filename, info))
+
+    def flush(self):
+        """
+        Compresses the files added since the last flush and writes them to
+        the zip file
+        """
+
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        chunks = []
+        for index, (filename, info) in enumerate(pending):
+            offsets = list(range(0, info.file_size, self.chunkSize)) or [0]
+            for offset in offsets:
+                chunks.append((index, filename, offset, self.chunkSize,
+                               offset + self.chunkSize >= info.file_size,
+                               self.compressLevel))
+
+        pool = ThreadPool(min(self.workers, len(chunks)))
+        try:
+            current = None
+            for index, crc, raw, data, last in pool.imap(_compress_chunk,
+                                                         chunks):
+                if index != current:
+                    current = index
+                    info = pending[index][1]
+                    zip64 = self._startMember(info)
+                    read_size = 0
+                    sha256 = hashlib.sha256()
+                info.CRC = crc32_combine(info.CRC, crc, len(raw))
+                info.compress_size += len(data)
+                read_size += len(raw)
+                sha256.update(raw)
+                self.fp.write(data)
+                if last:
+                    self._finishMember(info, read_size, zip64)
+                    self.digests[info.filename] = sha256.hexdigest()
+        finally:
+            pool.close()
+            pool.join()
+
+    def infolist(self):
+        """
+        Returns a list of ZipInfo objects for the members of the zip
+        """
+
+        self.flush()
+        return self.filelist
+
+    def namelist(self):
+        return [info.filename for info in self.infolist()]
+
+    def close(self):
+        """
+        Writes any remaining members and the central directory and closes
+        the zip file
+        """
+
+        if self.fp is None:
+            return
+        try:
+            self.flush()
+            self._writeCentralDirectory()
+        finally:
+            self.fp.close()
+            self.fp = None
+
+    def _startMember(self, info):
+        """
+        Writes a placeholder local header for a member and returns whether
+        it needs zip64 sizes
+        """
+
+        info.header_offset = self.fp.tell()
+        info.CRC = 0
+        info.compress_size = 0
+        zip64 = info.file_size * 1.05 > ZIP64_LIMIT
+        self.fp.write(self._localHeader(info, zip64))
+        return zip64
+
+    def _finishMember(self, info, read_size, zip64):
+        """
+        Rewrites the local header of a member now its CRC and sizes are known
+        """
+
+        if info.file_size != read_size:
+            raise IOError('%s changed size while it was being zipped'
+                          % info.filename)
+        if not zip64 and info.compress_size > ZIP64_LIMIT:
+            raise zipfile.LargeZipFile('%s compressed to more than 2 GB'
+                                       % info.filename)
+        end = self.fp.tell()
+        self.fp.seek(info.header_offset)
+        self.fp.write(self._localHeader(info, zip64))
+        self.fp.seek(end)
+        self.filelist.append(info)
+
+    def _localHeader(self, info, zip64):
+        name, flags = _encode_name(info.filename)
+        extra = b''
+        version = 20
+        compress_size, file_size = info.compress_size, info.file_size
+        if zip64:
+            extra = struct.pack('<HHQQ', 1, 16, file_size, compress_size)
+            compress_size = file_size = _MAX_32
+            version = 45
+        dostime, dosdate = _dos_date_time(info.date_time)
+        header = struct.pack('<4sHHHHHLLLHH', b'PK\x03\x04', version, flags,
+                             zipfile.ZIP_DEFLATED, dostime, dosdate, info.CRC,
+                             compress_size, file_size, len(name), len(extra))
+        return header + name + extra
+
+    def _writeCentralDirectory(self):
+        start = self.fp.tell()
+        for info in self.filelist:
+            name, flags = _encode_name(info.filename)
+            extra = []
+            file_size, compress_size = info.file_size, info.compress_size
+            header_offset = info.header_offset
+            if file_size > ZIP64_LIMIT:
+                extra.append(file_size)
+                file_size = _MAX_32
+            if compress_size > ZIP64_LIMIT:
+                extra.append(compress_size)
+                compress_size = _MAX_32
+            if header_offset > ZIP64_LIMIT:
+                extra.append(header_offset)
+                header_offset = _MAX_32
+            extra_data = b''
+            version = 20
+            if extra:
+                extra_data = struct.pack('<HH' + 'Q' * len(extra), 1,
+                                         8 * len(extra), *extra)
+                version = 45
+            dostime, dosdate = _dos_date_time(info.date_time)
+            self.fp.write(struct.pack(
+                '<4sBBBBHHHHLLLHHHHHLL', b'PK\x01\x02', version,
+                info.create_system, version, 0, flags, zipfile.ZIP_DEFLATED,
+                dostime, dosdate, info.CRC, compress_size, file_size,
+                len(name), len(extra_data), 0, 0, 0, info.external_attr,
+                header_offset))
+            self.fp.write(name + extra_data)
+
+        end = self.fp.tell()
+        count = len(self.filelist)
+        size = end - start
+        offset = start
+        if count > _MAX_16 or size > ZIP64_LIMIT or offset > ZIP64_LIMIT:
+            self.fp.write(struct.pack('<4sQHHLLQQQQ', b'PK\x06\x06', 44, 45,
+                                      45, 0, 0, count, count, size, offset))
+            self.fp.write(struct.pack('<4sLQL', b'PK\x06\x07', 0, end, 1))
+            count = min(count, _MAX_16)
+            size = min(size, _MAX_32)
+            offset = min(offset, _MAX_32)
+        self.fp.write(struct.pack('<4sHHHHLLH', b'PK\x05\x06', 0, 0, count,
+                                  count, size, offset, 0))
+
+
+class HashingZipFile(zipfile.ZipFile):
+    """
+    A zipfile.ZipFile that computes the SHA-256 of each file added with
+    write() while streaming it into the zip, and keeps it in digests by
+    member name. Needs Python 3.6 or later (see STREAMING_WRITES).
+    """
+
+    def __init__(self, *args, **kwargs):
+        zipfile.ZipFile.__init__(self, *args, **kwargs)
+        self.digests = {}
+
+    def write(self, filename, arcname=None, compress_type=None,
+              blockSize=1024 * 1024):
+        info = zipfile.ZipInfo.from_file(filename, arcname)
+        if info.is_dir():
+            return zipfile.ZipFile.write(self, filename, arcname,
+                                         compress_type)
+        info.compress_type = compress_type or self.compression
+        sha256 = hashlib.sha256()
+        with open(filename, 'rb') as src:
+            with self.open(info, 'w',
+                           force_zip64=info.file_size > ZIP64_LIMIT) as dest:
+                for block in iter(lambda: src.read(blockSize), b''):
+                    sha256.update(block)
+                    dest.write(block)
+        self.digests[info.filename] = sha256.hexdigest()
+
+
+def zip_writer(file, workers=None, digests=False):
+    """
+    file: path of the zip file to create
+    workers: number of compression threads (optional)
+    digests: compute the SHA-256 of each member as it is written (optional)
+
+    Returns a deflated zip file to write to: a ParallelZipFile when workers
+    are given, otherwise a zipfile.ZipFile. When digests are needed, the zip
+    file keeps them in its digests attribute. Before Python 3.6 zipfile
+    can't stream members, so a single-threaded ParallelZipFile is used.
+    """
+
+    if workers or (digests and not STREAMING_WRITES):
+        return ParallelZipFile(file, workers=workers or 1)
+    if digests:
+        return HashingZipFile(file, mode='w', compression=zipfile.ZIP_DEFLATED)
+    return zipfile.ZipFile(file, mode='w', compression=zipfile.ZIP_DEFLATED)
+
+
+def _compress_chunk(args):
+    """
+    Reads and deflates one chunk of a file. Chunks other than the last end
+    with a sync flush so the compressed chunks can be joined into one stream.
+    """
+
+    index, filename, offset, length, last, level = args
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data)
+    compressed += compressor.flush(zlib.Z_FINISH if last else
+                                   zlib.Z_SYNC_FLUSH)
+    return index, zlib.crc32(data) & _MAX_32, data, compressed, last
+
+
+def crc32_combine(crc1, crc2, len2):
+    """
+    crc1: CRC-32 of the first block of data
+    crc2: CRC-32 of the second block of data
+    len2: length of the second block of data
+
+    Returns the CRC-32 of both blocks of data joined together, like zlib's
+    crc32_combine.
+    """
+
+    if len2 == 0:
+        return crc1
+    return _gf2_matrix_times(_crc32_shift(len2), crc1) ^ crc2
+
+
+_crc32_shifts = {}
+
+
+def _crc32_shift(length):
+    """
+    Returns the GF(2) matrix that advances a CRC-32 over length zero bytes
+    """
+
+    if length not in _crc32_shifts:
+        # operator for one zero bit, then two and four by squaring
+        odd = [0xEDB88320] + [1 << n for n in range(31)]
+        even = _gf2_matrix_square(odd)
+        odd = _gf2_matrix_square(even)
+        result = [1 << n for n in range(32)]
+        remaining = length
+        while remaining:
+            even = _gf2_matrix_square(odd)
+            if remaining & 1:
+                result = _gf2_matrix_multiply(even, result)
+            remaining >>= 1
+            if not remaining:
+                break
+            odd = _gf2_matrix_square(even)
+            if remaining & 1:
+                result = _gf2_matrix_multiply(odd, result)
+            remaining >>= 1
+        _crc32_shifts[length] = result
+    return _crc32_shifts[length]
+
+
+def _gf2_matrix_times(matrix, vector):
+    total = 0
+    row = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[row]
+        vector >>= 1
+        row += 1
+    return total
+
+
+def _gf2_matrix_square(matrix):
+    return [_gf2_matrix_times(matrix, row) for row in matrix]
+
+
+def _gf2_matrix_multiply(first, second):
+    return [_gf2_matrix_times(first, row) for row in second]
+
+
+def _dos_date_time(date_time):
+    dosdate = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    dostime = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+    return dostime, dosdate
+
+
+def _encode_name(name):
+    """
+    Returns the encoded member name and the flag bits for it
+    """
+
+    if isinstance(name, bytes):
+        return name, 0
+    try:
+        return name.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return name.encode('utf-8'), 0x800
@@ -39,7 +39,15 @@ setup(
     package_dir={'geopublisher':
                  'geopublisher'},
     include_package_data=True,
+    entry_points={
+        'console_scripts': [
+            'geopublisher = geopublisher.cli:main',
+        ],
+    },
     install_requires=requirements,
+    extras_require={
+        'geoparquet': ['pyarrow', 'pyproj'],
+    },
     license="Apache 2.0",
     zip_safe=False,
     keywords='geopublisher',
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+helpers
+----------------------------------
+
+Fixtures shared by the tests.
+"""
+
+import os
+import shutil
+import tempfile
+
+currentFolder = os.path.dirname(os.path.abspath(__file__))
+testShpWorkspace = os.path.join(currentFolder, 'data', 'Test_Shapefiles')
+
+
+class TempFolderMixin:
+    """
+    Mixin for unittest.TestCase giving each test its own temporary folder
+    """
+
+    def makeTempFolder(self):
+        """
+        Creates self.tempFolder, which is removed after the test, and
+        returns it
+        """
+
+        self.tempFolder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempFolder)
+        return self.tempFolder
+
+    def copyAirports(self, extensions=('.shp', '.shx', '.dbf', '.prj')):
+        """
+        extensions: (optional) files of the shapefile to copy
+
+        Copies the Airports test shapefile into the temporary folder so it
+        can be modified and returns the path of the copy
+        """
+
+        for ext in extensions:
+            shutil.copy(os.path.join(testShpWorkspace, 'Airports' + ext),
+                        self.tempFolder)
+        return os.path.join(self.tempFolder, 'Airports.shp')
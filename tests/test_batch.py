@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_batch
+----------------------------------
+
+Tests for `batch` module.
+"""
+
+import os
+import unittest
+import arcpy
+
+from geopublisher import batch, geopublisher, scratch
+
+from .helpers import TempFolderMixin
+
+
+class TestBatch(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Sets up the workspaces used for batch publishing
+        """
+        self.currentFolder = os.path.dirname(os.path.abspath(__file__))
+        self.testFgdb = os.path.join(self.currentFolder, 'data',
+                                     'Test_Fgdb.gdb')
+        self.testShpWorkspace = os.path.join(self.currentFolder, 'data',
+                                             'Test_Shapefiles')
+        self.resultFgdb = os.path.join(self.currentFolder, 'results',
+                                       'Results_Fgdb.gdb')
+        self.resultShpWorkspace = os.path.join(self.currentFolder, 'results',
+                                               'Results_Shapefiles')
+        self.makeTempFolder()
+
+    def test_readManifest(self):
+        """
+        Rows of a CSV manifest should become publish jobs. An empty archive
+        folder means no archive.
+        """
+        manifest = os.path.join(self.tempFolder, 'manifest.csv')
+        with open(manifest, 'w') as f:
+            f.write('input_fc,output_location,output_fc,archive_folder\n')
+            f.write('a.shp,out,b.shp,archive\n')
+            f.write('c.shp,out,d.shp,\n')
+        jobs = batch.read_manifest(manifest)
+        self.assertEqual(jobs, [
+            batch.PublishJob('a.shp', 'out', 'b.shp', 'archive'),
+            batch.PublishJob('c.shp', 'out', 'd.shp', None)
+        ])
+
+    def test_lockKey(self):
+        """
+        Jobs writing to the same file geodatabase should share a lock while
+        shapefiles in the same folder should not
+        """
+        gdb = os.path.join(self.tempFolder, 'Out.gdb')
+        job1 = batch.make_job(('a', gdb, 'Roads'))
+        job2 = batch.make_job(('b', os.path.join(gdb, 'Transportation'),
+                               'Trails'))
+        job3 = batch.make_job(('c', self.tempFolder, 'Roads.shp'))
+        job4 = batch.make_job(('d', self.tempFolder, 'Trails.shp'))
+        self.assertEqual(batch.lock_key(job1), batch.lock_key(job2))
+        self.assertNotEqual(batch.lock_key(job3), batch.lock_key(job4))
+
+    def test_publishMany(self):
+        """
+        Test publishing several feature classes at once, including two that
+        write to the same file geodatabase
+        """
+        jobs = [
+            (os.path.join(self.testFgdb, 'Fire_Stations'),
+             self.resultShpWorkspace, 'Fire_Stations.shp', None),
+            (os.path.join(self.testFgdb, 'Fire_Stations'),
+             self.resultFgdb, 'Fire_Stations', None),
+            (os.path.join(self.testShpWorkspace, 'Airports.shp'),
+             self.resultFgdb, 'Airports', None),
+        ]
+        results = batch.publish_many(jobs, max_workers=2)
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertTrue(result.success, result.error)
+            self.assertTrue(arcpy.Exists(result.output_file))
+
+    def test_publishManyAfterLogging(self):
+        """
+        Workers should finish when the parent logged in the background before
+        starting them
+        """
+        geopublisher.logger.logMsg('Publishing in the parent first')
+        geopublisher.logger.writeLogToFile()
+        jobs = [
+            (os.path.join(self.testShpWorkspace, 'Airports.shp'),
+             self.resultShpWorkspace, 'Airports.shp', None),
+        ]
+        results = batch.publish_many(jobs, max_workers=1)
+        self.assertTrue(results[0].success, results[0].error)
+
+    def test_workerScratchRemoved(self):
+        """
+        The scratch workspaces of the workers should be deleted after the run
+        """
+        root = scratch.default_root()
+        before = set(os.listdir(root))
+        jobs = [
+            (os.path.join(self.testShpWorkspace, 'Airports.shp'),
+             self.resultShpWorkspace, 'Airports.shp', None),
+        ]
+        batch.publish_many(jobs, max_workers=1)
+        self.assertEqual([name for name in set(os.listdir(root)) - before
+                          if name.startswith('geopublisher_')], [])
+
+    def test_publishManyFailure(self):
+        """
+        A failing job should be reported without stopping the others
+        """
+        jobs = [
+            (os.path.join(self.testFgdb, 'Does_Not_Exist'),
+             self.resultShpWorkspace, 'Missing.shp', None),
+            (os.path.join(self.testShpWorkspace, 'Airports.shp'),
+             self.resultShpWorkspace, 'Airport.shp', None),
+        ]
+        results = batch.publish_many(jobs, max_workers=2)
+        self.assertFalse(results[0].success)
+        self.assertTrue(results[0].error)
+        self.assertTrue(results[1].success, results[1].error)
+
+    def tearDown(self):
+        """
+        Clean up the published feature classes and temporary files
+        """
+        arcpy.env.workspace = self.resultShpWorkspace
+        for shp in arcpy.ListFeatureClasses():
+            arcpy.Delete_management(shp)
+        arcpy.env.workspace = self.resultFgdb
+        for fc in arcpy.ListFeatureClasses():
+            arcpy.Delete_management(fc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_catalog
+----------------------------------
+
+Tests for `catalog` module.
+"""
+
+import os
+import unittest
+import zipfile
+from datetime import date, timedelta
+
+from geopublisher import catalog
+
+from .helpers import TempFolderMixin
+
+
+class TestArchiveCatalog(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates an archive folder with a catalog
+        """
+        self.makeTempFolder()
+        self.catalog = catalog.ArchiveCatalog(self.tempFolder)
+
+    def _archive(self, layer, day, record=True):
+        name = '%s_%s.zip' % (layer, day.isoformat())
+        path = os.path.join(self.tempFolder, name)
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr(layer, day.isoformat())
+        if record:
+            self.catalog.record(path)
+        return name
+
+    def test_record(self):
+        """
+        Archives should be found by layer and date
+        """
+        self._archive('Parcels.shp', date(2015, 3, 1))
+        self._archive('Parcels.shp', date(2015, 3, 18))
+        self._archive('Roads.shp', date(2015, 4, 2))
+        latest = self.catalog.latest('Parcels.shp')
+        self.assertEqual(latest.archive, 'Parcels.shp_2015-03-18.zip')
+        self.assertEqual(latest.members, ['Parcels.shp'])
+        self.assertEqual(latest.sha256, catalog.file_sha256(
+            self.catalog.path(latest)))
+        march = self.catalog.between('2015-03-01', date(2015, 3, 31))
+        self.assertEqual([a.archive_date for a in march],
+                         ['2015-03-01', '2015-03-18'])
+        self.assertIsNone(self.catalog.latest('Buildings.shp'))
+
+    def test_recordKnownHash(self):
+        """
+        A hash passed to record should be kept instead of hashing the archive
+        """
+        name = self._archive('Parcels.shp', date(2015, 3, 1), record=False)
+        path = os.path.join(self.tempFolder, name)
+        self.catalog.record(path, members=['Parcels.shp'], sha256='abc')
+        self.assertEqual(self.catalog.get(path).sha256, 'abc')
+        self.assertEqual(self.catalog.get(name).members, ['Parcels.shp'])
+        self.assertIsNone(self.catalog.get('Roads.shp_2015-03-01.zip'))
+
+    def test_scan(self):
+        """
+        Zip files missing from the catalog should be added and deleted ones
+        forgotten
+        """
+        self._archive('Parcels.shp', date(2015, 3, 1), record=False)
+        deleted = self._archive('Roads.shp', date(2015, 3, 2))
+        os.remove(os.path.join(self.tempFolder, deleted))
+        self.assertEqual(self.catalog.scan(), (1, 1))
+        self.assertEqual(self.catalog.layers(), ['Parcels.shp'])
+
+    def test_otherFormats(self):
+        """
+        GeoPackage and GeoParquet archives should be kept apart from the zip
+        files of the same layer
+        """
+        self._archive('Parcels', date(2015, 3, 18))
+        path = os.path.join(self.tempFolder, 'Parcels_2015-03-18.gpkg')
+        with open(path, 'wb') as f:
+            f.write(b'SQLite format 3\0')
+        self.catalog.record(path)
+        self.assertEqual(self.catalog.layers(), ['Parcels', 'Parcels.gpkg'])
+        self.assertEqual(self.catalog.latest('Parcels.gpkg').members,
+                         ['Parcels_2015-03-18.gpkg'])
+
+    def test_retention(self):
+        """
+        Daily archives should be kept for the daily period, then one a week,
+        then one a month
+        """
+        today = date(2015, 12, 31)
+        for days in range(0, 200):
+            self._archive('Parcels.shp', today - timedelta(days=days))
+        removed = self.catalog.applyRetention(dailyDays=7, weeklyWeeks=4,
+                                              today=today)
+        kept = self.catalog.between('0000-00-00', '9999-99-99')
+        self.assertEqual(len(kept) + len(removed), 200)
+        dates = [a.archive_date for a in kept]
+        # every day of the last week
+        for days in range(0, 7):
+            self.assertIn((today - timedelta(days=days)).isoformat(), dates)
+        # one a month for the months before the weekly period
+        self.assertIn('2015-07-31', dates)
+        self.assertNotIn('2015-07-30', dates)
+        for archive in removed:
+            self.assertFalse(os.path.exists(self.catalog.path(archive)))
+        self.assertEqual(self.catalog.applyRetention(
+            dailyDays=7, weeklyWeeks=4, today=today), [])
+
+    def tearDown(self):
+        """
+        Close the catalog
+        """
+        self.catalog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_dedup
+----------------------------------
+
+Tests for `dedup` module.
+"""
+
+import multiprocessing
+import os
+import unittest
+
+from geopublisher import dedup
+
+from .helpers import TempFolderMixin
+
+
+def recordArchive(args):
+    """
+    Records an archive of a layer from a worker process, with the layer name
+    as its hash
+    """
+    folder, layer = args
+    index = dedup.ArchiveIndex(folder)
+    try:
+        index.record(layer, os.path.join(folder, layer + '.zip'), layer)
+    finally:
+        index.close()
+
+
+class TestDedup(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies a test shapefile to a temporary folder so it can be modified
+        """
+        self.makeTempFolder()
+        self.copyAirports()
+        self.files = [os.path.join(self.tempFolder, 'Airports' + ext)
+                      for ext in ('.shp', '.shx', '.dbf', '.prj')]
+        self.dbf = os.path.join(self.tempFolder, 'Airports.dbf')
+
+    def _patch(self, file, offset, data):
+        with open(file, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+    def test_dbfDateIgnored(self):
+        """
+        A new last-update date in the dbf header shouldn't change the hash
+        """
+        before = dedup.content_digest(self.files)
+        self._patch(self.dbf, 1, b'\x01\x02\x03')
+        self.assertEqual(before, dedup.content_digest(self.files))
+
+    def test_dataChanged(self):
+        """
+        Changing the data should change the hash
+        """
+        before = dedup.content_digest(self.files)
+        self._patch(self.dbf, os.path.getsize(self.dbf) - 2, b'#')
+        self.assertNotEqual(before, dedup.content_digest(self.files))
+
+    def test_archiveIndex(self):
+        """
+        The latest archive of a layer should be remembered between instances
+        and forgotten if the archive is deleted
+        """
+        archive = os.path.join(self.tempFolder, 'Airports.shp_2015-04-14.zip')
+        open(archive, 'w').close()
+        index = dedup.ArchiveIndex(self.tempFolder)
+        index.record('Airports.shp', archive, 'abc')
+        index.close()
+        index = dedup.ArchiveIndex(self.tempFolder)
+        self.assertEqual(index.latest('Airports.shp'), (archive, 'abc'))
+        self.assertEqual(index.latest('Roads.shp'), (None, None))
+        os.remove(archive)
+        self.assertEqual(index.latest('Airports.shp'), (None, None))
+        index.close()
+
+    def test_archiveIndexProcesses(self):
+        """
+        Archives recorded by several processes at once should all be kept
+        """
+        layers = ['Layer%d.shp' % number for number in range(8)]
+        for layer in layers:
+            open(os.path.join(self.tempFolder, layer + '.zip'), 'w').close()
+        pool = multiprocessing.Pool(8)
+        try:
+            pool.map(recordArchive, [(self.tempFolder, layer)
+                                     for layer in layers])
+        finally:
+            pool.close()
+            pool.join()
+        index = dedup.ArchiveIndex(self.tempFolder)
+        for layer in layers:
+            self.assertEqual(index.latest(layer)[1], layer)
+        index.close()
+
+    def test_linkOrCopy(self):
+        """
+        The linked file should have the same contents as the original
+        """
+        copy = os.path.join(self.tempFolder, 'copy.prj')
+        dedup.link_or_copy(self.files[3], copy)
+        with open(self.files[3], 'rb') as f1, open(copy, 'rb') as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
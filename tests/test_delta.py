@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_delta
+----------------------------------
+
+Tests for `delta` module.
+"""
+
+import unittest
+
+from geopublisher import delta
+
+
+class TestDelta(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Rows are (key, name, geometry as WKB)
+        """
+        self.target = [(1, 'Friday Harbor', bytearray(b'\x01\x01')),
+                       (2, 'Eastsound', bytearray(b'\x01\x02')),
+                       (3, 'Lopez', bytearray(b'\x01\x03'))]
+
+    def test_diffRows(self):
+        """
+        Changed rows should be updated, new rows inserted and missing rows
+        deleted
+        """
+        source = [(1, 'Friday Harbor', bytearray(b'\x01\x01')),
+                  (2, 'Eastsound', bytearray(b'\x01\x09')),
+                  (4, 'Olga', bytearray(b'\x01\x04'))]
+        inserts, updates, deletes = delta.diff_rows(
+            source, delta.read_digests(self.target))
+        self.assertEqual(inserts, [source[2]])
+        self.assertEqual(updates, {2: list(source[1])})
+        self.assertEqual(deletes, set([3]))
+
+    def test_unchanged(self):
+        """
+        Identical rows shouldn't be changed
+        """
+        digests = delta.read_digests(self.target)
+        self.assertEqual(delta.diff_rows(list(self.target), digests),
+                         ([], {}, set()))
+
+    def test_duplicateKey(self):
+        """
+        Keys that aren't unique or are empty should need a full copy
+        """
+        self.assertRaises(delta.FullCopyRequired, delta.read_digests,
+                          self.target + [self.target[0]])
+        self.assertRaises(delta.FullCopyRequired, delta.diff_rows,
+                          [(None, 'Roche', bytearray())], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
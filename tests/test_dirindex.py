@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_dirindex
+----------------------------------
+
+Tests for `dirindex` module.
+"""
+
+import os
+import time
+import unittest
+
+from geopublisher import dirindex
+
+from .helpers import TempFolderMixin
+
+
+class TestDirectoryIndex(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a folder of empty shapefile files
+        """
+        self.makeTempFolder()
+        for name in ['Roads.shp', 'Roads.shx', 'Roads.dbf', 'Roads.shp.xml',
+                     'Roads.mxd', 'Roads_join.shp', 'Roads_join.dbf',
+                     'TAXMAP.SHP', 'TAXMAP.DBF', 'TaxMap.prj']:
+            open(os.path.join(self.tempFolder, name), 'w').close()
+        self.index = dirindex.DirectoryIndex()
+
+    def _names(self, shapefile):
+        files = self.index.shapefileFiles(os.path.join(self.tempFolder,
+                                                       shapefile))
+        return sorted(os.path.basename(f) for f in files)
+
+    def test_shapefileFiles(self):
+        """
+        Only the files of the shapefile should be found, including its
+        metadata but not similarly named shapefiles or map documents
+        """
+        self.assertEqual(self._names('Roads.shp'),
+                         ['Roads.dbf', 'Roads.shp', 'Roads.shp.xml',
+                          'Roads.shx'])
+        self.assertEqual(self._names('Roads_join.shp'),
+                         ['Roads_join.dbf', 'Roads_join.shp'])
+        self.assertEqual(self._names('Missing.shp'), [])
+
+    def test_caseInsensitive(self):
+        """
+        Upper case extensions and names from older tools should be found
+        """
+        self.assertEqual(self._names('TaxMap.shp'),
+                         ['TAXMAP.DBF', 'TAXMAP.SHP', 'TaxMap.prj'])
+
+    def test_refresh(self):
+        """
+        Files added to a folder should be found after a refresh
+        """
+        self.assertEqual(self._names('Parks.shp'), [])
+        open(os.path.join(self.tempFolder, 'Parks.shp'), 'w').close()
+        self.index.refresh(self.tempFolder)
+        self.assertEqual(self._names('Parks.shp'), ['Parks.shp'])
+
+    def _touch(self, mtime):
+        os.utime(self.tempFolder, (mtime, mtime))
+
+    def test_unchangedFolder(self):
+        """
+        A folder whose modified time hasn't changed since it was listed
+        should not be listed again
+        """
+        mtime = time.time() - 10
+        self._touch(mtime)
+        self.assertEqual(self._names('Parks.shp'), [])
+        open(os.path.join(self.tempFolder, 'Parks.shp'), 'w').close()
+        self._touch(mtime)
+        self.assertEqual(self._names('Parks.shp'), [])
+
+    def test_coarseModifiedTime(self):
+        """
+        A file added in the same modified time tick as the listing should be
+        found
+        """
+        mtime = time.time()
+        self._touch(mtime)
+        self.assertEqual(self._names('Parks.shp'), [])
+        open(os.path.join(self.tempFolder, 'Parks.shp'), 'w').close()
+        self._touch(mtime)
+        self.assertEqual(self._names('Parks.shp'), ['Parks.shp'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_fastcopy
+----------------------------------
+
+Tests for `fastcopy` module.
+"""
+
+import os
+import unittest
+
+from geopublisher import fastcopy
+from geopublisher.dirindex import DirectoryIndex
+
+from .helpers import TempFolderMixin
+
+
+class TestFastCopy(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies a test shapefile, with metadata, to a temporary folder
+        """
+        self.makeTempFolder()
+        self.copyAirports()
+        with open(os.path.join(self.tempFolder, 'Airports.shp.xml'),
+                  'w') as f:
+            f.write('<metadata />')
+        self.shapefile = os.path.join(self.tempFolder, 'Airports.shp')
+
+    def _read(self, file):
+        with open(file, 'rb') as f:
+            return f.read()
+
+    def test_copyFile(self):
+        """
+        The copy should have the same contents as the original
+        """
+        copy = os.path.join(self.tempFolder, 'copy.dbf')
+        method = fastcopy.copy_file(
+            os.path.join(self.tempFolder, 'Airports.dbf'), copy)
+        self.assertIn(method, ('reflink', 'copy_file_range', 'sendfile',
+                               'copy'))
+        self.assertEqual(self._read(copy), self._read(
+            os.path.join(self.tempFolder, 'Airports.dbf')))
+
+    def test_copyShapefile(self):
+        """
+        Every file should be copied to the new base name, including the
+        .shp.xml metadata
+        """
+        output = os.path.join(self.tempFolder, 'output')
+        os.mkdir(output)
+        index = DirectoryIndex()
+        fastcopy.copy_shapefile(self.shapefile,
+                                os.path.join(output, 'Airport.shp'), index)
+        self.assertEqual(sorted(os.listdir(output)),
+                         ['Airport.dbf', 'Airport.prj', 'Airport.shp',
+                          'Airport.shp.xml', 'Airport.shx'])
+        self.assertEqual(self._read(os.path.join(output, 'Airport.shp')),
+                         self._read(self.shapefile))
+        self.assertEqual(len(index.shapefileFiles(
+            os.path.join(output, 'Airport.shp'))), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_formats
+----------------------------------
+
+Tests for `formats` module.
+"""
+
+import json
+import os
+import unittest
+from datetime import date, datetime
+
+from geopublisher import formats
+
+from .helpers import TempFolderMixin
+
+
+class TestFormats(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a temporary folder for the archives
+        """
+        self.makeTempFolder()
+
+    def test_archiveFormats(self):
+        """
+        Formats should be accepted as a list or comma separated, and unknown
+        ones refused
+        """
+        self.assertEqual(formats.archive_formats(None), ['shapefile'])
+        self.assertEqual(formats.archive_formats('gpkg, GeoParquet,gpkg'),
+                         ['gpkg', 'geoparquet'])
+        self.assertEqual(formats.archive_formats(['shapefile', 'gpkg']),
+                         ['shapefile', 'gpkg'])
+        self.assertRaises(ValueError, formats.archive_formats, 'kml')
+
+    def test_archivePath(self):
+        """
+        Archives should be named after the layer without .shp and the date
+        """
+        path = formats.archive_path(self.tempFolder, 'Parcels.shp',
+                                    'geoparquet', date(2015, 3, 18))
+        self.assertEqual(os.path.basename(path), 'Parcels_2015-03-18.parquet')
+
+    def test_writeGeoparquet(self):
+        """
+        Rows should be written in batches with WKB geometry and GeoParquet
+        metadata
+        """
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        path = os.path.join(self.tempFolder, 'Airports.parquet')
+        point = bytearray(b'\x01\x01\x00\x00\x00' + b'\x00' * 16)
+        rows = [(number, 'Airport %d' % number, datetime(2015, 3, 18), point)
+                for number in range(10)]
+        geo = {'version': '1.0.0', 'primary_column': 'geometry',
+               'columns': {'geometry': {'encoding': 'WKB',
+                                        'geometry_types': [], 'crs': None}}}
+        count = formats.write_geoparquet(
+            path, [('OBJECTID', 'OID'), ('GEONAME', 'String'),
+                   ('UPDATED', 'Date')], iter(rows), geo, batchRows=4)
+        self.assertEqual(count, 10)
+        parquet = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(json.loads(parquet.schema_arrow.metadata[b'geo']),
+                         geo)
+        table = parquet.read()
+        self.assertEqual(table.column('GEONAME').to_pylist()[9], 'Airport 9')
+        self.assertEqual(table.column('geometry').to_pylist()[0],
+                         bytes(point))
+
+
+if __name__ == '__main__':
+    unittest.main()
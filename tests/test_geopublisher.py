@@ -201,6 +201,134 @@ class TestGeopublisher(unittest.TestCase):
         self.assertTrue(arcpy.Exists(os.path.join(loc, f2)))
         self.assertTrue(zipfile.is_zipfile(os.path.join(zipFolder, zipFile)))
 
+    def test_publishShapefileToShapefileSwap(self):
+        """
+        Test publishing over an existing shapefile by swapping in a staging
+        copy. No staging or backup files should be left behind.
+        """
+        f1 = os.path.join(self.testShpWorkspace, 'Airports.shp')
+        loc = self.resultShpWorkspace
+        f2 = 'Airport.shp'
+        geopublisher.publish_data(f1, loc, f2)
+        geopublisher.publish_data(f1, loc, f2, swap=True)
+        self.assertTrue(arcpy.Exists(os.path.join(loc, f2)))
+        self.assertFalse(arcpy.Exists(os.path.join(loc, 'Airport_staging.shp')))
+        self.assertFalse(arcpy.Exists(os.path.join(loc, 'Airport_old.shp')))
+
+    def test_publishFgdbToFgdbSwap(self):
+        """
+        Test publishing over an existing feature class in a file geodatabase
+        by swapping in a staging copy
+        """
+        f1 = os.path.join(self.testFgdb, 'Fire_Stations')
+        loc = self.resultFgdb
+        f2 = 'Fire_Stations'
+        geopublisher.publish_data(f1, loc, f2)
+        geopublisher.publish_data(f1, loc, f2, swap=True)
+        self.assertTrue(arcpy.Exists(os.path.join(loc, f2)))
+        self.assertFalse(arcpy.Exists(os.path.join(loc, 'Fire_Stations_staging')))
+        self.assertFalse(arcpy.Exists(os.path.join(loc, 'Fire_Stations_old')))
+
+    def test_publishShapefileToShapefileDelta(self):
+        """
+        Test publishing only the changed rows over an existing shapefile. A
+        row deleted from the output should be inserted again.
+        """
+        f1 = os.path.join(self.testShpWorkspace, 'Airports.shp')
+        loc = self.resultShpWorkspace
+        f2 = 'Airports_Delta.shp'
+        output = os.path.join(loc, f2)
+        geopublisher.publish_data(f1, loc, f2)
+        with arcpy.da.UpdateCursor(output, ['OBJECTID']) as cursor:
+            for row in cursor:
+                cursor.deleteRow()
+                break
+        geopublisher.publish_data(f1, loc, f2, key_field='OBJECTID')
+        self.assertEqual(arcpy.GetCount_management(f1).getOutput(0),
+                         arcpy.GetCount_management(output).getOutput(0))
+
+    def test_publishShapefileToShapefileDeltaSwap(self):
+        """
+        Test applying the changed rows to a staging copy that is swapped in,
+        leaving no staging or backup shapefile behind
+        """
+        f1 = os.path.join(self.testShpWorkspace, 'Airports.shp')
+        loc = self.resultShpWorkspace
+        f2 = 'Airports_DeltaSwap.shp'
+        output = os.path.join(loc, f2)
+        geopublisher.publish_data(f1, loc, f2)
+        with arcpy.da.UpdateCursor(output, ['OBJECTID']) as cursor:
+            for row in cursor:
+                cursor.deleteRow()
+                break
+        geopublisher.publish_data(f1, loc, f2, key_field='OBJECTID',
+                                  swap=True)
+        self.assertEqual(arcpy.GetCount_management(f1).getOutput(0),
+                         arcpy.GetCount_management(output).getOutput(0))
+        self.assertFalse(arcpy.Exists(os.path.join(
+            loc, 'Airports_DeltaSwap_staging.shp')))
+        self.assertFalse(arcpy.Exists(os.path.join(
+            loc, 'Airports_DeltaSwap_old.shp')))
+
+    def test_publishShapefileToShapefileSubset(self):
+        """
+        Test publishing only some rows and fields of a shapefile, renaming
+        one of the fields
+        """
+        f1 = os.path.join(self.testShpWorkspace, 'Airports.shp')
+        loc = self.resultShpWorkspace
+        f2 = 'Airports_Subset.shp'
+        where = "\"Island\" = 'San Juan'"
+        geopublisher.publish_data(f1, loc, f2, where_clause=where,
+                                  fields=['GEONAME', ('ELEVATION', 'ELEV')])
+        output = os.path.join(loc, f2)
+        names = [f.name for f in arcpy.ListFields(output)]
+        self.assertIn('ELEV', names)
+        self.assertNotIn('Island', names)
+        layer = arcpy.MakeFeatureLayer_management(f1, 'airports', where)
+        self.assertEqual(arcpy.GetCount_management(layer).getOutput(0),
+                         arcpy.GetCount_management(output).getOutput(0))
+        arcpy.Delete_management(layer)
+
+    def test_publishShapefileToShapefileStateArchive(self):
+        """
+        An unchanged input should be skipped, but not when an archive is
+        asked for that wasn't made before
+        """
+        f1 = os.path.join(self.testShpWorkspace, 'Airports.shp')
+        loc = self.resultShpWorkspace
+        f2 = 'Airports_State.shp'
+        state_file = os.path.join(self.archiveWorkspace, 'state.sqlite')
+        self.assertTrue(geopublisher.publish_data(f1, loc, f2,
+                                                  state_file=state_file))
+        self.assertFalse(geopublisher.publish_data(f1, loc, f2,
+                                                   state_file=state_file))
+        self.assertTrue(geopublisher.publish_data(
+            f1, loc, f2, archive_folder=self.archiveWorkspace,
+            state_file=state_file))
+        zipFile = f2 + '_' + date.isoformat(datetime.now()) + '.zip'
+        self.assertTrue(os.path.exists(os.path.join(self.archiveWorkspace,
+                                                    zipFile)))
+        self.assertFalse(geopublisher.publish_data(
+            f1, loc, f2, archive_folder=self.archiveWorkspace,
+            state_file=state_file))
+
+    def test_publishFanout(self):
+        """
+        Test publishing a feature class to a shapefile and a File
+        Geodatabase from one read, archiving the shapefile
+        """
+        f1 = os.path.join(self.testFgdb, 'Fire_Stations')
+        targets = [(self.resultShpWorkspace, 'Fire_Stations_Fanout.shp'),
+                   (self.resultFgdb, 'Fire_Stations_Fanout')]
+        geopublisher.publish_fanout(f1, targets, self.archiveWorkspace)
+        for loc, f2 in targets:
+            self.assertTrue(arcpy.Exists(os.path.join(loc, f2)))
+        archive = os.path.join(
+            self.archiveWorkspace, 'Fire_Stations_Fanout.shp_%s.zip' %
+            date.isoformat(datetime.now()))
+        self.assertTrue(zipfile.is_zipfile(archive))
+
     def test_zipShapefile(self):
         """
         Test creation of a shapefile archive. The test creates the zip
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_lazy
+----------------------------------
+
+Tests for `lazy` module.
+"""
+
+import os
+import subprocess
+import sys
+import types
+import unittest
+
+from geopublisher import lazy
+
+from .helpers import TempFolderMixin
+
+
+class TestLazyModule(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Adds a stand-in module that records when it is used
+        """
+        self.module = types.ModuleType('lazy_test_module')
+        self.module.ExecuteError = type('ExecuteError', (Exception,), {})
+        self.module.value = 42
+
+    def tearDown(self):
+        sys.modules.pop('lazy_test_module', None)
+
+    def test_importedOnFirstUse(self):
+        """
+        The module shouldn't be imported until an attribute is used
+        """
+        proxy = lazy.LazyModule('lazy_test_module')
+        self.assertFalse(proxy.loaded)
+        sys.modules['lazy_test_module'] = self.module
+        self.assertEqual(proxy.value, 42)
+        self.assertTrue(proxy.loaded)
+        proxy.value = 7
+        self.assertEqual(self.module.value, 7)
+
+    def test_executeErrorNotImported(self):
+        """
+        ExecuteError shouldn't import the module or match other errors before
+        the module has been imported
+        """
+        proxy = lazy.LazyModule('lazy_test_module')
+        try:
+            raise ValueError('not a geoprocessing error')
+        except proxy.ExecuteError:
+            self.fail('ExecuteError matched a ValueError')
+        except ValueError:
+            pass
+        self.assertFalse(proxy.loaded)
+        sys.modules['lazy_test_module'] = self.module
+        self.assertIs(proxy.ExecuteError, self.module.ExecuteError)
+
+
+class TestImport(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.makeTempFolder()
+        self.packageFolder = os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)))
+
+    def test_importWithoutArcpy(self):
+        """
+        Importing geopublisher shouldn't need arcpy, print or create the Logs
+        folder
+        """
+        code = ('import sys; sys.modules["arcpy"] = None; '
+                'from geopublisher import geopublisher, messaging')
+        env = dict(os.environ, PYTHONPATH=self.packageFolder)
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=self.tempFolder, env=env)
+        self.assertEqual(output, b'')
+        self.assertEqual(os.listdir(self.tempFolder), [])
+
+    def test_importWithoutOptionalModules(self):
+        """
+        Importing geopublisher shouldn't load the modules only some features
+        use
+        """
+        code = ('import sys; sys.modules["arcpy"] = None; '
+                'from geopublisher import geopublisher; '
+                'print(sorted(m for m in ("numpy", "pyarrow", "pyproj") '
+                'if m in sys.modules))')
+        env = dict(os.environ, PYTHONPATH=self.packageFolder)
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=self.tempFolder, env=env)
+        self.assertEqual(output.strip(), b'[]')
+
+    def test_importClient(self):
+        """
+        Clients of the service shouldn't load the publishing modules
+        """
+        code = ('import sys; sys.modules["arcpy"] = None; '
+                'from geopublisher.service import submit; '
+                'print("geopublisher.geopublisher" in sys.modules)')
+        env = dict(os.environ, PYTHONPATH=self.packageFolder)
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=self.tempFolder, env=env)
+        self.assertEqual(output.strip(), b'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,28 @@
 import sys
 import datetime
 import os
+import json
+import multiprocessing
 import shutil
+import tempfile
+import threading
 import geopublisher.logging
 import unittest
 
 
+def logInWorker(logFile):
+    """
+    Logs a message in a pool worker through a background logger and returns
+    the log file
+    """
+    logger = geopublisher.logging.Logger(background=True)
+    logger.logFile = logFile
+    logger.logMsg('from the worker', printMsg=False)
+    logger.writeLogToFile(wait=True)
+    with open(logFile, mode='r') as f:
+        return f.read()
+
+
 class ArcpyStub(object):
     """
     This is a stub we can use for testing arcpy functions rather
@@ -87,3 +104,132 @@ class TestLogger(unittest.TestCase):
         self.logger.logError()
         time = datetime.time.isoformat(datetime.datetime.now().time())
         self.assertEqual(self.logger.log, '{0}\n{1} | **ERROR**\n{2} | None\n'.format(log, time, time))
+
+    def test_maxEntries(self):
+        """
+        Only the latest messages should be kept in memory but all of them
+        should be written to the log file
+        """
+        tempFolder = tempfile.mkdtemp()
+        logger = geopublisher.logging.Logger(maxEntries=3)
+        logger.logFile = os.path.join(tempFolder, 'log.txt')
+        for i in range(10):
+            logger.logMsg('message %d' % i, printMsg=False)
+        self.assertEqual(len(logger.entries), 3)
+        self.assertTrue(logger.log.endswith('message 9'))
+        logger.writeLogToFile()
+        with open(logger.logFile, mode='r') as f:
+            log = f.read()
+        shutil.rmtree(tempFolder)
+        for i in range(10):
+            self.assertIn('message %d\n' % i, log + '\n')
+
+    def test_writeLogToFileTwice(self):
+        """
+        Writing the log again should only add the new messages
+        """
+        tempFolder = tempfile.mkdtemp()
+        self.logger.logFile = os.path.join(tempFolder, 'log.txt')
+        self.logger.logMsg(self.logTxt, printMsg=False)
+        self.logger.writeLogToFile()
+        self.logger.logMsg(self.errTxt, printMsg=False)
+        self.logger.writeLogToFile()
+        with open(self.logger.logFile, mode='r') as f:
+            log = f.read()
+        shutil.rmtree(tempFolder)
+        self.assertEqual(log, '\n\n' + self.logger.log)
+
+    def test_jobContext(self):
+        """
+        Messages logged inside a job context should be tagged with it
+        """
+        with self.logger.jobContext(job=1):
+            with self.logger.jobContext(layer='Parcels.shp'):
+                self.logger.logMsg(self.logTxt, printMsg=False)
+            self.logger.logMsg(self.errTxt, printMsg=False)
+        self.logger.logMsg(self.logTxt, printMsg=False)
+        entries = list(self.logger.entries)
+        self.assertTrue(entries[0].endswith(
+            '| [job=1 layer=Parcels.shp] ' + self.logTxt))
+        self.assertTrue(entries[1].endswith('| [job=1] ' + self.errTxt))
+        self.assertTrue(entries[2].endswith('| ' + self.logTxt))
+
+    def test_backgroundWriter(self):
+        """
+        Messages logged from several threads should all reach the log file
+        through the background writer
+        """
+        tempFolder = tempfile.mkdtemp()
+        logger = geopublisher.logging.Logger(background=True)
+        logger.logFile = os.path.join(tempFolder, 'log.txt')
+
+        def logMessages(job):
+            with logger.jobContext(job=job):
+                for i in range(100):
+                    logger.logMsg('message %d' % i, printMsg=False)
+                    logger.writeLogToFile()
+
+        threads = [threading.Thread(target=logMessages, args=(job,))
+                   for job in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logger.writeLogToFile(wait=True)
+        with open(logger.logFile, mode='r') as f:
+            log = f.read()
+        shutil.rmtree(tempFolder)
+        self.assertEqual(log, '\n\n' + logger.log)
+        self.assertEqual(log.count('] message'), 400)
+
+    def test_forkedWriter(self):
+        """
+        A worker forked after the parent logged in the background should
+        start its own writer instead of waiting on the parent's
+        """
+        if not hasattr(os, 'fork'):
+            self.skipTest('needs fork')
+        tempFolder = tempfile.mkdtemp()
+        logger = geopublisher.logging.Logger(background=True)
+        logger.logFile = os.path.join(tempFolder, 'parent.txt')
+        logger.logMsg('from the parent', printMsg=False)
+        logger.writeLogToFile(wait=True)
+        if hasattr(multiprocessing, 'get_context'):
+            pool = multiprocessing.get_context('fork').Pool(1)
+        else:
+            pool = multiprocessing.Pool(1)
+        try:
+            log = pool.apply_async(logInWorker, (
+                os.path.join(tempFolder, 'worker.txt'),)).get(timeout=30)
+        finally:
+            pool.terminate()
+            pool.join()
+            shutil.rmtree(tempFolder)
+        self.assertIn('from the worker', log)
+
+    def test_span(self):
+        """
+        Timed steps should be written to the spans file as JSON lines with
+        the job context and any values added during the step
+        """
+        tempFolder = tempfile.mkdtemp()
+        self.logger.spanFile = os.path.join(tempFolder, 'spans.jsonl')
+        with self.logger.jobContext(layer='Parcels.shp'):
+            with self.logger.span('zip', bytes_in=100) as span:
+                span['bytes_out'] = 40
+            try:
+                with self.logger.span('copy'):
+                    raise ValueError('bad')
+            except ValueError:
+                pass
+        with open(self.logger.spanFile, mode='r') as f:
+            records = [json.loads(line) for line in f]
+        shutil.rmtree(tempFolder)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['step'], 'zip')
+        self.assertEqual(records[0]['layer'], 'Parcels.shp')
+        self.assertEqual(records[0]['bytes_in'], 100)
+        self.assertEqual(records[0]['bytes_out'], 40)
+        self.assertGreaterEqual(records[0]['duration'], 0)
+        self.assertNotIn('error', records[0])
+        self.assertEqual(records[1]['error'], 'ValueError: bad')
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_manifest
+----------------------------------
+
+Tests for `manifest` module.
+"""
+
+import hashlib
+import os
+import unittest
+
+from geopublisher import manifest, zipper
+
+from .helpers import TempFolderMixin
+
+
+class TestManifest(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Zips the Airports test shapefile
+        """
+        self.currentFolder = os.path.dirname(os.path.abspath(__file__))
+        self.testShpWorkspace = os.path.join(self.currentFolder, 'data',
+                                             'Test_Shapefiles')
+        self.makeTempFolder()
+        self.zipPath = os.path.join(self.tempFolder,
+                                    'Airports.shp_2015-03-18.zip')
+        self.shapefile = os.path.join(self.testShpWorkspace, 'Airports.shp')
+        self.zf = zipper.zip_writer(self.zipPath, digests=True)
+        with self.zf:
+            for ext in ('.shp', '.shx', '.dbf'):
+                self.zf.write(os.path.join(self.testShpWorkspace,
+                                           'Airports' + ext), 'Airports' + ext)
+
+    def test_writeManifest(self):
+        """
+        The manifest should be written next to the zip and list the members
+        with their SHA-256
+        """
+        features = manifest.dbf_record_count(self.shapefile)
+        manifest.write_manifest(self.zipPath, manifest.make_manifest(
+            self.zipPath, 'Airports.shp', self.zf, features))
+        self.assertTrue(os.path.exists(self.zipPath + '.json'))
+        written = manifest.load_manifest(self.zipPath)
+        self.assertEqual(written['layer'], 'Airports.shp')
+        self.assertEqual(written['size'], os.path.getsize(self.zipPath))
+        self.assertTrue(written['features'] > 0)
+        self.assertEqual([m['name'] for m in written['members']],
+                         ['Airports.shp', 'Airports.shx', 'Airports.dbf'])
+        with open(self.shapefile, 'rb') as f:
+            data = f.read()
+        member = written['members'][0]
+        self.assertEqual(member['size'], len(data))
+        self.assertEqual(member['sha256'], hashlib.sha256(data).hexdigest())
+
+    def test_copyManifest(self):
+        """
+        A linked archive should get the manifest of the one it links to
+        """
+        copy = os.path.join(self.tempFolder, 'Airports.shp_2015-03-19.zip')
+        self.assertFalse(manifest.copy_manifest(self.zipPath, copy))
+        manifest.write_manifest(self.zipPath, manifest.make_manifest(
+            self.zipPath, 'Airports.shp', self.zf))
+        self.assertTrue(manifest.copy_manifest(self.zipPath, copy))
+        copied = manifest.load_manifest(copy)
+        self.assertEqual(copied['archive'], os.path.basename(copy))
+        self.assertEqual(copied['members'],
+                         manifest.load_manifest(self.zipPath)['members'])
+
+
+if __name__ == '__main__':
+    unittest.main()
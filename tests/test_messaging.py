@@ -1,6 +1,17 @@
+import os
+import smtplib
+import socket
+import threading
 import geopublisher.messaging
 import unittest
 
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from .helpers import TempFolderMixin
+
 
 class fake_SMTP:
     """
@@ -9,7 +20,7 @@ class fake_SMTP:
     """
     calls = []
 
-    def __init__(self, _server, _port):
+    def __init__(self, _server, _port, timeout=None):
         self.calls.append("__init__('%s')" % _server)
 
     def sendmail(self, _from, _to, _msg):
@@ -19,6 +30,60 @@ class fake_SMTP:
         self.calls.append("quit()")
 
 
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough of an SMTP server to accept mail from smtplib
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        while True:
+            line = self.rfile.readline().decode('ascii').strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command == 'RCPT' and 'refused' in line.lower():
+                self.reply('550 no such user')
+                continue
+            if command == 'DATA':
+                self.reply('354 go ahead')
+                data = []
+                while True:
+                    line = self.rfile.readline().decode('utf-8')
+                    if line.rstrip('\r\n') == '.':
+                        break
+                    data.append(line)
+                self.server.messages.append(''.join(data))
+            self.reply('250 OK')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    A local stand-in for the mail server that counts connections and keeps
+    the messages it receives
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0),
+                                                 SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
 class TestMessaging(unittest.TestCase):
 
     to = ['test@test.com']
@@ -64,3 +129,142 @@ class TestMessaging(unittest.TestCase):
         emailerTest = geopublisher.messaging.Emailer('[fake@fake]', testing=True)
         emailerTest.sendEmail(self.sub, self.body)
         self.assertNotIn('fake@fake', fake_SMTP.calls)
+
+
+class TestSessions(unittest.TestCase):
+
+    to = ['test@test.com']
+
+    def setUp(self):
+        """
+        Start a local SMTP server and point an emailer at it
+        """
+
+        geopublisher.messaging.SMTP = smtplib.SMTP
+        self.server = LocalSMTPServer()
+        self.emailer = geopublisher.messaging.Emailer(self.to)
+        self.emailer.server, self.emailer.port = self.server.server_address
+
+    def tearDown(self):
+        """
+        Stop the local SMTP server
+        """
+
+        self.server.stop()
+
+    def test_withoutSession(self):
+        """
+        Each email should use its own connection outside a session
+        """
+
+        self.emailer.sendEmail('one', 'body')
+        self.emailer.sendEmail('two', 'body')
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.server.messages), 2)
+
+    def test_session(self):
+        """
+        All emails sent in a session should share one connection
+        """
+
+        with self.emailer.session():
+            for i in range(5):
+                self.emailer.sendEmail('email %d' % i, 'body')
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 5)
+
+    def test_digest(self):
+        """
+        A digest should send one summary email per list of recipients
+        """
+
+        self.emailer.digest = True
+        self.emailer.sendEmail('Parcels published', 'parcels body')
+        self.emailer.sendEmail('Roads failed', 'roads body')
+        self.emailer.sendEmail('Roads failed', 'roads body', ['gis@test.com'])
+        self.assertEqual(self.server.messages, [])
+        self.emailer.sendDigest('Nightly publishing')
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertIn('parcels body', self.server.messages[0])
+        self.assertIn('roads body', self.server.messages[0])
+        self.assertNotIn('parcels body', self.server.messages[1])
+        self.emailer.sendDigest('Nightly publishing')
+        self.assertEqual(len(self.server.messages), 2)
+
+
+class TestOutbox(TempFolderMixin, unittest.TestCase):
+
+    to = ['test@test.com']
+
+    def setUp(self):
+        """
+        Start a local SMTP server and create an outbox folder
+        """
+
+        geopublisher.messaging.SMTP = smtplib.SMTP
+        self.server = LocalSMTPServer()
+        self.folder = self.makeTempFolder()
+        self.emailer = geopublisher.messaging.Emailer(self.to)
+        self.emailer.server, self.emailer.port = self.server.server_address
+
+    def tearDown(self):
+        """
+        Stop the local SMTP server
+        """
+
+        self.server.stop()
+
+    def test_queueEmail(self):
+        """
+        Queued emails should be delivered in the background
+        """
+
+        outbox = geopublisher.messaging.Outbox(self.emailer, self.folder)
+        outbox.queueEmail('one', 'body')
+        outbox.queueEmail('two', 'body')
+        self.assertTrue(outbox.flush(5))
+        outbox.stop()
+        self.assertEqual(len(self.server.messages), 2)
+
+    def test_serverDown(self):
+        """
+        Emails that can't be delivered should stay in the outbox and be sent
+        by the next outbox started on the folder
+        """
+
+        s = socket.socket()
+        s.bind(('127.0.0.1', 0))
+        closedPort = s.getsockname()[1]
+        s.close()
+        downEmailer = geopublisher.messaging.Emailer(self.to)
+        downEmailer.server, downEmailer.port = '127.0.0.1', closedPort
+        outbox = geopublisher.messaging.Outbox(downEmailer, self.folder,
+                                               retryDelay=0.01)
+        outbox.queueEmail('one', 'body')
+        self.assertFalse(outbox.flush(0.2))
+        self.assertGreater(outbox.failures, 1)
+        outbox.stop(0)
+        self.assertEqual(len(outbox.pending()), 1)
+
+        outbox = geopublisher.messaging.Outbox(self.emailer, self.folder)
+        self.assertTrue(outbox.flush(5))
+        outbox.stop()
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_permanentFailures(self):
+        """
+        Refused and unreadable emails should be moved to the failed folder
+        without holding up the emails after them
+        """
+
+        with open(os.path.join(self.folder, '0_corrupt.json'), 'w') as f:
+            f.write('{not json')
+        outbox = geopublisher.messaging.Outbox(self.emailer, self.folder)
+        outbox.queueEmail('refused', 'body', ['refused@test.com'])
+        outbox.queueEmail('sent', 'body')
+        self.assertTrue(outbox.flush(5))
+        outbox.stop()
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertIn('Subject: sent', self.server.messages[0])
+        self.assertEqual(len(os.listdir(outbox.failedFolder)), 2)
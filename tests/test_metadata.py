@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_metadata
+----------------------------------
+
+Tests for `metadata` module.
+"""
+
+import os
+import unittest
+
+from geopublisher import metadata
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a cache whose lookups are counted instead of made with arcpy
+        """
+        self.clock = FakeClock()
+        self.cache = metadata.MetadataCache(ttl=60, maxEntries=3,
+                                            clock=self.clock)
+        self.calls = []
+        self.root = os.path.abspath('Data.gdb')
+
+    def lookup(self, path):
+        self.calls.append(path)
+        return 'described %s' % os.path.basename(path)
+
+    def describe(self, name):
+        return self.cache._lookup('describe', os.path.join(self.root, name),
+                                  self.lookup)
+
+    def test_hits(self):
+        """
+        A path should be looked up once while it is fresh and counted as a
+        miss, then a hit
+        """
+        self.assertEqual(self.describe('Parcels'), 'described Parcels')
+        self.assertEqual(self.describe('Parcels'), 'described Parcels')
+        self.assertEqual(len(self.calls), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_ttl(self):
+        """
+        A lookup older than the ttl should be made again
+        """
+        self.describe('Parcels')
+        self.clock.now += 59
+        self.describe('Parcels')
+        self.clock.now += 2
+        self.describe('Parcels')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_disabled(self):
+        """
+        A ttl of 0 should make every lookup
+        """
+        self.cache.ttl = 0
+        self.describe('Parcels')
+        self.describe('Parcels')
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_lru(self):
+        """
+        The least recently used lookup should be dropped when the cache is
+        full
+        """
+        self.describe('Parcels')
+        self.describe('Roads')
+        self.describe('Parcels')
+        self.describe('Zoning')
+        self.describe('Parks')
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        del self.calls[:]
+        self.describe('Parcels')
+        self.describe('Roads')
+        self.assertEqual(self.calls, [os.path.join(self.root, 'Roads')])
+
+    def test_invalidate(self):
+        """
+        Invalidating a dataset should forget it, what is inside it and the
+        workspace holding it, but not its neighbours
+        """
+        self.cache.maxEntries = 10
+        for name in ['', 'Parcels', 'Parcels/Attachments', 'Roads']:
+            self.describe(name)
+        self.cache.invalidate(os.path.join(self.root, 'Parcels'))
+        del self.calls[:]
+        for name in ['', 'Parcels', 'Parcels/Attachments', 'Roads']:
+            self.describe(name)
+        self.assertEqual(len(self.calls), 3)
+        self.assertNotIn(os.path.join(self.root, 'Roads'), self.calls)
+
+    def test_invalidatedWhileLooking(self):
+        """
+        A lookup made while its dataset was invalidated shouldn't be kept
+        """
+        def lookup(path):
+            self.cache.invalidate(path)
+            return 'old'
+        self.cache._lookup('exists', self.root, lookup)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_errors(self):
+        """
+        Failed lookups should raise every time and not be kept
+        """
+        def lookup(path):
+            raise IOError('"%s" does not exist' % path)
+        for _ in range(2):
+            self.assertRaises(IOError, self.cache._lookup, 'describe',
+                              self.root, lookup)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
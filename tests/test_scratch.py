@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_scratch
+----------------------------------
+
+Tests for `scratch` module.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from collections import namedtuple
+
+from geopublisher import scratch
+
+from .helpers import TempFolderMixin
+
+
+Field = namedtuple('Field', ['name', 'type', 'length'])
+
+
+class TestScratchWorkspace(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a folder to use as the scratch root
+        """
+        self.root = self.makeTempFolder()
+
+    def _write(self, path, size):
+        with open(path, 'wb') as f:
+            f.write(b'\0' * size)
+
+    def test_cleanup(self):
+        """
+        The scratch folder and everything in it should be deleted when the
+        with block ends, even if it fails
+        """
+        for fail in (False, True):
+            try:
+                with scratch.ScratchWorkspace(self.root) as workspace:
+                    first = workspace.shapefile('Parcels')
+                    second = workspace.shapefile('Parcels.shp')
+                    self._write(first, 10)
+                    folder = workspace.folder
+                    if fail:
+                        raise ValueError('failed')
+            except ValueError:
+                pass
+            self.assertEqual(os.path.basename(first), 'Parcels.shp')
+            self.assertEqual(os.path.basename(second), 'Parcels_1.shp')
+            self.assertEqual(workspace.artifacts, [])
+            self.assertFalse(os.path.exists(folder))
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_budget(self):
+        """
+        Going over the budget should raise ScratchBudgetExceeded
+        """
+        with scratch.ScratchWorkspace(self.root, budget=100) as workspace:
+            workspace.reserve(60)
+            self._write(workspace.path('a.dbf'), 60)
+            self.assertEqual(workspace.checkBudget(), 60)
+            self.assertRaises(scratch.ScratchBudgetExceeded,
+                              workspace.reserve, 50)
+            self._write(workspace.path('b.dbf'), 50)
+            self.assertRaises(scratch.ScratchBudgetExceeded,
+                              workspace.checkBudget)
+
+    def test_dbfRecordWidth(self):
+        """
+        A dbf record should hold the deletion flag and each copied field,
+        with strings as long as their length up to 254
+        """
+        fields = [Field('OBJECTID', 'OID', 4),
+                  Field('Shape', 'Geometry', 0),
+                  Field('PIN', 'String', 12),
+                  Field('NOTES', 'String', 1000),
+                  Field('ACRES', 'Double', 8),
+                  Field('ZONE', 'SmallInteger', 2)]
+        self.assertEqual(scratch.dbf_record_width(fields),
+                         1 + 12 + 254 + 19 + 5)
+        self.assertEqual(scratch.dbf_record_width(fields, ['pin', 'ACRES']),
+                         1 + 12 + 19)
+
+    def test_sweep(self):
+        """
+        Old scratch folders left behind should be deleted, new ones kept
+        """
+        old = tempfile.mkdtemp(prefix='geopublisher_scratch_', dir=self.root)
+        new = tempfile.mkdtemp(prefix='geopublisher_scratch_', dir=self.root)
+        day_ago = time.time() - 2 * scratch.ScratchWorkspace.staleAge
+        os.utime(old, (day_ago, day_ago))
+        self.assertEqual(scratch.sweep(self.root), [old])
+        self.assertTrue(os.path.exists(new))
+
+    def _stale(self, pid_file):
+        folder = tempfile.mkdtemp(prefix='geopublisher_scratch_',
+                                  dir=self.root)
+        with open(os.path.join(folder, scratch.ScratchWorkspace.pidName),
+                  'w') as f:
+            f.write(pid_file)
+        day_ago = time.time() - 2 * scratch.ScratchWorkspace.staleAge
+        os.utime(folder, (day_ago, day_ago))
+        return folder
+
+    def test_sweepRunning(self):
+        """
+        Old scratch folders should only be deleted once the process that made
+        them has exited
+        """
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        host = socket.gethostname()
+        running = self._stale('%s %d' % (host, os.getpid()))
+        other_host = self._stale('elsewhere.example.com 1')
+        exited = self._stale('%s %d' % (host, process.pid))
+        self.assertEqual(scratch.sweep(self.root), [exited])
+        self.assertTrue(os.path.exists(running))
+        self.assertTrue(os.path.exists(other_host))
+
+    def test_pidFile(self):
+        """
+        The scratch folder should name the process that made it
+        """
+        workspace = scratch.ScratchWorkspace(self.root)
+        with workspace:
+            with open(os.path.join(workspace.create(),
+                                   workspace.pidName)) as f:
+                self.assertEqual(f.read().split()[1], str(os.getpid()))
+
+
+if __name__ == '__main__':
+    unittest.main()
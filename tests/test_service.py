@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_service
+----------------------------------
+
+Tests for `service` module.
+"""
+
+import os
+import socket
+import stat
+import sys
+import threading
+import unittest
+import uuid
+from multiprocessing import AuthenticationError
+
+from geopublisher import service
+
+from .helpers import TempFolderMixin
+
+
+class TestService(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Starts a service with test actions instead of publish and archive
+        """
+        self.makeTempFolder()
+        if sys.platform == 'win32':
+            self.address = r'\\.\pipe\geopublisher-test-' + uuid.uuid4().hex
+        else:
+            self.address = os.path.join(self.tempFolder, 'test.sock')
+        self.authkey = b'test key'
+        self.release = threading.Event()
+        self.service = service.PublisherService(self.address, self.authkey,
+                                                maxQueue=1, preload=False)
+        self.service.actions = {'echo': self.echo, 'wait': self.wait}
+        self.thread = threading.Thread(target=self.service.serve)
+        self.thread.start()
+        for i in range(100):
+            if os.path.exists(self.address) or sys.platform == 'win32':
+                break
+            self.release.wait(0.05)
+
+    def echo(self, **args):
+        if 'error' in args:
+            raise ValueError(args['error'])
+        return args
+
+    def wait(self):
+        self.release.wait(10)
+        return True
+
+    def submit(self, action, **args):
+        return service.submit(action, self.address, self.authkey, **args)
+
+    def test_job(self):
+        """
+        A job should be queued, started and finished with its result
+        """
+        replies = list(self.submit('echo', layer='Parcels.shp'))
+        self.assertEqual([r['status'] for r in replies],
+                         ['queued', 'started', 'finished'])
+        self.assertEqual(replies[-1]['result'], {'layer': 'Parcels.shp'})
+
+    def test_failedJob(self):
+        """
+        A job that raises should fail with the error and the service should
+        keep running
+        """
+        replies = list(self.submit('echo', error='no license'))
+        self.assertEqual(replies[-1]['status'], 'failed')
+        self.assertIn('ValueError: no license', replies[-1]['error'])
+        status = list(self.submit('status'))[0]
+        self.assertEqual(status['jobs'], 1)
+
+    def test_queueFull(self):
+        """
+        Jobs should be rejected when the queue is full
+        """
+        running = self.submit('wait')
+        self.assertEqual(next(running)['status'], 'queued')
+        self.assertEqual(next(running)['status'], 'started')
+        waiting = self.submit('wait')
+        self.assertEqual(next(waiting)['status'], 'queued')
+        rejected = list(self.submit('echo'))
+        self.assertEqual([r['status'] for r in rejected], ['rejected'])
+        self.release.set()
+        self.assertEqual(list(running)[-1]['status'], 'finished')
+        self.assertEqual(list(waiting)[-1]['status'], 'finished')
+
+    def test_unknownAction(self):
+        """
+        Unknown actions should be answered with an error
+        """
+        reply = list(self.submit('delete'))
+        self.assertEqual(reply[0]['status'], 'error')
+
+    def test_wrongKey(self):
+        """
+        Clients with the wrong key should be refused before their request is
+        read, and the service should keep running
+        """
+        self.assertRaises(AuthenticationError, list,
+                          service.submit('echo', self.address, b'wrong'))
+        self.assertEqual(list(self.submit('echo'))[-1]['status'], 'finished')
+
+    def test_idleClient(self):
+        """
+        A client that connects and never sends anything shouldn't hold up
+        the others
+        """
+        if sys.platform == 'win32':
+            self.skipTest('needs a Unix socket')
+        idle = socket.socket(socket.AF_UNIX)
+        idle.connect(self.address)
+        try:
+            replies = list(self.submit('echo'))
+        finally:
+            idle.close()
+        self.assertEqual(replies[-1]['status'], 'finished')
+
+    def test_defaultAuthkey(self):
+        """
+        A random key should be made once and kept in a file only the user
+        can read
+        """
+        keyFile = os.path.join(self.tempFolder, 'keys', 'authkey')
+        os.environ['GEOPUBLISHER_AUTHKEY_FILE'] = keyFile
+        try:
+            key = service.default_authkey()
+            self.assertEqual(service.default_authkey(), key)
+        finally:
+            del os.environ['GEOPUBLISHER_AUTHKEY_FILE']
+        self.assertEqual(len(key), 64)
+        if sys.platform != 'win32':
+            self.assertEqual(stat.S_IMODE(os.stat(keyFile).st_mode), 0o600)
+            os.chmod(keyFile, 0o644)
+            os.environ['GEOPUBLISHER_AUTHKEY_FILE'] = keyFile
+            try:
+                self.assertRaises(OSError, service.default_authkey)
+            finally:
+                del os.environ['GEOPUBLISHER_AUTHKEY_FILE']
+
+    def tearDown(self):
+        """
+        Stops the service
+        """
+        self.release.set()
+        list(self.submit('stop'))
+        self.thread.join(10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_state
+----------------------------------
+
+Tests for `state` module.
+"""
+
+import os
+import unittest
+
+from geopublisher import state
+
+from .helpers import TempFolderMixin
+
+
+class TestState(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies a test shapefile to a temporary folder so it can be modified
+        """
+        self.makeTempFolder()
+        self.shapefile = self.copyAirports()
+        self.store = state.StateStore(os.path.join(self.tempFolder,
+                                                   'state.sqlite'))
+
+    def test_fingerprintUnchanged(self):
+        """
+        The fingerprint of an untouched shapefile should not change
+        """
+        self.assertEqual(state.fingerprint(self.shapefile),
+                         state.fingerprint(self.shapefile))
+
+    def test_fingerprintChanged(self):
+        """
+        Changing any of the shapefile files should change the fingerprint
+        """
+        before = state.fingerprint(self.shapefile, hash_files=True)
+        with open(os.path.join(self.tempFolder, 'Airports.prj'), 'a') as f:
+            f.write(' ')
+        after = state.fingerprint(self.shapefile, hash_files=True)
+        self.assertNotEqual(before, after)
+
+    def test_storeFingerprint(self):
+        """
+        Stored fingerprints should be found again for the same input and
+        output, and replaced when set again
+        """
+        output = os.path.join(self.tempFolder, 'out', 'Airports.shp')
+        self.assertIsNone(self.store.getFingerprint(self.shapefile, output))
+        self.store.setFingerprint(self.shapefile, output, 'abc')
+        self.store.setFingerprint(self.shapefile, output, 'def')
+        self.assertEqual(self.store.getFingerprint(self.shapefile, output),
+                         'def')
+        self.assertIsNone(self.store.getFingerprint(self.shapefile, 'other'))
+
+    def tearDown(self):
+        """
+        Close the state store
+        """
+        self.store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_subset
+----------------------------------
+
+Tests for `subset` module.
+"""
+
+import unittest
+
+from geopublisher import subset
+
+
+class TestSubset(unittest.TestCase):
+
+    def test_fieldPairs(self):
+        """
+        Fields given by name should keep their name and pairs should rename
+        them, in the order given
+        """
+        self.assertEqual(subset.field_pairs(['PIN', ('SITUS', 'ADDRESS')]),
+                         [('PIN', 'PIN'), ('SITUS', 'ADDRESS')])
+        self.assertEqual(subset.field_pairs({'SITUS': 'ADDRESS'}),
+                         [('SITUS', 'ADDRESS')])
+
+    def test_parseFields(self):
+        """
+        Command line field lists should be split on commas and colons
+        """
+        self.assertEqual(subset.parse_fields('PIN, SITUS_ADDR:ADDRESS,ACRES,'),
+                         [('PIN', 'PIN'), ('SITUS_ADDR', 'ADDRESS'),
+                          ('ACRES', 'ACRES')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_verify
+----------------------------------
+
+Tests for `verify` module.
+"""
+
+import os
+import struct
+import unittest
+
+from geopublisher import verify
+
+from .helpers import TempFolderMixin
+
+
+class TestVerify(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies a test shapefile to a temporary folder so it can be damaged
+        """
+        self.makeTempFolder()
+        self.shapefile = self.copyAirports()
+
+    def _truncate(self, ext, remove):
+        file = os.path.join(self.tempFolder, 'Airports' + ext)
+        with open(file, 'r+b') as f:
+            f.truncate(os.path.getsize(file) - remove)
+
+    def _problems(self):
+        try:
+            verify.verify_shapefile(self.shapefile)
+        except verify.ShapefileIntegrityError as e:
+            return e.problems
+        self.fail('ShapefileIntegrityError not raised')
+
+    def test_valid(self):
+        """
+        A good shapefile should pass and return its record count
+        """
+        self.assertEqual(verify.verify_shapefile(self.shapefile), 15)
+
+    def test_truncatedDbf(self):
+        """
+        A .dbf missing part of its last record should fail
+        """
+        self._truncate('.dbf', 20)
+        self.assertIn('.dbf is truncated', self._problems()[0])
+
+    def test_truncatedShp(self):
+        """
+        A .shp shorter than its header says should fail
+        """
+        self._truncate('.shp', 10)
+        self.assertIn('.shp header says', self._problems()[0])
+
+    def test_badOffset(self):
+        """
+        A .shx offset that doesn't point at the right record should fail
+        """
+        with open(os.path.join(self.tempFolder, 'Airports.shx'), 'r+b') as f:
+            f.seek(100 + 8 * 3)
+            f.write(struct.pack('>i', 50))
+        self.assertTrue(self._problems())
+
+    def test_missingShx(self):
+        """
+        A missing .shx should fail
+        """
+        os.remove(os.path.join(self.tempFolder, 'Airports.shx'))
+        self.assertEqual(self._problems(), ['.shx is missing'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_watch
+----------------------------------
+
+Tests for `watch` module.
+"""
+
+import os
+import unittest
+
+from geopublisher import watch
+
+from .helpers import TempFolderMixin
+
+
+class TestWatch(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a folder with a shapefile and a file geodatabase to watch
+        """
+        self.makeTempFolder()
+        self.shapefile = os.path.join(self.tempFolder, 'Parcels.shp')
+        self.gdb = os.path.join(self.tempFolder, 'Data.gdb')
+        os.mkdir(self.gdb)
+        for ext in ('.shp', '.shx', '.dbf'):
+            self._write(os.path.join(self.tempFolder, 'Parcels' + ext))
+        self._write(os.path.join(self.tempFolder, 'Roads.shp'))
+        self.jobs = [(self.shapefile, self.tempFolder, 'Out.shp'),
+                     (os.path.join(self.gdb, 'Roads'), self.tempFolder,
+                      'Roads_Out.shp')]
+
+    def _write(self, path, data=b'data'):
+        with open(path, 'ab') as f:
+            f.write(data)
+
+    def test_debouncer(self):
+        """
+        A key should be ready once it is quiet, or after the longest delay
+        even if it keeps changing
+        """
+        now = [0]
+        debouncer = watch.Debouncer(quiet=10, maxDelay=25,
+                                    clock=lambda: now[0])
+        debouncer.touch('Parcels')
+        for now[0] in (5, 12, 19):
+            debouncer.touch('Parcels')
+            self.assertEqual(debouncer.ready(), [])
+        now[0] = 25
+        self.assertEqual(debouncer.ready(), ['Parcels'])
+        debouncer.touch('Roads')
+        now[0] = 35
+        self.assertEqual(debouncer.ready(), ['Roads'])
+
+    def test_jobsFor(self):
+        """
+        Only the jobs whose input includes the changed file should be found
+        """
+        watcher = watch.LayerWatcher(self.jobs, polling=True)
+        parcels = watcher.jobsFor(os.path.join(self.tempFolder,
+                                               'Parcels.shp.xml'))
+        self.assertEqual([job.output_fc for job in parcels], ['Out.shp'])
+        self.assertEqual(watcher.jobsFor(os.path.join(self.tempFolder,
+                                                      'Roads.dbf')), [])
+        self.assertEqual(watcher.jobsFor(os.path.join(self.tempFolder,
+                                                      'Parcels.sr.lock')), [])
+        roads = watcher.jobsFor(os.path.join(self.gdb, 'a00000009.gdbtable'))
+        self.assertEqual([job.output_fc for job in roads], ['Roads_Out.shp'])
+
+    def test_poll(self):
+        """
+        A changed shapefile should be published once its changes settle
+        """
+        published = []
+        for polling in (True, False):
+            watcher = watch.LayerWatcher(
+                self.jobs, quiet=0, polling=polling, interval=0,
+                publish=lambda *job, **options: published.append(job[2]))
+            if not polling and \
+                    not isinstance(watcher.watcher, watch.InotifyWatcher):
+                continue
+            self._write(os.path.join(self.tempFolder, 'Parcels.dbf'), b'x')
+            self._write(os.path.join(self.tempFolder, 'Parcels.shp'), b'x')
+            watcher.poll(timeout=1)
+            watcher.watcher.close()
+            self.assertEqual(published, ['Out.shp'])
+            del published[:]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_zipper
+----------------------------------
+
+Tests for `zipper` module.
+"""
+
+import hashlib
+import os
+import unittest
+import zipfile
+import zlib
+
+from geopublisher import zipper
+
+from .helpers import TempFolderMixin
+
+
+class TestZipper(TempFolderMixin, unittest.TestCase):
+
+    def setUp(self):
+        """
+        Uses the test shapefiles as zip members
+        """
+        self.currentFolder = os.path.dirname(os.path.abspath(__file__))
+        self.testShpWorkspace = os.path.join(self.currentFolder, 'data',
+                                             'Test_Shapefiles')
+        self.makeTempFolder()
+        self.zipPath = os.path.join(self.tempFolder, 'test.zip')
+
+    def test_crc32Combine(self):
+        """
+        Combining the CRCs of two blocks should give the CRC of both
+        """
+        first = b'San Juan County' * 100
+        second = b'Friday Harbor' * 77
+        crc = zipper.crc32_combine(zlib.crc32(first) & 0xFFFFFFFF,
+                                   zlib.crc32(second) & 0xFFFFFFFF,
+                                   len(second))
+        self.assertEqual(crc, zlib.crc32(first + second) & 0xFFFFFFFF)
+
+    def test_parallelZip(self):
+        """
+        The zip file should be readable by zipfile and contain the same data
+        as the files that were added, including ones split into chunks
+        """
+        names = ['Airports.shp', 'Airports.dbf', 'Airports.prj',
+                 'Airports.shx']
+        with zipper.ParallelZipFile(self.zipPath, workers=4,
+                                    chunkSize=1024) as zf:
+            for name in names:
+                zf.write(os.path.join(self.testShpWorkspace, name), name)
+        with zipfile.ZipFile(self.zipPath) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), names)
+            for name in names:
+                with open(os.path.join(self.testShpWorkspace, name),
+                          'rb') as f:
+                    self.assertEqual(zf.read(name), f.read())
+
+    def test_emptyFile(self):
+        """
+        Empty files should be zipped too
+        """
+        empty = os.path.join(self.tempFolder, 'empty.cpg')
+        open(empty, 'w').close()
+        with zipper.ParallelZipFile(self.zipPath) as zf:
+            zf.write(empty, 'empty.cpg')
+            self.assertEqual(zf.infolist()[0].file_size, 0)
+        with zipfile.ZipFile(self.zipPath) as zf:
+            self.assertEqual(zf.read('empty.cpg'), b'')
+
+    def test_digests(self):
+        """
+        Zip writers asked for digests should have the SHA-256 of each member
+        once closed, with or without workers
+        """
+        names = ['Airports.shp', 'Airports.dbf']
+        for workers in (None, 2):
+            zf = zipper.zip_writer(self.zipPath, workers, digests=True)
+            with zf:
+                for name in names:
+                    zf.write(os.path.join(self.testShpWorkspace, name), name)
+            for name in names:
+                with open(os.path.join(self.testShpWorkspace, name),
+                          'rb') as f:
+                    self.assertEqual(zf.digests[name],
+                                     hashlib.sha256(f.read()).hexdigest())
+            with zipfile.ZipFile(self.zipPath) as zf:
+                self.assertIsNone(zf.testzip())
+
+
+if __name__ == '__main__':
+    unittest.main()